@@ -59,3 +59,25 @@ RUTEN_ITEMS_API_BASE_URL = "https://rapi.ruten.com.tw/api"
 
 # Konami 官方網站 Base URL（Referer 用）
 KONAMI_REFERER_URL = "https://www.db.yugioh-card.com/"
+
+# ============================================================
+# 爬蟲 HTTP 錄製/重播（離線測試與效能量測用）
+# ============================================================
+
+# "live"：正常連線；"record"：連線並錄下所有請求/回應；"replay"：不連網，從錄製檔回應
+SCRAPER_HTTP_MODE = "live"
+
+# 錄製檔名稱：露天放在各專案資料夾，Konami 放在 data/ 下
+HTTP_CASSETTE_NAME = "http_cassette.jsonl.gz"
+KONAMI_CASSETTE_NAME = "konami_cassette.jsonl.gz"
+
+# 重播時每個回應的固定延遲與隨機抖動上限（秒）
+REPLAY_LATENCY = 0.0
+REPLAY_JITTER = 0.0
+
+# ============================================================
+# 爬蟲效能數據
+# ============================================================
+
+# 每次 run 的效能數據檔名（放在各專案資料夾，與 ruten_data.csv 同一層）
+SCRAPE_METRICS_NAME = "scrape_metrics.json"
@@ -0,0 +1,45 @@
+"""
+app/routers/images.py - 本地商品圖片快取的 API 路由
+===================================================
+- GET /api/images/{digest}            : 讀取快取的原尺寸商品圖片（Content-Type 依原圖格式）
+- GET /api/images/{digest}?thumb=true : 讀取預先產生的縮圖（JPEG）
+
+圖片以內容雜湊命名，同一個網址的內容永遠不變，因此回應帶有長效的 Cache-Control，
+瀏覽器讀過一次之後就不會再向後端要求。
+透過 Request.app.state 取得 image_cache（ProductImageCache 實例）。
+"""
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.services.image_cache import media_type_for
+
+router = APIRouter(prefix="/api", tags=["images"])
+
+# 內容雜湊（SHA-256）格式，避免路徑穿越
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# 內容定址的檔案不會變動，讓瀏覽器快取一年
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/images/{digest}")
+async def get_image(digest: str, request: Request, thumb: bool = False):
+    """
+    讀取本地快取的商品圖片。
+
+    Args:
+        digest: 圖片內容的 SHA-256
+        thumb: true 時回傳縮圖
+    """
+    image_cache = getattr(request.app.state, "image_cache", None)
+    if image_cache is None or not _DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="找不到此圖片")
+
+    path = image_cache.path_for(digest, thumbnail=thumb)
+    if path is None:
+        raise HTTPException(status_code=404, detail="找不到此圖片")
+    return FileResponse(
+        path, media_type=media_type_for(path), headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    )
@@ -4,19 +4,25 @@ app/routers/tasks.py - 爬蟲執行與結果讀取的 API 路由
 負責啟動完整的採購流程（爬蟲→清洗→計算），以及讀取計算結果：
 - POST /api/projects/{project_name}/run     : 依序執行三個步驟
 - GET  /api/projects/{project_name}/results : 讀取 plan.json 計算結果
+- GET  /api/projects/{project_name}/metrics : 讀取最近一次爬蟲的效能數據
+
+計算完成後會在背景下載計畫中的商品圖片（ProductImageCache），
+結果頁的圖片網址會換成本地圖片 API（/api/images/...）。
 
 已改為直接 import Service 類別，不再使用 subprocess。
 """
 import logging
 import os
+from contextlib import nullcontext
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
 
 from app.config import RUTEN_BASE_URL
 from app.services import storage
 from app.services.calculator_service import PurchaseOptimizer
 from app.services.cleaner_service import DataCleaner
-from app.services.ruten_scraper import RutenScraper
+from app.services.image_cache import plan_image_urls
+from app.services.ruten_scraper import RUN_REQUEST_BUDGET, RutenScraper
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -25,14 +31,33 @@ router = APIRouter(prefix="/api", tags=["tasks"])
 
 
 @router.post("/projects/{project_name}/run")
-async def run_process(project_name: str):
+async def run_process(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    project_name: str,
+    force_refresh: bool = False,
+    demand_aware: bool = False,
+    resume: bool = False,
+    incremental: bool = False,
+    request_budget: int = Query(RUN_REQUEST_BUDGET, ge=0),
+):
     """
     啟動完整的採購流程，依序執行：
     1. RutenScraper   → 爬取露天拍賣的商品資料
     2. DataCleaner    → 過濾不符合條件的商品
     3. PurchaseOptimizer → 用線性規劃找出最省錢的購買組合
 
-    全部成功後回傳 {"status": "completed"}。
+    force_refresh=true 時爬蟲會略過回應快取，一律向露天重新查詢。
+    demand_aware=true 時爬蟲依價格排序，找到的庫存足以涵蓋需求量就停止翻頁。
+    resume=true 時沿用上次中斷留下的檢查點，只爬尚未完成的卡號。
+    incremental=true 時沒有變動的複數選項商品沿用上次的資料列，不再查詢選項詳情。
+    request_budget 是爬蟲最多送出的請求數（0 表示不限）：卡號依優先順序爬取，
+    額度不足時優先順序低的卡號爬較少頁，用完後剩下的卡號只保留已取得的資料。
+    爬蟲執行期間會暫停背景價格監看；監看預先更新過的卡號會直接命中回應快取。
+
+    全部成功後回傳 {"status": "completed", "partial_keywords": {卡號: 原因}}
+    （partial_keywords 為因請求額度而資料可能不完整的卡號），
+    並在回應送出後於背景下載計畫中的商品圖片。
     若其中任一步驟失敗，回傳 500 並說明哪個步驟出錯。
     """
     project_path = os.path.abspath(os.path.join("data", project_name))
@@ -51,8 +76,18 @@ async def run_process(project_name: str):
     # ============================================================
     try:
         logger.info("步驟 1/3：正在執行露天爬蟲...")
-        scraper = RutenScraper()
-        await scraper.run(cart_path, csv_path)
+        # prefilter：一定會被 DataCleaner 排除的商品在爬蟲階段就先丟掉，省下選項查詢
+        # hedge：商品詳情/選項查詢卡住時送出備援請求，降低整體尾端延遲
+        scraper = RutenScraper(
+            demand_aware=demand_aware, prefilter=True, hedge=True,
+            request_budget=request_budget or None,
+        )
+        watcher = getattr(request.app.state, "price_watcher", None)
+        async with watcher.interactive() if watcher else nullcontext():
+            await scraper.run(
+                cart_path, csv_path,
+                force_refresh=force_refresh, resume=resume, incremental=incremental,
+            )
         logger.info("步驟 1/3：露天爬蟲完成。")
     except Exception as e:
         logger.error(f"露天爬蟲失敗：{e}")
@@ -91,11 +126,21 @@ async def run_process(project_name: str):
             detail=f"Calculator（最佳組合計算）執行失敗：{str(e)}",
         )
 
-    return {"status": "completed"}
+    # 商品圖片下載失敗不影響結果，結果頁會改用露天的原始網址
+    image_cache = getattr(request.app.state, "image_cache", None)
+    if image_cache is not None:
+        try:
+            background_tasks.add_task(
+                image_cache.fetch_many, plan_image_urls(storage.get_plan(project_name))
+            )
+        except (FileNotFoundError, RuntimeError) as e:
+            logger.warning(f"讀取計算結果失敗，略過商品圖片下載：{e}")
+
+    return {"status": "completed", "partial_keywords": scraper.partial_keywords}
 
 
 @router.get("/projects/{project_name}/results")
-async def get_results(project_name: str):
+async def get_results(project_name: str, request: Request):
     """
     讀取計算完成的最佳採購方案（plan.json），並將資料格式轉換為前端期望的結構。
 
@@ -106,7 +151,14 @@ async def get_results(project_name: str):
     轉換後回傳給前端的格式：
         { "total_cost": N, "total_item_cost": N, "total_shipping_cost": N,
           "plan": [{ "seller": "ID", "subtotal": N, "shipping_cost": N,
-                     "items": [{ "name", "url", "card_name_zh", "price", "buy_count", "card_number" }] }] }
+                     "items": [{ "name", "url", "card_name_zh", "price", "buy_count", "card_number",
+                                 "image_url", "thumbnail_url" }] }],
+          "partial_keywords": { "卡號": "原因" } }
+
+    已快取在本機的商品圖片，image_url / thumbnail_url 會指向 /api/images/...；
+    尚未快取的 image_url 維持露天原始網址，thumbnail_url 為空字串。
+
+    partial_keywords 來自最近一次爬蟲的效能數據，列出因請求額度而資料可能不完整的卡號。
 
     若結果檔案不存在（尚未執行爬蟲/計算），回傳 404。
     """
@@ -134,6 +186,8 @@ async def get_results(project_name: str):
     except Exception:
         default_shipping = 60
 
+    image_cache = getattr(request.app.state, "image_cache", None)
+
     # 組裝賣家陣列（前端的 plan[]）
     plan = []
     for seller_id, seller_data in sellers.items():
@@ -141,6 +195,10 @@ async def get_results(project_name: str):
         items = []
         for item in seller_data.get("items", []):
             product_id = item.get("product_id")
+            image_url = item.get("image_url", "")
+            thumbnail_url = ""
+            if image_cache is not None:
+                image_url, thumbnail_url = image_cache.local_urls(image_url)
             items.append({
                 "name": item.get("product_name", ""),
                 # 用 product_id 組合露天商品頁面網址
@@ -153,7 +211,8 @@ async def get_results(project_name: str):
                 "price": item.get("price", 0),
                 "buy_count": item.get("buy_qty", 0),
                 "card_number": "",  # plan.json 目前不含卡號資訊
-                "image_url": item.get("image_url", ""),
+                "image_url": image_url,
+                "thumbnail_url": thumbnail_url,
             })
 
         # 取第一個商品的 shipping_cost 作為該賣家的運費，若無則用預設值
@@ -170,9 +229,34 @@ async def get_results(project_name: str):
             "items": items,
         })
 
+    try:
+        partial_keywords = storage.get_scrape_metrics(project_name).get("budget", {}).get(
+            "partial_keywords", {}
+        )
+    except (FileNotFoundError, RuntimeError):
+        partial_keywords = {}
+
     return {
         "total_cost": summary.get("grand_total", 0),
         "total_item_cost": summary.get("total_items_cost", 0),
         "total_shipping_cost": summary.get("total_shipping_cost", 0),
         "plan": plan,
+        "partial_keywords": partial_keywords,
     }
+
+
+@router.get("/projects/{project_name}/metrics")
+async def get_scrape_metrics(project_name: str):
+    """
+    讀取最近一次露天爬蟲的效能數據（scrape_metrics.json）：
+    各端點的請求數、延遲直方圖與 p50/p90/p99、回應大小、錯誤/逾時/重試次數，
+    各卡號走了幾頁與耗時、複數選項展開數量，以及整次的 wall time。
+
+    若尚未執行過爬蟲，回傳 404。
+    """
+    try:
+        return storage.get_scrape_metrics(project_name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,173 @@
+"""
+app/services/cassette.py - 爬蟲 HTTP 請求的錄製與重播
+======================================================
+讓 RutenScraper / KonamiScraper 可以在完全離線的環境下重現真實的爬取流程：
+- record : 照常向外部服務發送請求，同時把每一組請求/回應記錄下來，結束時寫成壓縮檔
+- replay : 不連網，直接從記憶體中的錄製內容回應，可加上固定延遲與隨機抖動模擬網路
+
+錄製檔（cassette）是 gzip 壓縮的 JSON Lines，每行一組請求/回應。
+同一個請求（網址 + 查詢參數）出現多次時（重試、備援請求），重播時依錄製順序回應，
+用完後一直重複最後一筆，因此並行順序不同也能得到確定的結果。
+
+模式由 app/config.py 的 SCRAPER_HTTP_MODE 設定（"live" / "record" / "replay"）。
+
+使用方法：
+    cassette = Cassette("data/project/http_cassette.jsonl.gz", mode="replay")
+    entry = await cassette.replay_async(url, params)
+    ...
+    cassette.record(url, params, status=200, body=data)
+    cassette.save()
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, List
+
+from app.config import REPLAY_JITTER, REPLAY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+HTTP_MODES = ("live", "record", "replay")
+
+
+class CassetteMissError(Exception):
+    """重播模式下找不到對應的錄製內容"""
+
+
+def request_key(url: str, params: Dict | None = None) -> str:
+    """請求的識別字串：網址 + 依名稱排序的查詢參數"""
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return json.dumps([url, items], ensure_ascii=False)
+
+
+class Cassette:
+    """
+    一個錄製檔的內容。
+
+    record 模式從空白開始（save() 時覆寫舊檔）；replay 模式建立時就把整個檔案載入記憶體。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str,
+        latency: float = REPLAY_LATENCY,
+        jitter: float = REPLAY_JITTER,
+    ):
+        """
+        Args:
+            path: 錄製檔路徑
+            mode: "record" 或 "replay"
+            latency: 重播時每個回應的固定延遲（秒）
+            jitter: 重播時在固定延遲上再加的隨機延遲上限（秒）
+
+        Raises:
+            ValueError: mode 不正確
+            FileNotFoundError: replay 模式但錄製檔不存在
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不支援的錄製模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self._entries: List[Dict] = []
+        self._by_key: Dict[str, List[Dict]] = {}
+        self._replayed: Dict[str, int] = {}
+        if mode == "replay":
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+        logger.info(f"已載入錄製檔 {self.path}（{len(self._entries)} 組請求/回應）")
+
+    def _add(self, entry: Dict) -> None:
+        self._entries.append(entry)
+        self._by_key.setdefault(entry["key"], []).append(entry)
+
+    def record(
+        self,
+        url: str,
+        params: Dict | None,
+        status: int,
+        body=None,
+        retry_after: str | None = None,
+    ) -> None:
+        """
+        記錄一組請求/回應（record 模式以外不做任何事）。
+
+        Args:
+            url: 請求網址
+            params: 查詢參數
+            status: HTTP 狀態碼
+            body: 回應內容（JSON 物件或文字，錯誤回應可為 None）
+            retry_after: 回應的 Retry-After 標頭原文
+        """
+        if not self.recording:
+            return
+        self._add({
+            "key": request_key(url, params),
+            "status": status,
+            "retry_after": retry_after,
+            "body": body,
+        })
+
+    def lookup(self, url: str, params: Dict | None = None) -> Dict:
+        """
+        取得下一筆錄製的回應（不含延遲）。
+
+        Raises:
+            CassetteMissError: 沒有錄到這個請求
+        """
+        key = request_key(url, params)
+        entries = self._by_key.get(key)
+        if not entries:
+            raise CassetteMissError(f"錄製檔中沒有這個請求: {key}")
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def _delay(self) -> float:
+        return self.latency + random.uniform(0, self.jitter)
+
+    async def replay_async(self, url: str, params: Dict | None = None) -> Dict:
+        """[非同步] 等待模擬的網路延遲後回傳錄製的回應"""
+        entry = self.lookup(url, params)
+        await asyncio.sleep(self._delay())
+        return entry
+
+    def replay(self, url: str, params: Dict | None = None) -> Dict:
+        """[同步] 等待模擬的網路延遲後回傳錄製的回應"""
+        entry = self.lookup(url, params)
+        time.sleep(self._delay())
+        return entry
+
+    def save(self) -> None:
+        """把錄到的內容寫成壓縮檔（record 模式以外不做任何事；先寫暫存檔再改名）"""
+        if not self.recording:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for entry in self._entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            logger.info(f"已寫入錄製檔 {self.path}（{len(self._entries)} 組請求/回應）")
+        except OSError as e:
+            logger.warning(f"寫入錄製檔 {self.path} 失敗: {e}")
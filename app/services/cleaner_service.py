@@ -24,6 +24,27 @@ import re
 logger = logging.getLogger(__name__)
 
 
+def match_card_code(target_code: str, text: str) -> bool:
+    """
+    使用 Regex 檢查卡號是否精確匹配，避免子字串誤判。
+
+    例如：避免 "SD5" 匹配到 "YSD5"。
+
+    規則：
+    1. (?<![a-zA-Z]) : 前面不能是英文字母
+    2. (?![0-9]) : 後面不能是數字
+
+    Args:
+        target_code: 目標卡號（例如 "DABL-JP035"）
+        text: 要檢查的商品名稱
+
+    Returns:
+        bool: 是否精確匹配
+    """
+    pattern = r"(?<![a-zA-Z])" + re.escape(target_code) + r"(?![0-9])"
+    return re.search(pattern, text, re.IGNORECASE) is not None
+
+
 class DataCleaner:
     """
     爬蟲資料清洗服務。
@@ -38,24 +59,128 @@ class DataCleaner:
     """
 
     def _check_card_code_match(self, target_code: str, text: str) -> bool:
+        """使用 Regex 檢查卡號是否精確匹配（規則見 match_card_code）"""
+        return match_card_code(target_code, text)
+
+    def load_rules(self, config: dict) -> dict:
+        """
+        從購物車設定讀取過濾規則（黑名單、排除關鍵字、目標卡號）。
+
+        兩層設定合併（v0.4.0 方案 A）：
+        - 列表型：全域 + 專案 聯集
+        - 數值型：專案有值就覆蓋，None 就用全域
+
+        Args:
+            config: cart.json 的內容
+
+        Returns:
+            dict: exclude_keywords, exclude_sellers, card_target_map（卡片名稱 → 目標卡號）,
+                  all_target_card_numbers
         """
-        使用 Regex 檢查卡號是否精確匹配，避免子字串誤判。
+        global_settings = config.get("global_settings", {})
+        cart_settings = config.get("cart_settings", {})
+
+        # 排序讓同一份設定每次產生相同的規則（爬蟲用來比對檢查點條件）
+        exclude_keywords = sorted(set(
+            global_settings.get("global_exclude_keywords", []) +
+            cart_settings.get("exclude_keywords", [])
+        ))
+        exclude_sellers = sorted(set(
+            global_settings.get("global_exclude_seller", []) +
+            cart_settings.get("exclude_seller", [])
+        ))
+
+        # 建立卡片名稱 → 目標卡號的對應字典（用來做精確過濾）
+        card_target_map = {}
+        all_target_card_numbers = []
+
+        for item in config.get("shopping_cart", []):
+            c_name = item.get("card_name_zh")
+            raw_ids = item.get("target_card_numbers", [])
+            # target_card_numbers 可能是純字串或字典格式，統一轉為字串列表
+            t_ids = []
+            for tid in raw_ids:
+                if isinstance(tid, dict):
+                    cn = tid.get("card_number", "")
+                    if cn:
+                        t_ids.append(cn)
+                elif isinstance(tid, str) and tid:
+                    t_ids.append(tid)
+            if c_name:
+                card_target_map[c_name] = t_ids
+            all_target_card_numbers.extend(t_ids)
 
-        例如：避免 "SD5" 匹配到 "YSD5"。
+        return {
+            "exclude_keywords": exclude_keywords,
+            "exclude_sellers": exclude_sellers,
+            "card_target_map": card_target_map,
+            "all_target_card_numbers": all_target_card_numbers,
+        }
 
-        規則：
-        1. (?<![a-zA-Z]) : 前面不能是英文字母
-        2. (?![0-9]) : 後面不能是數字
+    def rejection_reason(self, row: dict, rules: dict, before_expansion: bool = False) -> str | None:
+        """
+        判斷單筆商品是否會被過濾掉（不含去重複）。
 
         Args:
-            target_code: 目標卡號（例如 "DABL-JP035"）
-            text: 要檢查的商品名稱
+            row: 商品資料（CSV 讀進來的字串，或爬蟲產生的原始型別皆可）
+            rules: load_rules() 的回傳值
+            before_expansion: 為 True 時代表複數選項商品尚未展開。
+                子商品沿用父商品的賣家與圖片，名稱則是「父商品名稱 [選項名稱]」，
+                因此只套用父商品被排除、子商品也一定被排除的規則
+                （賣家、eBay、排除關鍵字）；價格、alt_price 與卡號（可能寫在選項名稱裡）
+                要等展開後才能判斷
 
         Returns:
-            bool: 是否精確匹配
+            被過濾的原因代碼（"seller", "price", "alt_price", "ebay", "keyword", "card_code"），
+            會保留則回傳 None
         """
-        pattern = r"(?<![a-zA-Z])" + re.escape(target_code) + r"(?![0-9])"
-        return re.search(pattern, text, re.IGNORECASE) is not None
+        # 過濾 1: 黑名單賣家
+        if row.get("seller_id") in rules["exclude_sellers"]:
+            return "seller"
+
+        is_unexpanded_variant = before_expansion and str(row.get("alt_price")) == "True"
+
+        if not is_unexpanded_variant:
+            # 過濾 2: 價格異常（超過 5000 可能是假貨或整盒賣）
+            try:
+                if float(row.get("price", 0)) > 5000:
+                    return "price"
+            except (ValueError, TypeError):
+                pass  # 價格不是數字就保留
+
+            # 過濾 3: 有價差的商品（多種規格，爬蟲無法確定是哪種）
+            if str(row.get("alt_price")) == "True":
+                return "alt_price"
+
+        product_name = row.get("product_name", "")
+        search_card_name = row.get("search_card_name", "")
+
+        # 過濾 4: 排除 eBay 相關商品（運費高且久）
+        if "ebay" in product_name.lower():
+            return "ebay"
+        if "ebay" in row.get("image_url", "").lower():
+            return "ebay"
+
+        # 過濾 5: 排除關鍵字（卡套、桌墊等）
+        if any(keyword in product_name for keyword in rules["exclude_keywords"]):
+            return "keyword"
+
+        if is_unexpanded_variant:
+            return None
+
+        # 過濾 6: 確保商品名稱包含目標卡號（Regex 精確匹配）
+        card_target_map = rules["card_target_map"]
+        if search_card_name in card_target_map:
+            targets = card_target_map[search_card_name]
+        else:
+            # 退回使用全域檢查
+            targets = rules["all_target_card_numbers"]
+        if targets and not any(
+            self._check_card_code_match(target_id, product_name) for target_id in targets
+        ):
+            return "card_code"
+
+        return None
 
     def clean(self, input_csv: str, output_csv: str, cart_path: str) -> None:
         """
@@ -86,45 +211,16 @@ class DataCleaner:
         except json.JSONDecodeError:
             raise RuntimeError(f"設定檔格式不正確: {cart_path}")
 
-        global_settings = config.get("global_settings", {})
-        cart_settings = config.get("cart_settings", {})
+        rules = self.load_rules(config)
+        exclude_keywords = rules["exclude_keywords"]
+        exclude_sellers = rules["exclude_sellers"]
+        card_target_map = rules["card_target_map"]
+        all_target_card_numbers = rules["all_target_card_numbers"]
 
-        # 兩層設定合併（v0.4.0 方案 A）：
-        # - 列表型：全域 + 專案 聯集
-        # - 數值型：專案有值就覆蓋，None 就用全域
-        exclude_keywords = list(set(
-            global_settings.get("global_exclude_keywords", []) +
-            cart_settings.get("exclude_keywords", [])
-        ))
         logger.info(f"排除關鍵字（合併後）: {exclude_keywords}")
-
-        exclude_sellers = list(set(
-            global_settings.get("global_exclude_seller", []) +
-            cart_settings.get("exclude_seller", [])
-        ))
         if exclude_sellers:
             logger.info(f"排除賣家 ID（合併後）: {exclude_sellers}")
 
-        # 建立卡片名稱 → 目標卡號的對應字典（用來做精確過濾）
-        card_target_map = {}
-        all_target_card_numbers = []
-
-        for item in config.get("shopping_cart", []):
-            c_name = item.get("card_name_zh")
-            raw_ids = item.get("target_card_numbers", [])
-            # target_card_numbers 可能是純字串或字典格式，統一轉為字串列表
-            t_ids = []
-            for tid in raw_ids:
-                if isinstance(tid, dict):
-                    cn = tid.get("card_number", "")
-                    if cn:
-                        t_ids.append(cn)
-                elif isinstance(tid, str) and tid:
-                    t_ids.append(tid)
-            if c_name:
-                card_target_map[c_name] = t_ids
-            all_target_card_numbers.extend(t_ids)
-
         if not all_target_card_numbers:
             logger.warning("設定檔中沒有任何目標卡號 (target_card_numbers)。")
         else:
@@ -152,53 +248,13 @@ class DataCleaner:
                     if p_id and p_id in seen_product_ids:
                         continue
 
-                    # 過濾 1: 黑名單賣家
-                    if row.get("seller_id") in exclude_sellers:
+                    # 過濾 1~6（規則見 rejection_reason）
+                    reason = self.rejection_reason(row, rules)
+                    if reason == "seller":
                         seller_excluded_count += 1
+                    if reason:
                         continue
 
-                    # 過濾 2: 價格異常（超過 5000 可能是假貨或整盒賣）
-                    try:
-                        price = float(row.get("price", 0))
-                        if price > 5000:
-                            continue
-                    except (ValueError, TypeError):
-                        pass  # 價格不是數字就保留
-
-                    # 過濾 3: 有價差的商品（多種規格，爬蟲無法確定是哪種）
-                    if row.get("alt_price") == "True":
-                        continue
-
-                    product_name = row.get("product_name", "")
-                    search_card_name = row.get("search_card_name", "")
-
-                    # 過濾 4: 排除 eBay 相關商品（運費高且久）
-                    if "ebay" in product_name.lower():
-                        continue
-                    image_url = row.get("image_url", "")
-                    if "ebay" in image_url.lower():
-                        continue
-
-                    # 過濾 5: 排除關鍵字（卡套、桌墊等）
-                    if any(keyword in product_name for keyword in exclude_keywords):
-                        continue
-
-                    # 過濾 6: 確保商品名稱包含目標卡號（Regex 精確匹配）
-                    if search_card_name in card_target_map:
-                        specific_targets = card_target_map[search_card_name]
-                        if specific_targets and not any(
-                            self._check_card_code_match(target_id, product_name)
-                            for target_id in specific_targets
-                        ):
-                            continue
-                    else:
-                        # 退回使用全域檢查
-                        if all_target_card_numbers and not any(
-                            self._check_card_code_match(target_id, product_name)
-                            for target_id in all_target_card_numbers
-                        ):
-                            continue
-
                     # 通過所有檢查，加入保留名單
                     cleaned_rows.append(row)
                     if p_id:
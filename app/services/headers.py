@@ -0,0 +1,97 @@
+"""
+app/services/headers.py - 爬蟲共用的偽裝標頭池
+=============================================
+fake_useragent 的 UserAgent() 建立時要載入整份瀏覽器資料，每次 .random 也要重新篩選，
+一次就要好幾毫秒。這裡改成整個行程共用、第一次使用時才建立的標頭池：
+預先抽出一批 User-Agent 組成完整的標頭 dict，之後每個請求只是依序輪替取用。
+
+- RUTEN_HEADERS  : 露天 API（JSON）
+- KONAMI_HEADERS : Konami 官方資料庫（HTML）
+
+使用方法：
+    headers = RUTEN_HEADERS.next()   # 回傳共用的 dict，不可修改
+"""
+import itertools
+import logging
+import threading
+from typing import Dict, List
+
+from app.config import KONAMI_REFERER_URL, RUTEN_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+# 預設參數
+USER_AGENT_POOL_SIZE = 16  # 預先抽出幾次 User-Agent（重複的只保留一個）
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+)
+
+_user_agents: List[str] | None = None
+_user_agents_lock = threading.Lock()
+
+
+def user_agents() -> List[str]:
+    """
+    行程內共用的 User-Agent 清單（第一次呼叫時才載入 fake_useragent）。
+
+    fake_useragent 無法使用時只記錄警告，改用 DEFAULT_USER_AGENT。
+    """
+    global _user_agents
+    with _user_agents_lock:
+        if _user_agents is None:
+            try:
+                from fake_useragent import UserAgent
+
+                ua = UserAgent()
+                agents = list(dict.fromkeys(ua.random for _ in range(USER_AGENT_POOL_SIZE)))
+                _user_agents = agents or [DEFAULT_USER_AGENT]
+            except Exception as e:
+                logger.warning(f"無法產生隨機 User-Agent，改用預設值: {e}")
+                _user_agents = [DEFAULT_USER_AGENT]
+        return _user_agents
+
+
+class HeaderPool:
+    """
+    預先組好的標頭 dict，依序輪替。
+
+    第一次呼叫 next() 時才依 user_agents() 為每個 User-Agent 組一份完整標頭，
+    之後每次只是從循環中取下一份，不再建立新的 dict。
+    """
+
+    def __init__(self, base_headers: Dict[str, str]):
+        """
+        Args:
+            base_headers: 除了 User-Agent 以外的固定標頭
+        """
+        self.base_headers = base_headers
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def next(self) -> Dict[str, str]:
+        """取得下一份標頭（共用的 dict，呼叫端不可修改）"""
+        if self._cycle is None:
+            with self._lock:
+                if self._cycle is None:
+                    self._cycle = itertools.cycle([
+                        {"User-Agent": agent, **self.base_headers} for agent in user_agents()
+                    ])
+        return next(self._cycle)
+
+
+RUTEN_HEADERS = HeaderPool({
+    "Accept": "application/json",
+    "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Referer": f"{RUTEN_BASE_URL}/",
+    "Connection": "keep-alive",
+})
+
+KONAMI_HEADERS = HeaderPool({
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "ja,en-US;q=0.7,en;q=0.3",
+    "Referer": KONAMI_REFERER_URL,
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+})
@@ -0,0 +1,300 @@
+"""
+app/services/image_cache.py - 露天商品圖片的本地快取
+=====================================================
+把採購計畫選中的商品圖片下載到 product_images/，結果頁改從本機讀取，
+不必每次都向 gcs.rimg.com.tw 抓幾十張原尺寸圖片。
+
+- 內容定址：檔名是圖片內容的 SHA-256，不同網址但內容相同的圖片只存一份
+- 每張圖片下載時就預先產生縮圖（thumb/，一律 JPEG），結果頁列表只需要小圖
+- 原圖保留上游的格式（JPEG / PNG / WebP / GIF），副檔名與回應的 Content-Type 跟著格式；
+  瀏覽器不支援的其他格式轉成 JPEG 再保存
+- 總大小超過上限時，淘汰最久沒被讀取的圖片（LRU）
+- 索引（網址 → 雜湊、各圖片大小與最後讀取時間）存在同目錄的 SQLite
+
+使用方法：
+    cache = ProductImageCache()
+    await cache.fetch_many(["https://gcs.rimg.com.tw/....jpg"])
+    digest = cache.digest_for(url)
+    path = cache.path_for(digest, thumbnail=True)
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List
+from urllib.parse import urljoin
+
+import aiohttp
+from PIL import Image, UnidentifiedImageError
+
+from app.config import RUTEN_BASE_URL, RUTEN_IMAGE_BASE_URL
+from app.services.headers import DEFAULT_USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+# 預設參數
+PRODUCT_IMAGE_DIR = "product_images"
+IMAGE_CACHE_MAX_BYTES = 500 * 1024 * 1024  # 原圖與縮圖合計的大小上限
+THUMBNAIL_SIZE = (160, 160)                # 縮圖的最大寬高（維持比例）
+THUMBNAIL_QUALITY = 80                     # 縮圖的 JPEG 品質
+MAX_CONCURRENT_IMAGE_FETCHES = 8           # 同時下載的圖片數量上限
+IMAGE_FETCH_TIMEOUT = 15                   # 單張圖片下載逾時秒數
+MAX_IMAGE_BYTES = 10 * 1024 * 1024         # 單張圖片大小上限，超過就不快取
+ORIGINAL_QUALITY = 90                      # 原圖需要轉成 JPEG 時的品質
+
+# 原圖直接保存的格式（Pillow 的格式名稱 -> 副檔名），其他格式轉成 JPEG
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "MPO": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+# 副檔名 -> 圖片 API 回應的 Content-Type
+IMAGE_MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "gif": "image/gif"}
+
+
+def media_type_for(path: str) -> str:
+    """依快取檔案的副檔名回傳 Content-Type"""
+    return IMAGE_MEDIA_TYPES.get(os.path.splitext(path)[1].lstrip("."), "image/jpeg")
+
+
+def plan_image_urls(plan: Dict) -> List[str]:
+    """從 plan.json（calculator_service 輸出）取出所有商品圖片網址，去除重複、保持順序"""
+    urls = []
+    for seller in plan.get("sellers", {}).values():
+        for item in seller.get("items", []):
+            url = item.get("image_url")
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def _prepare_image(content: bytes) -> tuple:
+    """
+    判斷原圖格式並產生 JPEG 縮圖（在執行緒中呼叫，避免卡住事件迴圈）。
+
+    Returns:
+        (要保存的原圖內容, 副檔名, 縮圖內容)；不在 IMAGE_EXTENSIONS 的格式轉成 JPEG
+
+    Raises:
+        UnidentifiedImageError: 內容不是圖片
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        extension = IMAGE_EXTENSIONS.get(image.format)
+        if extension is None:
+            output = io.BytesIO()
+            image.convert("RGB").save(output, "JPEG", quality=ORIGINAL_QUALITY)
+            content, extension = output.getvalue(), "jpg"
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=THUMBNAIL_QUALITY)
+        return content, extension, output.getvalue()
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    """
+    先寫暫存檔再改名，中斷時不會留下寫一半的檔案。
+
+    每次寫入使用各自的暫存檔，同一張圖片同時被下載兩次時不會互相覆蓋。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ProductImageCache:
+    """
+    內容定址的商品圖片快取（原圖 + 縮圖）。
+
+    讀取（path_for）時更新最後讀取時間；寫入後若總大小超過 max_bytes，
+    從最久沒被讀取的圖片開始刪除，直到低於上限。
+    """
+
+    def __init__(self, directory: str = PRODUCT_IMAGE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        """
+        Args:
+            directory: 圖片快取的根目錄（底下有 full/、thumb/ 與索引檔）
+            max_bytes: 原圖與縮圖合計的大小上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "full"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "thumb"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        """關閉索引資料庫"""
+        self._conn.close()
+
+    def _file_path(self, digest: str, thumbnail: bool, extension: str = "jpg") -> str:
+        return os.path.join(self.directory, "thumb" if thumbnail else "full", f"{digest}.{extension}")
+
+    def _existing_path(self, digest: str, thumbnail: bool) -> str | None:
+        """找出已保存的檔案（原圖的副檔名依格式而定，縮圖一律 .jpg）"""
+        extensions = ["jpg"] if thumbnail else list(IMAGE_MEDIA_TYPES)
+        for extension in extensions:
+            path = self._file_path(digest, thumbnail, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def digest_for(self, url: str) -> str | None:
+        """已快取的圖片網址對應的內容雜湊，沒有快取時回傳 None"""
+        try:
+            row = self._conn.execute("SELECT digest FROM urls WHERE url = ?", (url,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"讀取圖片快取索引失敗: {e}")
+            return None
+        return row[0] if row else None
+
+    def local_urls(self, image_url: str) -> tuple:
+        """
+        把露天圖片網址換成本地圖片 API（app/routers/images.py）的網址。
+
+        Returns:
+            (原圖網址, 縮圖網址)；尚未快取時回傳 (原本的網址, "")
+        """
+        digest = self.digest_for(image_url) if image_url else None
+        if not digest:
+            return image_url, ""
+        return f"/api/images/{digest}", f"/api/images/{digest}?thumb=true"
+
+    def path_for(self, digest: str, thumbnail: bool = False) -> str | None:
+        """
+        取得圖片檔案路徑並更新最後讀取時間。
+
+        Args:
+            digest: 內容雜湊（SHA-256 十六進位字串）
+            thumbnail: True 時回傳縮圖路徑
+        Returns:
+            檔案路徑（副檔名代表圖片格式，見 media_type_for），不在快取中時回傳 None
+        """
+        path = self._existing_path(digest, thumbnail)
+        if path is None:
+            return None
+        try:
+            self._conn.execute(
+                "UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), digest)
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"更新圖片快取索引失敗: {e}")
+        return path
+
+    async def fetch_many(self, urls: List[str]) -> Dict[str, str]:
+        """
+        [非同步] 下載尚未快取的圖片並產生縮圖。
+
+        已快取的網址直接略過；下載失敗或內容不是圖片的網址只記錄警告。
+
+        Returns:
+            {網址: 內容雜湊}（只包含成功快取的網址）
+        """
+        digests = {url: digest for url in urls if (digest := self.digest_for(url))}
+        missing = [url for url in dict.fromkeys(urls) if url not in digests]
+        cached = len(digests)
+        if not missing:
+            return digests
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMAGE_FETCHES)
+        headers = {"User-Agent": DEFAULT_USER_AGENT, "Referer": f"{RUTEN_BASE_URL}/"}
+        timeout = aiohttp.ClientTimeout(total=IMAGE_FETCH_TIMEOUT)
+
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
+            async def fetch(url: str) -> None:
+                try:
+                    async with semaphore:
+                        content = await self._download(session, url)
+                    digest = await self.store(url, content)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, OSError) as e:
+                    logger.warning(f"下載商品圖片 {url} 失敗: {e}")
+                    return
+                digests[url] = digest
+
+            await asyncio.gather(*(fetch(url) for url in missing))
+
+        logger.info(f"商品圖片快取：{cached} 張已在快取中，新下載 {len(digests) - cached} 張")
+        return digests
+
+    async def _download(self, session: aiohttp.ClientSession, url: str) -> bytes:
+        """下載單張圖片（相對路徑以露天圖片網址補齊）"""
+        async with session.get(urljoin(f"{RUTEN_IMAGE_BASE_URL}/", url)) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > MAX_IMAGE_BYTES:
+                raise ValueError("圖片太大")
+            content = await response.read()
+        if len(content) > MAX_IMAGE_BYTES:
+            raise ValueError("圖片太大")
+        return content
+
+    async def store(self, url: str, content: bytes) -> str:
+        """
+        [非同步] 以內容雜湊保存圖片與縮圖，回傳雜湊。
+
+        Raises:
+            ValueError: 內容不是可以解析的圖片
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        exists = self._conn.execute(
+            "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+        ).fetchone() is not None
+        if not exists:
+            try:
+                original, extension, thumbnail = await asyncio.to_thread(_prepare_image, content)
+            except (UnidentifiedImageError, OSError) as e:
+                raise ValueError(f"不是有效的圖片: {e}") from e
+            await asyncio.to_thread(_write_atomic, self._file_path(digest, False, extension), original)
+            await asyncio.to_thread(_write_atomic, self._file_path(digest, True), thumbnail)
+
+        try:
+            if not exists:
+                # 相同內容可能同時在下載，只有第一個寫入索引的計入大小
+                size = len(original) + len(thumbnail)
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", (digest, size, time.time())
+                ).rowcount
+                self._total_bytes += size if inserted else 0
+            self._conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+            self._conn.commit()
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入圖片快取索引失敗: {e}")
+        return digest
+
+    def _evict(self) -> None:
+        """從最久沒被讀取的圖片開始刪除，直到總大小低於上限"""
+        rows = self._conn.execute(
+            "SELECT digest, size FROM blobs ORDER BY accessed_at"
+        ).fetchall()
+        for digest, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            for thumbnail in (False, True):
+                while (path := self._existing_path(digest, thumbnail)) is not None:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            self._total_bytes -= size
+        self._conn.commit()
@@ -7,16 +7,23 @@ app/services/konami_scraper.py - Konami 官方資料庫爬蟲
 功能：根據 CID（Konami 卡片 ID）爬取該卡片的所有版本卡號與稀有度。
 """
 import logging
+import os
 import random
 import re
 import time
 
 import requests
-from fake_useragent import UserAgent
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from app.config import KONAMI_DB_BASE_URL, KONAMI_REFERER_URL
+from app.config import (
+    KONAMI_CASSETTE_NAME,
+    KONAMI_DB_BASE_URL,
+    SCRAPER_HTTP_MODE,
+)
+from app.services.cassette import HTTP_MODES, Cassette, CassetteMissError
+from app.services.headers import KONAMI_HEADERS
+from app.services.storage import DATA_DIR
 
 # 設定日誌格式，方便追蹤程式執行狀況與錯誤
 logger = logging.getLogger(__name__)
@@ -35,10 +42,27 @@ class KonamiScraper:
         # results = {"4007": [{"card_number": "DABL-JP035", ...}, ...], ...}
     """
 
-    def __init__(self):
-        """初始化爬蟲工具，設定 Session 與重試機制，模擬真實使用者行為"""
+    def __init__(self, http_mode: str = SCRAPER_HTTP_MODE, cassette_path: str | None = None):
+        """
+        初始化爬蟲工具，設定 Session 與重試機制，模擬真實使用者行為
+
+        Args:
+            http_mode: "live" 正常連線；"record" 把請求/回應錄到 cassette_path；
+                "replay" 不連網，改從 cassette_path 回應（不再隨機等待 1~3 秒）
+            cassette_path: 錄製檔路徑，預設為 data/konami_cassette.jsonl.gz
+
+        Raises:
+            ValueError: http_mode 不正確
+            FileNotFoundError: 重播模式但錄製檔不存在
+        """
+        if http_mode not in HTTP_MODES:
+            raise ValueError(f"不支援的 HTTP 模式: {http_mode}")
+        self.cassette = None
+        if http_mode != "live":
+            self.cassette = Cassette(
+                cassette_path or os.path.join(DATA_DIR, KONAMI_CASSETTE_NAME), http_mode
+            )
         self.session = requests.Session()
-        self.ua = UserAgent()
 
         # 設定連線重試策略，當遇到 500, 502, 503, 504 錯誤時自動重試
         retry_strategy = Retry(
@@ -52,22 +76,8 @@ class KonamiScraper:
         self.session.mount("https://", adapter)
 
     def _get_headers(self):
-        """產生隨機的 User-Agent 與標準標頭，以偽裝成真實瀏覽器"""
-        try:
-            return {
-                "User-Agent": self.ua.random,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "ja,en-US;q=0.7,en;q=0.3",
-                "Referer": KONAMI_REFERER_URL,
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-            }
-        except Exception as e:
-            logger.warning(f"無法產生隨機 User-Agent，使用預設值: {e}")
-            return {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                "Accept-Language": "ja",
-            }
+        """取得隨機 User-Agent 與標準標頭，以偽裝成真實瀏覽器（從共用的標頭池輪替取用）"""
+        return KONAMI_HEADERS.next()
 
     def fetch_data(self, cid):
         """
@@ -77,17 +87,34 @@ class KonamiScraper:
             cid (str): Konami Card ID (例如: "4006")
 
         Returns:
-            str: 網頁 HTML 內容，若失敗則回傳 None
+            str: 網頁 HTML 內容，若失敗（含重播模式沒有錄到這個 CID）則回傳 None
         """
         url = f"{KONAMI_DB_BASE_URL}?ope=2&cid={cid}&request_locale=ja"
         logger.info(f"正在抓取 CID: {cid} - URL: {url}")
 
+        if self.cassette is not None and self.cassette.replaying:
+            try:
+                entry = self.cassette.replay(url)
+            except CassetteMissError as e:
+                logger.error(f"抓取 CID {cid} 時發生錯誤: {e}")
+                return None
+            if entry["status"] >= 400:
+                logger.error(f"抓取 CID {cid} 時發生錯誤: HTTP {entry['status']}（重播）")
+                return None
+            return entry["body"]
+
         try:
             # 加入隨機延遲 (1~3秒)，避免被伺服器視為惡意攻擊
             delay = random.uniform(1, 3)
             time.sleep(delay)
 
             response = self.session.get(url, headers=self._get_headers(), timeout=10)
+            if self.cassette is not None:
+                self.cassette.record(
+                    url, None, response.status_code,
+                    response.text if response.ok else None,
+                    response.headers.get("Retry-After"),
+                )
             response.raise_for_status()
             return response.text
         except requests.RequestException as e:
@@ -207,4 +234,6 @@ class KonamiScraper:
                 results[cid] = []
                 logger.warning(f"CID {cid} 抓取失敗或無資料")
 
+        if self.cassette is not None:
+            self.cassette.save()
         return results
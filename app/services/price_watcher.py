@@ -0,0 +1,215 @@
+"""
+app/services/price_watcher.py - 背景價格監看
+============================================
+在伺服器背景定期重新爬取「最近使用過的專案」裡的卡號，讓露天回應快取保持新鮮，
+使用者按下執行（/run）時大部分資料都能直接命中快取，幾秒內就能完成。
+
+- 每個卡號有各自的更新間隔：出現在越多近期專案的卡號（熱門卡）更新越頻繁
+- 全域請求額度：滑動時間窗內背景更新最多送出 WATCHER_REQUEST_BUDGET 個請求
+- 讓路給互動執行：有 /run 正在進行時暫停背景更新，進行中的更新會被取消、之後重來
+
+使用方法（server.py 的 lifespan）：
+    watcher = PriceWatcher()
+    watcher.start()
+    ...
+    async with watcher.interactive():   # /run 執行期間
+        ...
+    await watcher.stop()
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from app.services import storage
+from app.services.ruten_scraper import RESPONSE_CACHE_TTLS, RutenScraper, normalize_keyword
+
+logger = logging.getLogger(__name__)
+
+# 預設參數
+WATCHER_PROJECT_MAX_AGE = 3 * 24 * 60 * 60  # 幾秒內動過的專案算「最近使用」
+WATCHER_BASE_INTERVAL = RESPONSE_CACHE_TTLS["search"] - 5 * 60  # 一般卡號的更新間隔（比快取 TTL 短）
+WATCHER_MIN_INTERVAL = 10 * 60      # 熱門卡號的更新間隔下限
+WATCHER_REQUEST_BUDGET = 600        # 每個時間窗內背景更新最多送出的請求數
+WATCHER_BUDGET_WINDOW = 60 * 60     # 請求額度的滑動時間窗（秒）
+WATCHER_TICK = 60                   # 多久檢查一次有哪些卡號需要更新（秒）
+WATCHER_STARTUP_DELAY = 60          # 伺服器啟動後等多久才開始第一次檢查（秒）
+
+
+class PriceWatcher:
+    """
+    背景價格監看排程器。
+
+    每 WATCHER_TICK 秒掃描一次近期專案的購物車，依「距離上次更新的時間 / 更新間隔」
+    由最逾期的卡號開始，一次更新一個卡號；額度用完或有互動執行時就先停下來。
+    """
+
+    def __init__(
+        self,
+        scraper: RutenScraper | None = None,
+        request_budget: int = WATCHER_REQUEST_BUDGET,
+        budget_window: float = WATCHER_BUDGET_WINDOW,
+        tick: float = WATCHER_TICK,
+        startup_delay: float = WATCHER_STARTUP_DELAY,
+    ):
+        """
+        Args:
+            scraper: 背景更新使用的爬蟲，預設建立一個並行上限為 1 的 RutenScraper
+            request_budget: 每個時間窗內最多送出的請求數
+            budget_window: 請求額度的滑動時間窗（秒）
+            tick: 檢查間隔（秒）
+            startup_delay: 啟動後第一次檢查前的等待秒數
+        """
+        self.scraper = scraper or RutenScraper(max_concurrency=1)
+        self.request_budget = request_budget
+        self.budget_window = budget_window
+        self.tick = tick
+        self.startup_delay = startup_delay
+        self.last_refreshed: Dict[str, float] = {}  # 卡號 -> 上次更新完成的時間
+        self.stats: Dict[str, int] = {"refreshed": 0, "preempted": 0, "failed": 0}
+        self._spent: deque = deque()   # (時間, 請求數)，滑動時間窗內已用掉的額度
+        self._interactive_runs = 0
+        self._idle = asyncio.Event()   # 沒有互動執行時為 set
+        self._idle.set()
+        self._loop_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    # ------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------
+
+    def start(self) -> None:
+        """開始背景排程（重複呼叫不會建立第二個）"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        """停止背景排程並等待進行中的更新結束"""
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        try:
+            await self._loop_task
+        except asyncio.CancelledError:
+            pass
+        self._loop_task = None
+
+    @asynccontextmanager
+    async def interactive(self):
+        """
+        互動執行（/run）期間使用：暫停背景更新，並取消正在進行的更新。
+
+        被取消的卡號不會記錄為已更新，之後的檢查會重新排入。
+        """
+        self._interactive_runs += 1
+        self._idle.clear()
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        try:
+            yield
+        finally:
+            self._interactive_runs -= 1
+            if self._interactive_runs == 0:
+                self._idle.set()
+
+    async def _run_forever(self) -> None:
+        """背景排程主迴圈，單次檢查出錯只記錄下來，不會讓排程停止"""
+        await asyncio.sleep(self.startup_delay)
+        while True:
+            try:
+                await self.refresh_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"背景價格監看發生錯誤: {e}")
+            await asyncio.sleep(self.tick)
+
+    # ------------------------------------------------------------
+    # 排程
+    # ------------------------------------------------------------
+
+    def collect_intervals(self) -> Dict[str, float]:
+        """
+        從近期專案的購物車整理出要監看的卡號與各自的更新間隔。
+
+        更新間隔 = WATCHER_BASE_INTERVAL / 出現在幾個近期專案，不低於 WATCHER_MIN_INTERVAL。
+
+        Returns:
+            {正規化卡號: 更新間隔秒數}
+        """
+        popularity: Dict[str, int] = {}
+        carts = storage.list_recent_carts(WATCHER_PROJECT_MAX_AGE)
+        for cart in carts.values():
+            jobs = self.scraper._collect_search_jobs(cart.get("shopping_cart", []))
+            for keyword in {normalize_keyword(card_number) for _, card_number, _ in jobs}:
+                popularity[keyword] = popularity.get(keyword, 0) + 1
+        return {
+            keyword: max(WATCHER_MIN_INTERVAL, WATCHER_BASE_INTERVAL / count)
+            for keyword, count in popularity.items()
+        }
+
+    def due_keywords(self, now: float | None = None) -> List[str]:
+        """回傳已到更新時間的卡號，最逾期的排最前面（從未更新過的最優先）"""
+        now = time.time() if now is None else now
+        overdue = []
+        for keyword, interval in self.collect_intervals().items():
+            last = self.last_refreshed.get(keyword)
+            ratio = float("inf") if last is None else (now - last) / interval
+            if ratio >= 1:
+                overdue.append((ratio, keyword))
+        overdue.sort(key=lambda x: x[0], reverse=True)
+        return [keyword for _, keyword in overdue]
+
+    def remaining_budget(self, now: float | None = None) -> int:
+        """滑動時間窗內還能送出的請求數"""
+        now = time.time() if now is None else now
+        while self._spent and now - self._spent[0][0] > self.budget_window:
+            self._spent.popleft()
+        return self.request_budget - sum(count for _, count in self._spent)
+
+    async def refresh_due(self) -> int:
+        """
+        [非同步] 依序更新已到期的卡號，直到額度用完。
+
+        每個卡號更新前都會等待互動執行結束；更新途中被互動執行搶先時，
+        該卡號留到下一次檢查。
+
+        Returns:
+            本次成功更新的卡號數
+        """
+        refreshed = 0
+        for keyword in self.due_keywords():
+            await self._idle.wait()
+            if self.remaining_budget() <= 0:
+                logger.info("背景價格監看：本時段的請求額度已用完，等待下一個時段")
+                break
+
+            self._refresh_task = asyncio.create_task(self.scraper.warm([keyword]))
+            try:
+                stats = await asyncio.shield(self._refresh_task)
+            except asyncio.CancelledError:
+                if not self._refresh_task.cancelled():
+                    # 排程本身被停止：取消更新並等它關閉連線池
+                    self._refresh_task.cancel()
+                    await asyncio.gather(self._refresh_task, return_exceptions=True)
+                    raise
+                self.stats["preempted"] += 1
+                logger.info(f"背景價格監看：有互動執行開始，暫停更新卡號 {keyword}")
+                continue
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"背景價格監看：更新卡號 {keyword} 失敗: {e}")
+                continue
+            finally:
+                self._spent.append((time.time(), self.scraper.stats["requests_sent"]))
+
+            self.last_refreshed[keyword] = time.time()
+            self.stats["refreshed"] += 1
+            refreshed += 1
+            logger.info(
+                f"背景價格監看：已更新卡號 {keyword}（{stats['requests_sent']} 個請求，"
+                f"剩餘額度 {self.remaining_budget()}）"
+            )
+        return refreshed
@@ -0,0 +1,191 @@
+"""
+app/services/rate_limiter.py - 自適應（AIMD）請求限流器
+=======================================================
+依照對方伺服器的回應狀況自動調整請求速率與並行數：
+- 回應正常：速率與並行數「加法」慢慢往上調（Additive Increase）
+- 收到 429 / 5xx、連線失敗或延遲明顯變高：「乘法」砍半（Multiplicative Decrease）
+- 回應帶有 Retry-After：在指定時間之前不再送出任何請求
+
+使用方法：
+    limiter = AdaptiveRateLimiter()
+    await limiter.acquire()
+    try:
+        ... 發送請求 ...
+    finally:
+        await limiter.release(status, latency, retry_after)
+"""
+import asyncio
+import email.utils
+import time
+
+# 預設參數
+INITIAL_RATE = 5.0          # 初始速率（每秒請求數）
+MIN_RATE = 0.5              # 速率下限
+MAX_RATE = 20.0             # 速率上限
+RATE_INCREASE_STEP = 0.2    # 每次成功回應增加的速率
+INITIAL_CONCURRENCY = 5.0   # 初始並行數
+MIN_CONCURRENCY = 1.0       # 並行數下限
+MAX_CONCURRENCY = 20.0      # 並行數上限
+CONCURRENCY_INCREASE_STEP = 0.1  # 每次成功回應增加的並行數
+DECREASE_FACTOR = 0.5       # 遇到壅塞時乘上的倍率
+DECREASE_COOLDOWN = 1.0     # 兩次降速之間至少間隔幾秒（同一波失敗只降一次）
+LATENCY_THRESHOLD = 2.5     # 近期延遲超過基準的幾倍視為壅塞
+LATENCY_EWMA_WEIGHT = 0.3   # 近期延遲（快速指數移動平均）中新樣本的權重
+LATENCY_BASELINE_WEIGHT = 0.02  # 延遲基準（慢速指數移動平均）中新樣本的權重
+LATENCY_OUTLIER_CAP = 4.0   # 單一樣本最多以基準的幾倍計入，避免一次離群值就觸發降速
+LATENCY_WARMUP_SAMPLES = 5  # 累積幾筆樣本後才開始用延遲判斷壅塞
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    解析 Retry-After 標頭，回傳需要等待的秒數。
+
+    支援秒數（"120"）與 HTTP 日期（"Wed, 21 Oct 2015 07:28:00 GMT"）兩種格式，
+    無法解析時回傳 None。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class AdaptiveRateLimiter:
+    """
+    單一主機的 AIMD 自適應限流器。
+
+    同時控制兩件事：
+    - 速率：相鄰兩次請求開始時間至少間隔 1/rate 秒
+    - 並行數：同時在途的請求不超過 int(concurrency)
+    """
+
+    def __init__(
+        self,
+        rate: float = INITIAL_RATE,
+        concurrency: float = INITIAL_CONCURRENCY,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+        min_concurrency: float = MIN_CONCURRENCY,
+        max_concurrency: float = MAX_CONCURRENCY,
+    ):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+        self.increases = 0          # 加速次數
+        self.decreases = 0          # 降速次數
+        self.throttled = 0          # 收到 429 的次數
+        self.retry_after_waits = 0  # 依 Retry-After 暫停的次數
+
+        self._in_flight = 0
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._latency_baseline: float | None = None
+        self._latency_recent: float | None = None
+        self._latency_samples = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """等到並行數與速率都允許時才回傳，呼叫者之後必須呼叫 release()"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.concurrency))
+            self._in_flight += 1
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot, self._blocked_until)
+        self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            try:
+                await asyncio.sleep(slot - now)
+            except BaseException:
+                # 等待速率時被取消：還沒送出請求，呼叫者也不會 release()，要自己歸還並行名額
+                await self._release_slot()
+                raise
+
+    async def release(
+        self, status: int | None, latency: float, retry_after: float | None = None
+    ) -> None:
+        """
+        回報請求結果並調整速率。
+
+        Args:
+            status: HTTP 狀態碼；連線失敗或逾時傳入 None
+            latency: 這次請求花費的秒數
+            retry_after: 回應的 Retry-After 秒數（若有）
+        """
+        now = asyncio.get_running_loop().time()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.retry_after_waits += 1
+        if status == 429:
+            self.throttled += 1
+
+        if status is None or status == 429 or status >= 500:
+            self._decrease(now)
+        elif status < 400:
+            self._observe_latency(latency)
+            if self._latency_congested():
+                self._decrease(now)
+            else:
+                self._increase()
+
+        await self._release_slot()
+
+    def snapshot(self) -> dict:
+        """回傳目前的速率狀態（供爬蟲統計使用）"""
+        return {
+            "rate": round(self.rate, 2),
+            "concurrency": int(self.concurrency),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "throttled": self.throttled,
+            "retry_after_waits": self.retry_after_waits,
+        }
+
+    async def _release_slot(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _latency_congested(self) -> bool:
+        """近期延遲是否持續明顯高於長期基準（單一離群值不算）"""
+        return (
+            self._latency_baseline is not None
+            and self._latency_samples >= LATENCY_WARMUP_SAMPLES
+            and self._latency_recent > self._latency_baseline * LATENCY_THRESHOLD
+        )
+
+    def _observe_latency(self, latency: float) -> None:
+        """更新快、慢兩條延遲指數移動平均"""
+        if self._latency_baseline is None:
+            self._latency_baseline = self._latency_recent = latency
+        else:
+            latency = min(latency, self._latency_baseline * LATENCY_OUTLIER_CAP)
+            self._latency_recent += LATENCY_EWMA_WEIGHT * (latency - self._latency_recent)
+            self._latency_baseline += LATENCY_BASELINE_WEIGHT * (latency - self._latency_baseline)
+        self._latency_samples += 1
+
+    def _increase(self) -> None:
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+        self.concurrency = min(self.max_concurrency, self.concurrency + CONCURRENCY_INCREASE_STEP)
+        self.increases += 1
+
+    def _decrease(self, now: float) -> None:
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+        self.concurrency = max(self.min_concurrency, self.concurrency * DECREASE_FACTOR)
+        self.decreases += 1
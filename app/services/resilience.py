@@ -0,0 +1,219 @@
+"""
+app/services/resilience.py - 非同步請求的重試、退避與斷路器
+=========================================================
+提供爬蟲共用的韌性元件：
+- is_transient_error : 區分暫時性錯誤（值得重試）與永久性錯誤（重試也沒用）
+- backoff_delay      : 帶隨機抖動（full jitter）的指數退避
+- RetryBudget        : 每個端點的重試額度，避免對方出問題時重試把流量放大
+- CircuitBreaker     : 連續失敗達門檻就暫時「斷路」，期間直接失敗不再送出請求
+- LatencyTracker     : 最近請求延遲的滾動百分位數，決定何時送出備援（hedge）請求
+- HedgeBudget        : 限制備援請求佔總請求的比例，避免把對方的負載加倍
+
+使用方法：
+    breaker = CircuitBreaker()
+    budget = RetryBudget()
+    breaker.before_request()       # 斷路中會拋出 CircuitOpenError
+    budget.record_request()
+    ...
+"""
+import asyncio
+import math
+import random
+import time
+from collections import deque
+
+import aiohttp
+
+# 預設參數
+RETRY_BACKOFF_BASE = 0.5       # 第一次重試前的退避上限（秒），之後每次加倍
+RETRY_BACKOFF_CAP = 8.0        # 退避秒數上限
+RETRY_BUDGET_MIN = 10          # 每個端點至少允許的重試次數
+RETRY_BUDGET_RATIO = 0.2       # 另外依請求數成比例增加的重試額度
+BREAKER_FAILURE_THRESHOLD = 5  # 連續幾次暫時性失敗就斷路
+BREAKER_RESET_TIMEOUT = 30.0   # 斷路後多久允許一次試探請求（秒）
+HEDGE_PERCENTILE = 0.9         # 超過最近延遲的第幾百分位仍未回應就送出備援請求
+HEDGE_WINDOW = 200             # 計算百分位時保留最近幾筆延遲
+HEDGE_MIN_SAMPLES = 20         # 累積幾筆延遲後才開始送出備援請求
+HEDGE_MAX_RATIO = 0.1          # 備援請求最多佔總請求數的比例
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，請求被直接拒絕"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    判斷錯誤是否為暫時性的（值得重試）。
+
+    暫時性：逾時、連線失敗、傳輸中斷、HTTP 429 與 5xx
+    永久性：其他 4xx、回應不是 JSON、程式錯誤等
+    """
+    if isinstance(error, aiohttp.ContentTypeError):
+        return False
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(
+        error,
+        (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError),
+    )
+
+
+def backoff_delay(
+    attempt: int, base: float = RETRY_BACKOFF_BASE, cap: float = RETRY_BACKOFF_CAP
+) -> float:
+    """
+    第 attempt 次重試（從 0 開始）前要等待的秒數。
+
+    使用 full jitter：在 [0, min(cap, base * 2^attempt)] 之間隨機取值，
+    避免大量請求在同一時間一起重試。
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """
+    單一端點的重試額度。
+
+    可重試次數 = min_retries + ratio × 已送出的請求數；
+    額度用完後暫時性錯誤也不再重試，讓對方有時間恢復。
+    """
+
+    def __init__(self, min_retries: int = RETRY_BUDGET_MIN, ratio: float = RETRY_BUDGET_RATIO):
+        self.min_retries = min_retries
+        self.ratio = ratio
+        self.requests = 0
+        self.retries = 0
+
+    def record_request(self) -> None:
+        """每送出一次請求（含重試）就呼叫一次"""
+        self.requests += 1
+
+    def try_spend(self) -> bool:
+        """嘗試使用一次重試額度，額度不足時回傳 False"""
+        if self.retries + 1 > self.min_retries + self.ratio * self.requests:
+            return False
+        self.retries += 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    簡單的三態斷路器（closed → open → half-open）。
+
+    - closed   : 正常放行，連續 failure_threshold 次暫時性失敗就轉為 open
+    - open     : 直接拒絕（CircuitOpenError），經過 reset_timeout 後轉為 half-open
+    - half-open: 只放行一個試探請求，成功就恢復 closed，失敗則重新 open
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.rejections = 0       # 因斷路被直接拒絕的請求數
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_request(self) -> None:
+        """
+        送出請求前呼叫。
+
+        Raises:
+            CircuitOpenError: 斷路中，或半開狀態已有試探請求在途
+        """
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejections += 1
+                raise CircuitOpenError("斷路器開啟中，暫停送出請求")
+            self.state = "half-open"
+        if self.state == "half-open":
+            if self._probe_in_flight:
+                self.rejections += 1
+                raise CircuitOpenError("斷路器半開中，等待試探請求結果")
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """請求成功（或對方有正常回應的永久性錯誤）"""
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        """回傳目前的斷路器狀態（供爬蟲統計使用）"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejections": self.rejections,
+        }
+
+    def release_probe(self) -> None:
+        """請求被取消、結果未知：不改變狀態，只讓出半開狀態的試探名額"""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """請求發生暫時性錯誤"""
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == "half-open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    單一端點最近請求延遲的滾動百分位數。
+
+    樣本數不足 min_samples 時 threshold() 回傳 None（不送備援請求）。
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        window: int = HEDGE_WINDOW,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def observe(self, latency: float) -> None:
+        """記錄一筆已完成請求的延遲（秒）"""
+        self._samples.append(latency)
+
+    def threshold(self) -> float | None:
+        """目前的百分位延遲（秒）"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    所有端點共用的備援請求額度：備援請求數不超過 max_ratio × 一般請求數。
+    """
+
+    def __init__(self, max_ratio: float = HEDGE_MAX_RATIO):
+        self.max_ratio = max_ratio
+        self.requests = 0
+        self.hedges = 0
+
+    def record_request(self) -> None:
+        """每送出一次一般請求就呼叫一次"""
+        self.requests += 1
+
+    def try_spend(self) -> bool:
+        """嘗試使用一次備援額度，額度不足時回傳 False"""
+        if self.hedges + 1 > self.max_ratio * self.requests:
+            return False
+        self.hedges += 1
+        return True
@@ -7,26 +7,47 @@ app/services/ruten_scraper.py - 露天拍賣爬蟲服務
 功能：根據購物車中的卡片清單，到露天拍賣搜尋商品並儲存為 CSV。
 """
 import asyncio
+import contextvars
+import csv
+import hashlib
 import json
 import logging
+import math
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
-from typing import Dict, List
+import sqlite3
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, List
+from urllib.parse import urlsplit
 
 import aiohttp
-import pandas as pd
-import requests
-from fake_useragent import UserAgent
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
 
 from app.config import (
+    HTTP_CASSETTE_NAME,
     RUTEN_API_BASE_URL,
-    RUTEN_BASE_URL,
     RUTEN_IMAGE_BASE_URL,
     RUTEN_ITEMS_API_BASE_URL,
+    SCRAPE_METRICS_NAME,
+    SCRAPER_HTTP_MODE,
 )
+from app.services.cassette import HTTP_MODES, Cassette
+from app.services.cleaner_service import DataCleaner, match_card_code
+from app.services.headers import RUTEN_HEADERS
+from app.services.rate_limiter import MAX_CONCURRENCY as LIMITER_MAX_CONCURRENCY
+from app.services.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgeBudget,
+    LatencyTracker,
+    RetryBudget,
+    backoff_delay,
+    is_transient_error,
+)
+from app.services.scrape_metrics import ScrapeMetrics
+from app.services.storage import DATA_DIR
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -34,16 +55,623 @@ logger = logging.getLogger(__name__)
 # 基本設定
 BASE_URL = RUTEN_API_BASE_URL
 IMAGE_BASE_URL = RUTEN_IMAGE_BASE_URL
-DEFAULT_TIMEOUT = 10       # 預設連線超時秒數
-DEFAULT_RETRY_DELAY = 1    # 重試連線前的等待秒數
-MAX_RETRIES = 3            # 最大重試次數
+DEFAULT_TIMEOUT = 10       # 預設超時秒數（建立連線、兩次讀取之間各自計算，不含等待連線池）
+MAX_RETRIES = 3            # 暫時性錯誤（逾時、429、5xx）最多重試幾次
 ITEMS_PER_PAGE = 110       # 每次搜尋抓取的商品數量
-DEFAULT_USER_AGENT = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/91.0.4472.124 Safari/537.36"
-)
 MAX_CONCURRENT_REQUESTS = 10  # 同一時間最多發送幾個請求
+SEARCH_SORT_DEFAULT = "rnk/dc"    # 露天預設排序（相關度）
+SEARCH_SORT_PRICE_ASC = "prc/ac"  # 價格由低到高（需求導向翻頁使用）
+DEMAND_SAFETY_FACTOR = 2.0        # 需求導向翻頁：找到的庫存需達需求量的幾倍才停止
+DEMAND_MIN_SELLERS = 3            # 需求導向翻頁：至少要涵蓋幾個不同賣家才停止
+DEMAND_LOOKAHEAD_PAGES = 1        # 需求導向翻頁：最多比已判斷完的頁面多預抓幾頁
+MAX_CONCURRENT_VARIANT_FETCHES = 5  # 每頁同時查詢複數選項詳情的上限
+PIPELINE_QUEUE_SIZE = 2       # 搜尋/詳情/選項各階段之間的佇列長度（背壓）
+# 連線池對單一主機保留的連線上限：與限流器的並行數上限相同，
+# 限流器放行的請求不會再卡在連線池排隊（排隊時間會被當成延遲變高而觸發降速）
+MAX_CONNECTIONS_PER_HOST = int(LIMITER_MAX_CONCURRENCY)
+RUTEN_API_HOSTS = 2            # 露天 API 主機數（rtapi：搜尋/詳情，rapi：選項查詢）
+DNS_CACHE_TTL = 300            # DNS 查詢結果快取秒數
+KEEPALIVE_TIMEOUT = 30         # 閒置連線保留秒數
+RETRY_BUDGETS = {              # 各端點的重試額度：(至少可重試次數, 依請求數增加的比例)
+    "search": (10, 0.2),       # 搜尋結果少了一頁就少一整頁商品，額度給多一點
+    "detail": (10, 0.2),
+    "items": (20, 0.1),        # 選項查詢數量多，比例放低避免放大流量
+}
+HEDGED_ENDPOINTS = ("detail", "items")  # 啟用 hedge 時會送出備援請求的端點
+MAX_PAGES_PER_KEYWORD = 5      # 每個卡號最多爬幾頁，避免抓太久
+RUN_REQUEST_BUDGET = 3000      # /run 單次爬蟲最多送出幾個請求（含重試），用完後只保留已取得的資料
+BUDGET_REQUESTS_PER_PAGE = 5   # 依請求額度分配頁數時，預估每頁需要的請求數（搜尋、詳情與部分選項查詢）
+
+
+class RequestBudgetExhaustedError(Exception):
+    """本次 run 的請求額度已用完，請求被直接拒絕"""
+
+
+# 目前這個卡號的爬取中被請求額度拒絕的請求數。_scrape_keyword 為每個卡號的爬取各自設定，
+# 爬取過程建立的子工作會繼承同一個 Counter，同時進行的其他卡號互不影響
+_keyword_budget_rejections: contextvars.ContextVar[Counter | None] = contextvars.ContextVar(
+    "_keyword_budget_rejections", default=None
+)
+
+
+def normalize_keyword(keyword: str) -> str:
+    """正規化搜尋關鍵字（卡號）：轉大寫並合併多餘空白"""
+    return " ".join(str(keyword).upper().split())
+
+
+class _SingleFlight:
+    """
+    合併同時進行的相同工作：同一個 key 同時只執行一次，
+    其他呼叫者等待同一個結果（singleflight）。
+
+    發起者被取消時工作也會跟著取消，等待中的呼叫者會改由自己重新執行。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, factory) -> tuple:
+        """
+        執行 factory() 或等待進行中的相同工作。
+
+        Returns:
+            tuple: (結果, 是否為共用其他呼叫者的結果)
+        """
+        loop = asyncio.get_running_loop()
+        while (flight := self._flights.get(key)) is not None and flight.get_loop() is loop:
+            try:
+                return await asyncio.shield(flight), True
+            except asyncio.CancelledError:
+                if not flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # 發起者被取消了，重新檢查（可能由自己接手執行）
+
+        task = asyncio.ensure_future(factory())
+        self._flights[key] = task
+
+        def forget(done: asyncio.Future) -> None:
+            if self._flights.get(key) is done:
+                del self._flights[key]
+
+        task.add_done_callback(forget)
+        return await task, False
+
+
+# 行程內共用：同時進行的 run（包含不同專案）爬同一個卡號時只送一次請求
+_KEYWORD_FLIGHTS = _SingleFlight()
+
+
+class _HostRegistry:
+    """
+    行程內共用的各主機限流器與斷路器。
+
+    每次 /run 與背景價格監看都會建立新的 RutenScraper，若各自持有限流器，
+    降速與 Retry-After 會在 run 之間遺失，同時進行的 run 對同一主機的總速率也不受限制。
+    限流器內部的 asyncio.Condition 綁定事件迴圈，換了事件迴圈時整組重新建立。
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}  # 主機 -> 自適應限流器
+        self.breakers: Dict[str, CircuitBreaker] = {}       # 主機 -> 斷路器
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.clear()
+            self._loop = loop
+
+    def limiter(self, host: str) -> AdaptiveRateLimiter:
+        self._check_loop()
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveRateLimiter()
+        return self.limiters[host]
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        self._check_loop()
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker()
+        return self.breakers[host]
+
+    def clear(self) -> None:
+        """捨棄所有主機的狀態（換事件迴圈或基準測試之間使用）"""
+        self.limiters = {}
+        self.breakers = {}
+
+
+_HOSTS = _HostRegistry()
+
+# 限流器與斷路器快照中跨 run 累計的計數，host_snapshots() 只回報本次 run 增加的部分
+_LIMITER_RUN_COUNTERS = ("increases", "decreases", "throttled", "retry_after_waits")
+_BREAKER_RUN_COUNTERS = ("times_opened", "rejections")
+
+
+# 回應快取設定
+RESPONSE_CACHE_PATH = os.path.join(DATA_DIR, "ruten_cache.sqlite3")
+RESPONSE_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 快取總大小上限，超過時淘汰最久沒用到的
+RESPONSE_CACHE_TOUCH_BATCH = 200               # 累積幾筆命中才一次寫回最近讀取時間
+RESPONSE_CACHE_TTLS = {                        # 各端點的快取秒數
+    "search": 30 * 60,      # search/v3/.../prod
+    "detail": 30 * 60,      # prod/v2/.../prod
+    "items": 2 * 60 * 60,   # items/v2/list（選項資訊變動較少）
+}
+NEGATIVE_CACHE_TTL = 15 * 60     # 查無商品的卡號快取秒數（比搜尋結果短，新上架時能較快看到）
+VARIANT_CACHE_TTL = 24 * 60 * 60  # 商品選項快取秒數（價格區間或庫存有變動時會提早重抓）
+
+
+class RutenResponseCache:
+    """
+    露天 API 回應的磁碟快取（SQLite）。
+
+    以「端點 + 正規化後的查詢參數」為 key，依端點套用不同的 TTL；
+    另外以商品 ID 為 key 保存複數選項的詳情（variants 表），搭配 prod/v2 的
+    價格區間與庫存作為簽章，簽章不同就視為過期。
+    總大小超過上限時，兩張表一起淘汰最久沒被讀取的資料。
+    命中時的最近讀取時間先記在記憶體，累積 RESPONSE_CACHE_TOUCH_BATCH 筆、
+    淘汰前或 close() 時才一次寫回，讀取快取不必每次都寫入磁碟。
+    查無商品的卡號另外記在 negative 表，TTL 比一般搜尋結果短。
+    快取讀寫失敗只會記錄警告，不影響爬蟲本身。
+    close() 之後再次讀寫會自動重新開啟連線。
+
+    使用方法：
+        cache = RutenResponseCache("data/ruten_cache.sqlite3")
+        data = cache.get("search", params)
+        cache.set("search", params, data)
+        detail = cache.get_variants(prod_id, signature)
+        if cache.is_negative(keyword): ...
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        """
+        Args:
+            path: SQLite 檔案路徑
+            max_bytes: 快取總大小上限（位元組）
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection: sqlite3.Connection | None = None
+        self._touched: Dict[tuple, float] = {}  # (資料表, key) -> 尚未寫回的最近讀取時間
+        self._total_bytes = 0
+        self._connection = self._connect()  # 建立時就開啟，路徑有問題能及早發現
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """SQLite 連線（close() 之後第一次使用時重新開啟）"""
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS variants ("
+            " prod_id TEXT PRIMARY KEY, signature TEXT NOT NULL, body TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS negative ("
+            " keyword TEXT PRIMARY KEY, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+        self._total_bytes = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM responses)"
+            " + (SELECT COALESCE(SUM(size), 0) FROM variants)"
+        ).fetchone()[0]
+        return conn
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict) -> str:
+        """
+        正規化查詢參數並組成快取 key。
+
+        參數依名稱排序、值一律轉成字串並去除空白；
+        搜尋關鍵字 q 不分大小寫（露天搜尋本身也不分）。
+        """
+        normalized = {}
+        for name, value in params.items():
+            value = str(value).strip()
+            if name == "q":
+                value = " ".join(value.upper().split())
+            normalized[name] = value
+        return json.dumps([endpoint, normalized], sort_keys=True, ensure_ascii=False)
+
+    def get(self, endpoint: str, params: Dict):
+        """讀取尚未過期的快取回應，沒有命中時回傳 None"""
+        key = self.make_key(endpoint, params)
+        ttl = RESPONSE_CACHE_TTLS.get(endpoint, 0)
+        now = time.time()
+        try:
+            row = self._conn.execute(
+                "SELECT body, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + ttl < now:
+                return None
+            self._touch("responses", key, now)
+            return json.loads(row[0])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.warning(f"讀取回應快取失敗: {e}")
+            return None
+
+    def set(self, endpoint: str, params: Dict, data) -> None:
+        """寫入一筆回應，必要時淘汰舊資料以維持大小上限"""
+        key = self.make_key(endpoint, params)
+        body = json.dumps(data, ensure_ascii=False)
+        size = len(body.encode("utf-8"))
+        now = time.time()
+        try:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入回應快取失敗: {e}")
+
+    def is_negative(self, keyword: str) -> bool:
+        """卡號是否在 NEGATIVE_CACHE_TTL 內確認過露天沒有任何商品"""
+        try:
+            row = self._conn.execute(
+                "SELECT created_at FROM negative WHERE keyword = ?",
+                (normalize_keyword(keyword),),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"讀取查無商品快取失敗: {e}")
+            return False
+        return row is not None and row[0] + NEGATIVE_CACHE_TTL >= time.time()
+
+    def set_negative(self, keyword: str) -> None:
+        """記錄卡號目前沒有任何商品"""
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO negative VALUES (?, ?)",
+                (normalize_keyword(keyword), time.time()),
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入查無商品快取失敗: {e}")
+
+    def known_total_rows(self, keyword: str) -> int | None:
+        """
+        卡號最近一次已知的商品總數（第一頁搜尋回應的 TotalRows，不論是否過期）。
+
+        只用來估計優先順序；確認過查無商品的回傳 0，從沒搜尋過的回傳 None。
+        """
+        keys = [
+            self.make_key("search", {
+                "q": keyword, "type": "direct", "sort": sort, "limit": ITEMS_PER_PAGE, "offset": 1,
+            })
+            for sort in (SEARCH_SORT_DEFAULT, SEARCH_SORT_PRICE_ASC)
+        ]
+        try:
+            if self._conn.execute(
+                "SELECT 1 FROM negative WHERE keyword = ?", (normalize_keyword(keyword),)
+            ).fetchone():
+                return 0
+            row = self._conn.execute(
+                "SELECT body FROM responses WHERE key IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                keys,
+            ).fetchone()
+            return int(json.loads(row[0]).get("TotalRows", 0)) if row else None
+        except (sqlite3.Error, json.JSONDecodeError, TypeError, ValueError) as e:
+            logger.warning(f"讀取卡號 {keyword} 的已知商品數失敗: {e}")
+            return None
+
+    def get_variants(self, prod_id: str, signature: str) -> dict | None:
+        """
+        讀取商品的選項詳情（items/v2 level=detail 的 data[0]）。
+
+        超過 VARIANT_CACHE_TTL，或簽章（prod/v2 的價格區間與庫存）與快取時不同，
+        都視為沒有命中。
+        """
+        now = time.time()
+        try:
+            row = self._conn.execute(
+                "SELECT signature, body, created_at FROM variants WHERE prod_id = ?",
+                (prod_id,),
+            ).fetchone()
+            if row is None or row[0] != signature or row[2] + VARIANT_CACHE_TTL < now:
+                return None
+            self._touch("variants", prod_id, now)
+            return json.loads(row[1])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.warning(f"讀取選項快取失敗: {e}")
+            return None
+
+    def set_variants(self, prod_id: str, signature: str, item_detail: dict) -> None:
+        """寫入商品的選項詳情"""
+        body = json.dumps(item_detail, ensure_ascii=False)
+        size = len(body.encode("utf-8"))
+        now = time.time()
+        try:
+            old = self._conn.execute(
+                "SELECT size FROM variants WHERE prod_id = ?", (prod_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO variants VALUES (?, ?, ?, ?, ?, ?)",
+                (prod_id, signature, body, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入選項快取失敗: {e}")
+
+    def _touch(self, table: str, key: str, now: float) -> None:
+        """記下命中時間，累積到 RESPONSE_CACHE_TOUCH_BATCH 筆才寫回"""
+        self._touched[(table, key)] = now
+        if len(self._touched) >= RESPONSE_CACHE_TOUCH_BATCH:
+            self._flush_touches()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        """把累積的最近讀取時間寫回資料表（由呼叫端 commit）"""
+        if not self._touched:
+            return
+        for table, column in (("responses", "key"), ("variants", "prod_id")):
+            self._conn.executemany(
+                f"UPDATE {table} SET accessed_at = ? WHERE {column} = ?",
+                [(at, key) for (name, key), at in self._touched.items() if name == table],
+            )
+        self._touched.clear()
+
+    def _evict(self) -> None:
+        """總大小超過上限時，從最久沒被讀取的資料開始刪除（回應與選項一起比較）"""
+        if self._total_bytes > self.max_bytes:
+            self._flush_touches()  # 先寫回最近讀取時間，才淘汰得正確
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT 'responses', key, size, accessed_at FROM responses"
+                " UNION ALL SELECT 'variants', prod_id, size, accessed_at FROM variants"
+                " ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for table, key, size, _ in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                column = "key" if table == "responses" else "prod_id"
+                self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+                self._total_bytes -= size
+
+    def close(self) -> None:
+        """寫回最近讀取時間並關閉 SQLite 連線（重複呼叫不會出錯）"""
+        if self._connection is None:
+            return
+        try:
+            self._flush_touches()
+            self._connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"寫回回應快取的讀取時間失敗: {e}")
+        self._touched.clear()
+        self._connection.close()
+        self._connection = None
+
+
+# 輸出 CSV 的固定欄位（search_card_name 放最前面）
+CSV_COLUMNS = [
+    "search_card_name",
+    "product_id",
+    "product_name",
+    "seller_id",
+    "price",
+    "alt_price",
+    "stock_qty",
+    "shipping_cost",
+    "post_time",
+    "image_url",
+]
+
+
+class RutenCsvWriter:
+    """
+    爬蟲結果的串流 CSV 寫入器。
+
+    資料一邊爬一邊寫入同目錄下的暫存檔，commit() 時才以 os.replace 原子性地取代正式檔案，
+    中途失敗不會留下寫到一半的 CSV。編碼使用 utf-8-sig 讓 Excel 正確顯示中文。
+
+    使用方法：
+        writer = RutenCsvWriter("data/project/ruten_data.csv")
+        writer.write_rows(products, search_card_name="青眼白龍")
+        writer.commit()
+    """
+
+    def __init__(self, output_path: str, columns: List[str] = CSV_COLUMNS):
+        """
+        Args:
+            output_path: 正式 CSV 路徑
+            columns: 欄位順序，第一欄固定是 search_card_name
+        """
+        self.output_path = output_path
+        self.columns = columns
+        self.rows_written = 0
+        self._tmp_path = f"{output_path}.tmp"
+        self._file = open(self._tmp_path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._header_written = False
+
+    def write_rows(self, products: List[Dict], search_card_name: str) -> None:
+        """寫入同一張卡片的多筆商品（不修改傳入的 dict）"""
+        if not products:
+            return
+        if not self._header_written:
+            self._writer.writerow(self.columns)
+            self._header_written = True
+        value_columns = self.columns[1:]
+        for product in products:
+            self._writer.writerow(
+                [search_card_name] + [product.get(column, "") for column in value_columns]
+            )
+        self.rows_written += len(products)
+
+    def commit(self) -> None:
+        """
+        寫完並取代正式檔案。
+
+        沒有任何資料時寫出空白 CSV（只有 BOM 與換行），與過去 pandas 的行為一致。
+
+        Raises:
+            RuntimeError: 寫入或改名失敗
+        """
+        try:
+            if not self._header_written:
+                self._file.write("\n")
+            self._file.close()
+            os.replace(self._tmp_path, self.output_path)
+            logger.info(f"資料已成功儲存到 {self.output_path}")
+        except OSError as e:
+            self.abort()
+            raise RuntimeError(f"儲存爬蟲結果失敗: {e}")
+
+    def abort(self) -> None:
+        """放棄寫入，刪除暫存檔（正式檔案維持原樣）"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+CHECKPOINT_DIR_NAME = "checkpoints"  # 檢查點資料夾（位於輸出 CSV 所在的專案資料夾）
+CHECKPOINT_MAX_AGE = 6 * 60 * 60     # 續跑時，多久以內完成的卡號可直接沿用（秒）
+
+
+class RutenCheckpointStore:
+    """
+    每個卡號的爬蟲檢查點。
+
+    每個卡號爬完就寫一個 JSON 檔到 <專案>/checkpoints/，內容包含爬到的資料列與
+    爬取條件（signature）。伺服器重啟或請求逾時後以 resume 模式重新執行時，
+    條件相同且在 max_age 秒內完成的卡號直接讀檔，不再向露天查詢。
+    """
+
+    def __init__(self, directory: str, max_age: float = CHECKPOINT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, keyword: str) -> str:
+        """卡號對應的檢查點檔案路徑（卡號可能含空白或特殊字元，改用雜湊命名）"""
+        digest = hashlib.sha1(keyword.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, keyword: str, signature: list) -> List[Dict] | None:
+        """讀取仍然有效的檢查點，不存在、過期或條件不同時回傳 None"""
+        try:
+            with open(self.path_for(keyword), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if checkpoint.get("signature") != signature:
+            return None
+        if time.time() - checkpoint.get("completed_at", 0) > self.max_age:
+            return None
+        return checkpoint.get("products")
+
+    def save(self, keyword: str, signature: list, products: List[Dict]) -> None:
+        """寫入檢查點（先寫暫存檔再改名，中斷時不會留下寫一半的檔案）"""
+        path = self.path_for(keyword)
+        tmp_path = f"{path}.tmp"
+        checkpoint = {
+            "keyword": keyword,
+            "signature": signature,
+            "completed_at": time.time(),
+            "products": products,
+        }
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入卡號 {keyword} 的檢查點失敗: {e}")
+
+    def prune(self) -> None:
+        """刪除已過期的檢查點"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+LISTING_SNAPSHOT_NAME = "listings.json"     # 增量模式的商品快照（位於輸出 CSV 所在的專案資料夾）
+LISTING_SNAPSHOT_MAX_AGE = 7 * 24 * 60 * 60  # 多久沒在搜尋結果出現的商品從快照移除（秒）
+
+
+class RutenListingSnapshot:
+    """
+    增量模式用的商品快照：上一次 run 展開後的各選項資料列，以商品 ID 為 key。
+
+    每筆記錄保存「PostTime、價格、庫存、價格區間」組成的簽章；
+    下一次 run 同一商品的簽章沒變時直接沿用記錄的資料列，不再查詢選項詳情。
+    save() 時移除超過 max_age 沒有再出現的商品。
+    """
+
+    def __init__(self, path: str, max_age: float = LISTING_SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._listings: Dict[str, Dict] = json.load(f)
+        except FileNotFoundError:
+            self._listings = {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"讀取商品快照 {path} 失敗，改為完整爬取: {e}")
+            self._listings = {}
+
+    def get(self, prod_id: str, signature: str) -> List[Dict] | None:
+        """簽章相同時回傳上次的資料列（複本），否則回傳 None"""
+        listing = self._listings.get(prod_id)
+        if listing is None or listing.get("signature") != signature:
+            return None
+        listing["seen_at"] = time.time()
+        return [dict(row) for row in listing["rows"]]
+
+    def put(self, prod_id: str, signature: str, rows: List[Dict]) -> None:
+        """記錄商品這次展開後的資料列"""
+        self._listings[prod_id] = {"signature": signature, "rows": rows, "seen_at": time.time()}
+
+    def save(self) -> None:
+        """移除過期的商品後寫回檔案（先寫暫存檔再改名）"""
+        now = time.time()
+        self._listings = {
+            prod_id: listing for prod_id, listing in self._listings.items()
+            if now - listing.get("seen_at", 0) <= self.max_age
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._listings, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"寫入商品快照 {self.path} 失敗: {e}")
+
+
+def _replayed_response_error(url: str, status: int) -> aiohttp.ClientResponseError:
+    """重播錄製的錯誤回應時，建立與實際連線相同型別的例外"""
+    request_url = URL(url)
+    request_info = aiohttp.RequestInfo(
+        request_url, "GET", CIMultiDictProxy(CIMultiDict()), request_url
+    )
+    return aiohttp.ClientResponseError(
+        request_info=request_info, history=(), status=status, message="replayed"
+    )
 
 
 class RutenScraper:
@@ -58,51 +686,386 @@ class RutenScraper:
         )
     """
 
-    def __init__(self):
-        """初始化爬蟲工具"""
-        self.session = requests.Session()
-        self.ua = UserAgent()
-
-        # 設定連線重試策略，網路不穩時會自動重試
-        retry_strategy = Retry(
-            total=MAX_RETRIES,
-            backoff_factor=0.5,
-            status_forcelist=[500, 502, 503, 504],
-            allowed_methods=["GET", "POST"],
-        )
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy, pool_connections=100, pool_maxsize=100
-        )
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        cache_path: str | None = RESPONSE_CACHE_PATH,
+        demand_aware: bool = False,
+        demand_safety_factor: float = DEMAND_SAFETY_FACTOR,
+        demand_min_sellers: int = DEMAND_MIN_SELLERS,
+        prefilter: bool = False,
+        hedge: bool = False,
+        http_mode: str = SCRAPER_HTTP_MODE,
+        request_budget: int | None = None,
+    ):
+        """
+        初始化爬蟲工具
 
-        # 建立商品圖片資料夾
-        self.image_dir = "product_images"
-        if not os.path.exists(self.image_dir):
-            os.makedirs(self.image_dir)
+        Args:
+            max_concurrency: 同時搜尋的卡號數量上限
+            cache_path: 回應快取的 SQLite 路徑，傳入 None 則不使用快取
+            demand_aware: 需求導向翻頁模式。依價格由低到高搜尋，
+                找到的有庫存、且清洗後仍會保留的商品足以滿足需求量時就停止翻頁
+            demand_safety_factor: 停止翻頁前，庫存需達需求量的幾倍
+            demand_min_sellers: 停止翻頁前，至少要涵蓋幾個不同賣家
+            prefilter: 是否在爬蟲階段先套用 DataCleaner 的過濾規則，
+                一定會被清洗掉的商品不再展開複數選項，也不寫入結果
+            hedge: 是否對商品詳情與選項查詢送出備援請求。請求超過最近延遲的
+                百分位仍未回應時再送一次，先回應的為準（備援請求數有比例上限）
+            http_mode: "live" 正常連線；"record" 把 run() 的所有請求/回應錄到
+                <專案>/http_cassette.jsonl.gz；"replay" 不連網，改從該錄製檔回應
+                （通常搭配 cache_path=None，否則會先命中回應快取）
+            request_budget: 每次 run 最多送出幾個請求（含重試，命中快取的不算），None 表示不限。
+                卡號依優先順序（需求量高、已知商品少的優先）排程，額度不足時優先順序低的卡號
+                分到較少頁數；額度用完後剩下的請求直接放棄，這些卡號記在 partial_keywords
+
+        Raises:
+            ValueError: http_mode 不正確
+        """
+        if http_mode not in HTTP_MODES:
+            raise ValueError(f"不支援的 HTTP 模式: {http_mode}")
+        self.http_mode = http_mode
+        self.cassette: Cassette | None = None  # 錄製/重播模式時由 run() 開啟
+        self.max_concurrency = max(1, max_concurrency)
+        self._host_baselines: Dict[str, Dict] = {}  # 主機 -> 本次 run 第一次使用時的限流器/斷路器快照
+        self._retry_budgets: Dict[str, RetryBudget] = {}     # 端點 -> 重試額度（每次 run 重設）
+        self.hedge = hedge
+        self._latency_trackers: Dict[str, LatencyTracker] = {}  # 端點 -> 最近延遲
+        self._hedge_budget = HedgeBudget()                       # 每次 run 重設
+        self._hedge_losers: set = set()  # 輸給備援的請求，跑完後用來計算省下的時間
+        self.cache = RutenResponseCache(cache_path) if cache_path else None
+        self.force_refresh = False  # True 時略過快取讀取（仍會寫入最新回應）
+        self.stats = Counter()      # 單次 run 的統計數字（快取命中等）
+        self.metrics = ScrapeMetrics()  # 單次 run 的效能數據（延遲、流量、頁數等）
+        self.demand_aware = demand_aware
+        self.demand_safety_factor = demand_safety_factor
+        self.demand_min_sellers = demand_min_sellers
+        self.early_stops: Dict[str, tuple] = {}  # 關鍵字 -> (停止的頁數, 原本要爬的頁數)
+        self.request_budget = request_budget
+        self.partial_keywords: Dict[str, str] = {}  # 資料可能不完整的卡號 -> 原因
+        self._page_plan: Dict[str, int] = {}        # 卡號 -> 最多爬幾頁（run() 依請求額度分配）
+        self.prefilter = prefilter
+        self._cleaner = DataCleaner()
+        self._filter_rules: Dict | None = None   # run() 時從購物車載入
+        self._checkpoints: RutenCheckpointStore | None = None  # run() 時依輸出路徑建立
+        self.resume = False  # True 時沿用仍有效的檢查點，只爬尚未完成的卡號
+        self._snapshot: RutenListingSnapshot | None = None  # 增量模式時由 run() 載入
+
+        # 共用的 aiohttp 連線池，由 run() 建立並在結束時關閉
+        self._session: aiohttp.ClientSession | None = None
 
     def _get_headers(self):
-        """產生偽裝成瀏覽器的標頭資訊（隨機 User-Agent）"""
+        """取得偽裝成瀏覽器的標頭資訊（從行程共用的標頭池輪替取用，不可修改）"""
+        return RUTEN_HEADERS.next()
+
+    async def _open_session(self) -> aiohttp.ClientSession:
+        """
+        建立（或沿用）共用的 aiohttp 連線池。
+
+        所有露天 API 請求共用同一個 ClientSession，保留 keep-alive 連線並快取 DNS，
+        避免每一頁、每個選項查詢都重新做 TCP/TLS 握手。
+
+        並行數由各主機的限流器控制，連線池的上限不低於限流器的上限；
+        超時只計算建立連線與等待回應資料的時間（sock_connect / sock_read），
+        不含等待連線池空出連線，避免排隊被誤判為逾時。
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS_PER_HOST * RUTEN_API_HOSTS,
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=None, sock_connect=DEFAULT_TIMEOUT, sock_read=DEFAULT_TIMEOUT
+                ),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """關閉共用的連線池與回應快取的連線（重複呼叫不會出錯）"""
+        for task in list(self._hedge_losers):
+            task.cancel()
+        if self._hedge_losers:
+            await asyncio.gather(*self._hedge_losers, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.cache is not None:
+            self.cache.close()
+
+    async def _get_json(self, endpoint: str, url: str, params: Dict, fresh: bool = False):
+        """
+        [非同步] 取得露天 API 的 JSON 回應，優先使用磁碟快取。
+
+        Args:
+            endpoint: 端點名稱（"search" / "detail" / "items"），決定快取的 TTL
+            url: 請求網址
+            params: 查詢參數
+            fresh: 為 True 時略過快取讀取、一律重新查詢（仍會寫入最新回應）
+        """
+        if self.cache is not None and not self.force_refresh and not fresh:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+        self.stats["cache_misses"] += 1
+
+        result = await self._request_with_retry(endpoint, url, params)
+        # 沒有商品的搜尋結果交給 negative 表（TTL 較短），這裡不快取
+        empty_search = endpoint == "search" and isinstance(result, dict) and not result.get("Rows")
+        if self.cache is not None and result and not empty_search:
+            self.cache.set(endpoint, params, result)
+        return result
+
+    def _breaker_for(self, url: str) -> CircuitBreaker:
+        """取得該主機的斷路器（行程內所有爬蟲共用）"""
+        host = urlsplit(url).netloc
+        breaker = _HOSTS.breaker(host)
+        self._host_baselines.setdefault(host, {}).setdefault("breaker", breaker.snapshot())
+        return breaker
+
+    def _budget_for(self, endpoint: str) -> RetryBudget:
+        """取得該端點本次 run 的重試額度"""
+        if endpoint not in self._retry_budgets:
+            self._retry_budgets[endpoint] = RetryBudget(*RETRY_BUDGETS.get(endpoint, (10, 0.2)))
+        return self._retry_budgets[endpoint]
+
+    async def _request_with_retry(self, endpoint: str, url: str, params: Dict):
+        """
+        [非同步] 發送請求，暫時性錯誤以指數退避（含隨機抖動）重試。
+
+        - 暫時性錯誤（逾時、連線失敗、429、5xx）：在端點的重試額度內最多重試 MAX_RETRIES 次
+        - 永久性錯誤（其他 4xx、回應不是 JSON）：不重試，直接拋出
+        - 主機連續失敗時斷路器開啟，期間直接拋出 CircuitOpenError，不再送出請求
+        - 本次 run 的請求額度用完時直接拋出 RequestBudgetExhaustedError
+        """
+        breaker = self._breaker_for(url)
+        budget = self._budget_for(endpoint)
+        attempt = 0
+        while True:
+            if self._budget_exhausted():
+                self.stats["budget_rejections"] += 1
+                if (keyword_rejections := _keyword_budget_rejections.get()) is not None:
+                    keyword_rejections["rejections"] += 1
+                raise RequestBudgetExhaustedError(f"本次爬蟲的 {self.request_budget} 個請求額度已用完")
+            try:
+                breaker.before_request()
+            except CircuitOpenError:
+                self.stats["circuit_open_rejections"] += 1
+                raise
+            budget.record_request()
+            self.stats["requests_sent"] += 1
+            try:
+                if self.hedge and endpoint in HEDGED_ENDPOINTS:
+                    result = await self._hedged_request(endpoint, url, params)
+                else:
+                    result = await self._request_json(url, params)
+            except asyncio.CancelledError:
+                # 被取消時沒有結果可回報，但試探名額要還回去，否則半開狀態會一直拒絕請求
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if not is_transient_error(e):
+                    # 對方有正常回應，只是這個請求本身有問題
+                    breaker.record_success()
+                    self.stats["permanent_errors"] += 1
+                    raise
+                breaker.record_failure()
+                if attempt >= MAX_RETRIES:
+                    self.stats["retries_exhausted"] += 1
+                    raise
+                if not budget.try_spend():
+                    self.stats["retry_budget_exhausted"] += 1
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                self.stats["retries"] += 1
+                self.stats[f"retries_{endpoint}"] += 1
+                logger.warning(
+                    f"露天 API 暫時性錯誤（{endpoint}）：{type(e).__name__} {e}，"
+                    f"{delay:.2f} 秒後第 {attempt} 次重試"
+                )
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def _budget_exhausted(self) -> bool:
+        """本次 run 的請求額度是否已用完"""
+        return self.request_budget is not None and self.stats["requests_sent"] >= self.request_budget
+
+    def _latency_tracker(self, endpoint: str) -> LatencyTracker:
+        """取得該端點的延遲追蹤器"""
+        if endpoint not in self._latency_trackers:
+            self._latency_trackers[endpoint] = LatencyTracker()
+        return self._latency_trackers[endpoint]
+
+    async def _timed_request(
+        self, tracker: LatencyTracker, url: str, params: Dict, sent: asyncio.Event | None = None
+    ):
+        """
+        發送請求，成功時把延遲記錄到 tracker。
+
+        延遲從限流器放行、請求實際送出時開始算，不含排隊時間；
+        送出時會 set() sent，讓備援的計時也從這時開始。
+        """
+        loop = asyncio.get_running_loop()
+        sent_at = loop.time()
+
+        def mark_sent() -> None:
+            nonlocal sent_at
+            sent_at = loop.time()
+            if sent is not None:
+                sent.set()
+
+        result = await self._request_json(url, params, mark_sent)
+        tracker.observe(loop.time() - sent_at)
+        return result
+
+    async def _hedged_request(self, endpoint: str, url: str, params: Dict):
+        """
+        [非同步] 帶備援（hedge）的單次請求。
+
+        先送出一般請求；超過該端點最近延遲的百分位仍未回應，且備援額度足夠時，
+        再送出一個相同的請求，先成功回應的為準。輸掉的請求讓它在背景跑完，
+        用來計算備援省下的時間（run 結束時仍未完成的會被取消）。
+        """
+        tracker = self._latency_tracker(endpoint)
+        self._hedge_budget.record_request()
+        loop = asyncio.get_running_loop()
+        primary_sent = asyncio.Event()
+        primary = asyncio.create_task(self._timed_request(tracker, url, params, primary_sent))
+        delay = tracker.threshold()
+        if delay is None:
+            return await primary
+
+        sent_waiter = asyncio.create_task(primary_sent.wait())
         try:
-            return {
-                "User-Agent": self.ua.random,
-                "Accept": "application/json",
-                "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-                "Referer": f"{RUTEN_BASE_URL}/",
-                "Connection": "keep-alive",
-            }
-        except Exception as e:
-            logger.warning(f"無法產生隨機 User-Agent，改用預設值: {e}")
-            return {
-                "User-Agent": DEFAULT_USER_AGENT,
-                "Accept": "application/json",
-                "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-                "Referer": f"{RUTEN_BASE_URL}/",
-                "Connection": "keep-alive",
-            }
+            # 備援的等待時間從原本的請求通過限流器才開始算
+            await asyncio.wait({primary, sent_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            started = loop.time()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+        finally:
+            sent_waiter.cancel()
+        if done:
+            return primary.result()
+        if self._budget_exhausted() or not self._hedge_budget.try_spend():
+            self.stats["hedges_skipped"] += 1
+            return await primary
+
+        self.stats["hedges_sent"] += 1
+        self.stats["requests_sent"] += 1
+        hedge = asyncio.create_task(self._timed_request(tracker, url, params))
+        pending = {primary, hedge}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+        except BaseException:
+            primary.cancel()
+            hedge.cancel()
+            raise
+        if winner is None:
+            return primary.result()  # 兩個請求都失敗，拋出原本請求的錯誤
+
+        hedge_won = winner is hedge
+        if hedge_won:
+            self.stats["hedges_won"] += 1
+        winner_elapsed = loop.time() - started
+
+        def loser_finished(task: asyncio.Task) -> None:
+            self._hedge_losers.discard(task)
+            if not task.cancelled():
+                task.exception()  # 取出例外，避免 "exception was never retrieved"
+            if hedge_won:
+                saved = loop.time() - started - winner_elapsed
+                self.stats["hedge_latency_saved_ms"] += round(saved * 1000)
+
+        for task in pending:
+            self._hedge_losers.add(task)
+            task.add_done_callback(loser_finished)
+        return winner.result()
+
+    def _limiter_for(self, url: str) -> AdaptiveRateLimiter:
+        """取得該主機的自適應限流器（行程內同一主機的所有請求共用一個，跨 run 保留降速狀態）"""
+        host = urlsplit(url).netloc
+        limiter = _HOSTS.limiter(host)
+        self._host_baselines.setdefault(host, {}).setdefault("limiter", limiter.snapshot())
+        return limiter
+
+    async def _request_json(self, url: str, params: Dict, on_sent: Callable[[], None] | None = None):
+        """
+        [非同步] 透過共用連線池發送 GET 請求並解析 JSON。
+
+        每個請求都經過該主機的 AdaptiveRateLimiter：回應狀態、延遲與 Retry-After
+        會回報給限流器調整速率；4xx/5xx 會拋出 aiohttp.ClientResponseError。
+        錄製模式會把請求/回應記到 cassette；重播模式不連網，改由 cassette 回應
+        （同樣經過限流器，錯誤狀態碼一樣拋出 ClientResponseError）。
+
+        Args:
+            on_sent: 限流器放行、請求即將送出時呼叫（備援請求用來排除排隊時間）
+        """
+        limiter = self._limiter_for(url)
+        await limiter.acquire()
+        if on_sent is not None:
+            on_sent()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        status = None
+        retry_after = None
+        size = 0
+        timed_out = False
+        try:
+            if self.cassette is not None and self.cassette.replaying:
+                entry = await self.cassette.replay_async(url, params)
+                status = entry["status"]
+                retry_after = parse_retry_after(entry["retry_after"])
+                if status == 429:
+                    logger.warning(f"露天 API 回應 429（請求過於頻繁），Retry-After={retry_after}")
+                if status >= 400:
+                    raise _replayed_response_error(url, status)
+                size = len(json.dumps(entry["body"], ensure_ascii=False).encode())
+                return entry["body"]
+
+            session = await self._open_session()
+            async with session.get(
+                url, params=params, headers=self._get_headers()
+            ) as response:
+                status = response.status
+                retry_after_header = response.headers.get("Retry-After")
+                retry_after = parse_retry_after(retry_after_header)
+                if status == 429:
+                    logger.warning(f"露天 API 回應 429（請求過於頻繁），Retry-After={retry_after}")
+                if status >= 400 and self.cassette is not None:
+                    self.cassette.record(url, params, status, retry_after=retry_after_header)
+                response.raise_for_status()
+                size = len(await response.read())
+                body = await response.json()
+                if self.cassette is not None:
+                    self.cassette.record(url, params, status, body, retry_after_header)
+                return body
+        except asyncio.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed = loop.time() - started
+            self.metrics.observe_request(url, elapsed, status, size, timed_out)
+            await limiter.release(status, elapsed, retry_after)
 
     async def _search_products_async(
-        self, keyword: str, limit: int = ITEMS_PER_PAGE, offset: int = 1
+        self,
+        keyword: str,
+        limit: int = ITEMS_PER_PAGE,
+        offset: int = 1,
+        sort: str = SEARCH_SORT_DEFAULT,
     ) -> tuple:
         """
         [非同步] 搜尋商品。
@@ -111,6 +1074,7 @@ class RutenScraper:
             keyword: 搜尋關鍵字
             limit: 數量限制
             offset: 頁數偏移量
+            sort: 排序方式
 
         Returns:
             tuple: (搜尋結果 dict, 實際可用數量)
@@ -119,31 +1083,22 @@ class RutenScraper:
         params = {
             "q": keyword,
             "type": "direct",
-            "sort": "rnk/dc",
+            "sort": sort,
             "limit": limit,
             "offset": offset,
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    url,
-                    params=params,
-                    headers=self._get_headers(),
-                    timeout=DEFAULT_TIMEOUT,
-                ) as response:
-                    result = await response.json()
-                    if result and "TotalRows" in result:
-                        total_rows = result["TotalRows"]
-                        if total_rows < limit:
-                            logger.info(
-                                f"搜尋結果只有 {total_rows} 個商品，調整爬取數量"
-                            )
-                            return result, total_rows
-                    return result, limit
-            except Exception as e:
-                logger.error(f"搜尋商品時發生錯誤: {e}")
-                return None, 0
+        try:
+            result = await self._get_json("search", url, params)
+            if result and "TotalRows" in result:
+                total_rows = result["TotalRows"]
+                if total_rows < limit:
+                    logger.info(f"搜尋結果只有 {total_rows} 個商品，調整爬取數量")
+                    return result, total_rows
+            return result, limit
+        except Exception as e:
+            logger.error(f"搜尋商品時發生錯誤: {e}")
+            return None, 0
 
     async def _get_product_details_async(self, product_ids: List[str]) -> Dict:
         """[非同步] 取得商品的詳細資訊"""
@@ -153,76 +1108,70 @@ class RutenScraper:
         url = f"{BASE_URL}/prod/v2/index.php/prod"
         params = {"id": product_ids}
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    url,
-                    params=params,
-                    headers=self._get_headers(),
-                    timeout=DEFAULT_TIMEOUT,
-                ) as response:
-                    return await response.json()
-            except Exception as e:
-                logger.error(f"獲取商品詳情時發生錯誤: {e}")
-                return None
+        try:
+            return await self._get_json("detail", url, params)
+        except Exception as e:
+            logger.error(f"獲取商品詳情時發生錯誤: {e}")
+            return None
 
     def _extract_product_data(self, product: Dict) -> Dict:
-        """從原始資料中提取我們需要的欄位"""
-        try:
-            remaining_stock = product.get("StockQty", 0) - product.get("SoldQty", 0)
+        """從原始資料中提取我們需要的欄位（單筆版本，規則見 _extract_products_batch）"""
+        products = self._extract_products_batch([product])
+        return products[0] if products else None
 
-            price_range = product.get("PriceRange", [0])
-            price = (
-                int(price_range[0])
-                if price_range and price_range[0] is not None
-                else 0
-            )
+    def _extract_products_batch(self, product_details: List[Dict]) -> List[Dict]:
+        """
+        將整個 prod/v2 回應一次轉換為我們需要的欄位，順序與回應一致。
 
-            alt_price = (
-                bool(price_range)
-                and len(price_range) > 1
-                and price_range[0] != price_range[-1]
-            )
+        每筆只是幾次 dict 查詢，直接在同一個迴圈裡處理，
+        比為每頁開 ThreadPoolExecutor 再收集結果快得多，也不會打亂順序。
+        無法解析的商品會記錄錯誤並略過。
+        """
+        extracted = []
+        append = extracted.append
+        for product in product_details:
+            try:
+                get = product.get
+                price_range = get("PriceRange", [0])
+                first_price = price_range[0] if price_range else None
+                shipping_cost = get("ShippingCost")
 
-            shipping_cost = product.get("ShippingCost")
-            shipping_cost = int(shipping_cost) if shipping_cost is not None else 0
-
-            image_url = product.get("Image", "")
-
-            return {
-                "product_id": product.get("ProdId", ""),
-                "product_name": product.get("ProdName", ""),
-                "seller_id": product.get("SellerId", ""),
-                "price": price,
-                "alt_price": alt_price,
-                "stock_qty": remaining_stock,
-                "shipping_cost": shipping_cost,
-                "post_time": product.get("PostTime", ""),
-                "image_url": image_url,
-            }
-        except Exception as e:
-            logger.error(f"處理商品資料時發生錯誤：{e}")
-            return None
+                append({
+                    "product_id": get("ProdId", ""),
+                    "product_name": get("ProdName", ""),
+                    "seller_id": get("SellerId", ""),
+                    "price": int(first_price) if first_price is not None else 0,
+                    "alt_price": (
+                        bool(price_range)
+                        and len(price_range) > 1
+                        and first_price != price_range[-1]
+                    ),
+                    "stock_qty": get("StockQty", 0) - get("SoldQty", 0),
+                    "shipping_cost": int(shipping_cost) if shipping_cost is not None else 0,
+                    "post_time": get("PostTime", ""),
+                    "image_url": get("Image", ""),
+                })
+            except Exception as e:
+                logger.error(f"處理商品資料時發生錯誤：{e}")
+        return extracted
 
-    async def _fetch_item_detail_async(self, product_id: str) -> dict | None:
-        """[非同步] 取得單一商品的 items/v2 level=detail 資料（含各選項的獨立庫存與價格）"""
+    async def _fetch_item_detail_async(self, product_id: str, fresh: bool = False) -> dict | None:
+        """
+        [非同步] 取得單一商品的 items/v2 level=detail 資料（含各選項的獨立庫存與價格）
+
+        Args:
+            fresh: 為 True 時不讀回應快取（商品已知有變動時使用）
+        """
         url = f"{RUTEN_ITEMS_API_BASE_URL}/items/v2/list"
         params = {"gno": product_id, "level": "detail"}
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    url,
-                    params=params,
-                    headers=self._get_headers(),
-                    timeout=DEFAULT_TIMEOUT,
-                ) as response:
-                    result = await response.json()
-                    data = result.get("data", [])
-                    return data[0] if data else None
-            except Exception as e:
-                logger.warning(f"取得商品 {product_id} 的選項詳情失敗: {e}")
-                return None
+        try:
+            result = await self._get_json("items", url, params, fresh=fresh)
+            data = result.get("data", [])
+            return data[0] if data else None
+        except Exception as e:
+            logger.warning(f"取得商品 {product_id} 的選項詳情失敗: {e}")
+            return None
 
     def _expand_variants(self, parent: Dict, item_detail: dict) -> List[Dict]:
         """
@@ -255,119 +1204,742 @@ class RutenScraper:
             variants.append(variant)
         return variants
 
-    async def _process_products_async(
-        self, keyword: str, max_pages: int = 999
+    @staticmethod
+    def _variant_signature(product: Dict) -> str:
+        """prod/v2 商品資料中會隨選項變動的欄位，用來判斷選項快取是否過期"""
+        return json.dumps([product.get("PriceRange"), product.get("StockQty")])
+
+    @staticmethod
+    def _listing_signature(product: Dict, variant_signature: str | None) -> str:
+        """增量模式判斷商品是否變動的簽章：PostTime、價格、庫存與價格區間"""
+        return json.dumps([
+            product.get("post_time"), product.get("price"),
+            product.get("stock_qty"), variant_signature,
+        ])
+
+    async def _expand_page_variants(
+        self,
+        page_products: List[Dict],
+        signatures: Dict[str, str] | None = None,
+        skip: set | None = None,
     ) -> List[Dict]:
-        """[非同步] 主要處理流程：搜尋 → 取得詳情 → 整理資料"""
-        all_products = []
-        page = 1
+        """
+        [非同步] 將一整頁中 alt_price 的商品並行展開為各選項，回傳順序與輸入一致。
 
-        while page <= max_pages:
-            try:
-                offset = (page - 1) * ITEMS_PER_PAGE + 1
-                logger.info(f"正在處理關鍵字 '{keyword}' 的第 {page} 頁")
+        同時查詢的數量受 MAX_CONCURRENT_VARIANT_FETCHES 限制；
+        查詢失敗或無法展開的商品，以及商品 ID 在 skip 裡的商品，保留原始資料列。
+        signatures（商品 ID -> _variant_signature）有提供時，先查選項快取，
+        價格區間與庫存都沒變的商品直接使用快取的選項詳情。
+        增量模式下，PostTime、價格與庫存都和上次 run 相同的商品直接沿用快照裡展開好的資料列。
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_VARIANT_FETCHES)
+        signatures = signatures or {}
+        use_cache = self.cache is not None
+        snapshot = self._snapshot
 
-                # 搜尋商品
-                search_result, available_items = await self._search_products_async(
-                    keyword, limit=ITEMS_PER_PAGE, offset=offset
-                )
+        async def expand(product: Dict) -> List[Dict]:
+            if not product.get("alt_price") or (skip and product["product_id"] in skip):
+                return [product]
+            self.metrics.variants["products"] += 1
+            product_id = product["product_id"]
+            signature = signatures.get(product_id)
+            if snapshot is not None:
+                listing_signature = self._listing_signature(product, signature)
+                if not self.force_refresh:
+                    rows = snapshot.get(product_id, listing_signature)
+                    if rows is not None:
+                        self.stats["incremental_reused"] += 1
+                        self.metrics.variants["reused_rows"] += len(rows)
+                        return rows
+                self.stats["incremental_changed"] += 1
+            item_detail = None
+            if use_cache and signature and not self.force_refresh:
+                item_detail = self.cache.get_variants(product_id, signature)
+                self.stats["variant_cache_hits" if item_detail else "variant_cache_misses"] += 1
+            if item_detail is None:
+                self.metrics.variants["fetched"] += 1
+                async with semaphore:
+                    # 有簽章時以選項快取為準：沒命中代表沒快取過、已過期或商品有變動，
+                    # 不能再用回應快取裡（最多 items TTL 前）的舊回應
+                    item_detail = await self._fetch_item_detail_async(product_id, fresh=bool(signature))
+                if use_cache and signature and item_detail and item_detail.get("spec_info"):
+                    self.cache.set_variants(product_id, signature, item_detail)
+            variants = self._expand_variants(product, item_detail) if item_detail else []
+            if variants:
+                self.metrics.variants["expanded_rows"] += len(variants)
+                if snapshot is not None:
+                    snapshot.put(product_id, listing_signature, variants)
+                return variants
+            self.metrics.variants["failed"] += 1
+            logger.warning(f"商品 {product.get('product_id')} 選項展開失敗，保留原始資料列")
+            return [product]
+
+        expanded = await asyncio.gather(*(expand(product) for product in page_products))
+        return [row for rows in expanded for row in rows]
+
+    def _count_pages(self, search_result: Dict, max_pages: int) -> int:
+        """依第一頁搜尋結果的 TotalRows 算出需要爬取的頁數（不超過 max_pages）"""
+        total_rows = search_result.get("TotalRows") or len(search_result["Rows"])
+        return max(1, min(max_pages, math.ceil(total_rows / ITEMS_PER_PAGE)))
+
+    async def _search_page_async(
+        self, keyword: str, page: int, sort: str = SEARCH_SORT_DEFAULT
+    ) -> List[Dict]:
+        """[非同步] 搜尋指定頁數，回傳該頁的 Rows（沒有結果或失敗時回傳空列表）"""
+        offset = (page - 1) * ITEMS_PER_PAGE + 1
+        logger.info(f"正在處理關鍵字 '{keyword}' 的第 {page} 頁")
+        search_result, _ = await self._search_products_async(
+            keyword, limit=ITEMS_PER_PAGE, offset=offset, sort=sort
+        )
+        if not search_result or not search_result.get("Rows"):
+            return []
+        return search_result["Rows"]
+
+    async def _fetch_page_products_async(
+        self, keyword: str, page: int, rows: List[Dict]
+    ) -> tuple:
+        """
+        [非同步] 取得單頁搜尋結果的商品詳情並整理成我們需要的欄位
+
+        Returns:
+            (商品資料列, 商品 ID -> 選項快取簽章)
+        """
+        try:
+            # 拿到所有商品 ID
+            product_ids = [row["Id"] for row in rows]
+
+            # 取得詳細資訊
+            product_details = await self._get_product_details_async(product_ids)
+            if not product_details:
+                return [], {}
+
+            # 整頁一次轉換（保持原本順序）
+            page_products = self._extract_products_batch(product_details)
+            signatures = {
+                str(product.get("ProdId")): self._variant_signature(product)
+                for product in product_details
+                if isinstance(product, dict)
+            }
+            return page_products, signatures
+
+        except Exception as e:
+            logger.error(f"處理關鍵字 '{keyword}' 的第 {page} 頁時發生錯誤: {e}")
+            return [], {}
+
+    def _cleaner_rejects(
+        self, product: Dict, card_names: List[str] | None, before_expansion: bool = True
+    ) -> bool:
+        """
+        商品是否一定會在清洗階段被 DataCleaner 排除（沒有載入規則時一律回傳 False）。
+
+        同一個卡號可能同時屬於多張卡片，只有對每一張卡片都會被排除才算。
+        before_expansion 為 True 時，尚未展開的複數選項商品只套用展開後也必定成立的規則
+        （見 rejection_reason）。
+        """
+        return self._filter_rules is not None and all(
+            self._cleaner.rejection_reason(
+                dict(product, search_card_name=card_name),
+                self._filter_rules,
+                before_expansion=before_expansion,
+            )
+            for card_name in card_names or [""]
+        )
+
+    def _prefilter_rejects(self, product: Dict, card_names: List[str] | None) -> bool:
+        """啟用 prefilter 時，商品是否可以在爬蟲階段先丟掉（見 _cleaner_rejects）"""
+        return self.prefilter and self._cleaner_rejects(product, card_names)
+
+    async def _prefilter_products(
+        self, products: List[Dict], card_names: List[str], deferred: Dict[str, str] | None = None
+    ) -> List[Dict]:
+        """
+        [非同步] 套用本次 run 的過濾規則，丟掉一定會在清洗階段被排除的商品。
+
+        deferred 是爬取時因 prefilter 而延後展開的複數選項商品（商品 ID -> 選項簽章）。
+        合併搜尋時延後與否依發起者的規則決定，本次規則仍保留的這類商品在這裡才展開；
+        被丟掉的就省下一次 items/v2 查詢。
+        """
+        deferred = deferred or {}
+        if not self.prefilter and not deferred:
+            return products
+
+        kept = []
+        for product in products:
+            if self._prefilter_rejects(product, card_names):
+                self.stats["prefilter_dropped"] += 1
+                if product["product_id"] in deferred:
+                    self.stats["prefilter_requests_saved"] += 1
+                continue
+            kept.append(product)
+        if not any(product["product_id"] in deferred for product in kept):
+            return kept
+        expanded_ids = {product["product_id"] for product in kept if product["product_id"] not in deferred}
+        return await self._expand_page_variants(kept, deferred, skip=expanded_ids)
+
+    def _demand_tracker(self, keyword: str, required_amount: int, card_names: List[str] | None = None):
+        """
+        建立需求導向翻頁用的判斷函式。
+
+        回傳的函式每收到一頁商品就累計「商品名稱符合卡號、有庫存、非複數選項，
+        且不會在清洗階段被排除（黑名單賣家、排除關鍵字、價格異常、eBay 等）」
+        的庫存量與賣家數，兩者都達標時回傳 True，代表可以停止翻頁。
+        清洗規則依 card_names 判斷目標卡號（run() 在需求導向模式下一律載入規則）。
+        """
+        target_stock = required_amount * self.demand_safety_factor
+        covered_stock = 0
+        sellers = set()
+
+        def add_page(products: List[Dict]) -> bool:
+            nonlocal covered_stock
+            for product in products:
                 if (
-                    not search_result
-                    or "Rows" not in search_result
-                    or not search_result["Rows"]
+                    product.get("alt_price")
+                    or product.get("stock_qty", 0) <= 0
+                    or not match_card_code(keyword, product.get("product_name", ""))
+                    or self._cleaner_rejects(product, card_names, before_expansion=False)
                 ):
-                    logger.info(f"關鍵字 '{keyword}' 在第 {page} 頁沒有更多結果了。")
-                    break
+                    continue
+                covered_stock += product["stock_qty"]
+                sellers.add(product.get("seller_id"))
+            return covered_stock >= target_stock and len(sellers) >= self.demand_min_sellers
 
-                # 拿到所有商品 ID
-                product_ids = [row["Id"] for row in search_result["Rows"]]
+        return add_page
 
-                # 取得詳細資訊
-                product_details = await self._get_product_details_async(product_ids)
-                if not product_details:
-                    break
+    async def _process_products_async(
+        self,
+        keyword: str,
+        max_pages: int = 999,
+        required_amount: int | None = None,
+        card_names: List[str] | None = None,
+        deferred: Dict[str, str] | None = None,
+    ) -> List[Dict]:
+        """
+        [非同步] 主要處理流程：搜尋 → 取得詳情 → 展開複數選項
+
+        先搜尋第一頁，依 TotalRows 算出需要的頁數（不超過 max_pages）。
+        之後三個階段以有界佇列串接、同時運作：
+        1. 搜尋：預先送出後續頁面的搜尋（最多 PIPELINE_QUEUE_SIZE 頁在途）
+        2. 詳情：取得商品詳情並整理資料
+        3. 選項：展開複數選項商品
+        因此第 N 頁在查詢詳情、展開選項時，第 N+1 頁的搜尋已經在進行；
+        下游來不及消化時佇列會塞滿，上游自動停下來等待（背壓）。
+        各頁結果最後依 offset 順序合併。
+
+        啟用 prefilter 且有傳入 deferred 時，詳情階段整理完資料就先套用清洗規則
+        （需要 card_names 判斷目標卡號），一定會被排除的複數選項商品不展開、保留原始資料列，
+        並記到 deferred（商品 ID -> 選項簽章）；商品本身不在這裡丟掉，
+        由各呼叫者依自己的規則以 _prefilter_products 過濾（合併搜尋時結果由多個 run 共用）。
+
+        需求導向翻頁模式（demand_aware 且有 required_amount）會改用價格由低到高排序，
+        只比已判斷完的頁面多預抓 DEMAND_LOOKAHEAD_PAGES 頁；
+        已找到的庫存足以涵蓋需求時就停止翻頁，之後的頁面不再查詢。
+        """
+        demand_mode = self.demand_aware and bool(required_amount)
+        sort = SEARCH_SORT_PRICE_ASC if demand_mode else SEARCH_SORT_DEFAULT
+        demand_covered = (
+            self._demand_tracker(keyword, required_amount, card_names) if demand_mode else None
+        )
+        stop = asyncio.Event()
+
+        keyword_metrics = self.metrics.keyword(keyword)
+        use_negative_cache = self.cache is not None and not self.force_refresh
+        if use_negative_cache and self.cache.is_negative(keyword):
+            self.stats["negative_cache_hits"] += 1
+            keyword_metrics["source"] = "negative_cache"
+            logger.info(f"關鍵字 '{keyword}' 最近確認過沒有商品，略過搜尋。")
+            return []
+
+        logger.info(f"正在處理關鍵字 '{keyword}' 的第 1 頁")
+        first_result, _ = await self._search_products_async(
+            keyword, limit=ITEMS_PER_PAGE, offset=1, sort=sort
+        )
+        if not first_result or not first_result.get("Rows"):
+            logger.info(f"關鍵字 '{keyword}' 沒有搜尋結果。")
+            keyword_metrics["pages"] = keyword_metrics["total_pages"] = int(first_result is not None)
+            if first_result is not None and self.cache is not None:
+                # 搜尋成功但沒有商品（失敗時不記錄，下次仍會重試）
+                self.cache.set_negative(keyword)
+                self.stats["negative_cache_stores"] += 1
+            return []
+
+        total_pages = self._count_pages(first_result, max_pages)
+        keyword_metrics["total_pages"] = total_pages
+        if (
+            self.request_budget is not None
+            and max_pages < MAX_PAGES_PER_KEYWORD
+            and total_pages < self._count_pages(first_result, MAX_PAGES_PER_KEYWORD)
+        ):
+            # 請求額度不足、分到的頁數上限比平常少，而實際（依最新的 TotalRows）需要更多頁
+            self.partial_keywords[keyword] = "pages_capped"
+        searched = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        detailed = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        pages: Dict[int, List[Dict]] = {}
+        progress = asyncio.Condition()  # 選項階段每處理完一頁就通知搜尋階段
+        processed_pages = 0
 
-                # 多工處理資料轉換
-                page_products = []
-                with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
-                    futures = [
-                        executor.submit(self._extract_product_data, product)
-                        for product in product_details
-                    ]
-                    for future in as_completed(futures):
-                        product_data = future.result()
-                        if product_data:
-                            page_products.append(product_data)
-
-                # 對有複數選項的商品展開選項
-                for product in page_products:
-                    if not product.get("alt_price"):
-                        all_products.append(product)
-                        continue
-                    item_detail = await self._fetch_item_detail_async(product["product_id"])
-                    variants = self._expand_variants(product, item_detail) if item_detail else []
-                    if variants:
-                        all_products.extend(variants)
-                    else:
-                        logger.warning(
-                            f"商品 {product.get('product_id')} 選項展開失敗，保留原始資料列"
+        async def search_stage():
+            await searched.put((1, first_result["Rows"]))
+            in_flight = deque()
+            next_page = 2
+            try:
+                while (in_flight or next_page <= total_pages) and not stop.is_set():
+                    while next_page <= total_pages and len(in_flight) < PIPELINE_QUEUE_SIZE:
+                        if demand_mode and next_page - processed_pages > DEMAND_LOOKAHEAD_PAGES + 1:
+                            # 需求導向模式只預抓少量頁面，避免已經夠用了還多送請求
+                            if in_flight:
+                                break
+                            async with progress:
+                                await progress.wait_for(
+                                    lambda: stop.is_set()
+                                    or next_page - processed_pages <= DEMAND_LOOKAHEAD_PAGES + 1
+                                )
+                            if stop.is_set():
+                                break
+                        task = asyncio.create_task(
+                            self._search_page_async(keyword, next_page, sort=sort)
                         )
-                        all_products.append(product)
+                        in_flight.append((next_page, task))
+                        next_page += 1
+                    if not in_flight:
+                        break
+                    page, task = in_flight.popleft()
+                    await searched.put((page, await task))
+            finally:
+                # 停止翻頁，或其他階段出錯使 TaskGroup 取消本階段時，預抓中的搜尋一併取消
+                for _, task in in_flight:
+                    task.cancel()
+            await searched.put(None)
 
-                # 如果這頁不滿，代表沒有下一頁了
-                if len(search_result["Rows"]) < ITEMS_PER_PAGE:
-                    break
+        async def detail_stage():
+            while (item := await searched.get()) is not None:
+                if stop.is_set():
+                    continue
+                page, rows = item
+                signatures = {}
+                skip = set()
+                if rows:
+                    products, signatures = await self._fetch_page_products_async(
+                        keyword, page, rows
+                    )
+                    if deferred is not None:
+                        skip = {
+                            product["product_id"] for product in products
+                            if product.get("alt_price") and self._prefilter_rejects(product, card_names)
+                        }
+                        deferred.update((product_id, signatures.get(product_id)) for product_id in skip)
+                else:
+                    logger.info(f"關鍵字 '{keyword}' 在第 {page} 頁沒有結果，略過。")
+                    products = []
+                await detailed.put((page, products, signatures, skip))
+            await detailed.put(None)
 
-                page += 1
-                await asyncio.sleep(0.5)
+        async def variant_stage():
+            nonlocal processed_pages
+            while (item := await detailed.get()) is not None:
+                if stop.is_set():
+                    continue
+                page, products, signatures, skip = item
+                pages[page] = await self._expand_page_variants(products, signatures, skip)
+                if demand_covered and demand_covered(pages[page]) and page < total_pages:
+                    stop.set()
+                    self.early_stops[keyword] = (page, total_pages)
+                    self.stats["demand_early_stops"] += 1
+                    logger.info(
+                        f"關鍵字 '{keyword}' 在第 {page}/{total_pages} 頁已涵蓋需求量，停止翻頁"
+                    )
+                async with progress:
+                    processed_pages = page
+                    progress.notify_all()
 
-            except Exception as e:
-                logger.error(
-                    f"處理關鍵字 '{keyword}' 的第 {page} 頁時發生錯誤: {e}"
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(search_stage())
+                tg.create_task(detail_stage())
+                tg.create_task(variant_stage())
+        except Exception as e:
+            # TaskGroup 會取消其他階段，保留已經完成的頁面
+            logger.error(f"處理關鍵字 '{keyword}' 時發生錯誤: {e}")
+
+        keyword_metrics["pages"] = len(pages)
+        return [product for page in sorted(pages) for product in pages[page]]
+
+    def _collect_search_jobs(self, shopping_cart: List[Dict]) -> List[tuple]:
+        """
+        將購物車展開為 (卡片名稱, 卡號, 需求數量) 的搜尋工作清單，順序與購物車一致。
+
+        target_card_numbers 可能是純字串 "DABL-JP035"
+        或是字典 {"card_number": "DABL-JP035", "rarity_name": "...", ...}
+        """
+        jobs = []
+        for item in shopping_cart:
+            card_name = item.get("card_name_zh")
+            target_card_numbers = item.get("target_card_numbers", [])
+            required_amount = item.get("required_amount", 1)
+
+            if not card_name or not target_card_numbers:
+                continue
+
+            for target_card_number in target_card_numbers:
+                if isinstance(target_card_number, dict):
+                    card_number_str = target_card_number.get("card_number", "")
+                else:
+                    card_number_str = str(target_card_number)
+
+                if card_number_str:
+                    jobs.append((card_name, card_number_str, required_amount))
+        return jobs
+
+    def _group_jobs(self, jobs: List[tuple]) -> Dict[str, Dict]:
+        """
+        將搜尋工作依正規化後的卡號合併，每個卡號只爬一次。
+
+        Returns:
+            {正規化卡號: {"card_names": [要求的卡片名稱...], "required_amount": 需求數量合計}}，
+            順序為卡號第一次出現在購物車的順序
+        """
+        keywords: Dict[str, Dict] = {}
+        for card_name, card_number, required_amount in jobs:
+            entry = keywords.setdefault(
+                normalize_keyword(card_number), {"card_names": [], "required_amount": 0}
+            )
+            if card_name not in entry["card_names"]:
+                entry["card_names"].append(card_name)
+                entry["required_amount"] += required_amount or 0
+        return keywords
+
+    async def _scrape_keyword(
+        self, keyword: str, request: Dict, semaphore: asyncio.Semaphore
+    ) -> List[Dict]:
+        """
+        [非同步] 在並行上限內爬取單一卡號（已正規化）。
+
+        透過 _KEYWORD_FLIGHTS 合併同一行程內同時進行的相同搜尋：
+        若另一個 run（例如另一個專案的 /run）正在爬同一個卡號、且爬取條件相同
+        （見 _flight_key，不含各專案的過濾規則），就直接等待它的結果，不再重複發送請求。
+        共用的是未過濾的結果（由所有呼叫者共用，不可修改），各 run 再依自己的規則
+        以 _prefilter_products 過濾。
+
+        最多爬幾頁依 run() 分配的 _page_plan（預設 MAX_PAGES_PER_KEYWORD）。
+        輪到這個卡號時請求額度已經用完就直接略過；這個卡號自己有請求被額度拒絕時記為可能不完整。
+        資料是否完整跟著結果一起共用，資料不完整的卡號（包含共用到不完整結果的 run）
+        不寫入檢查點，續跑時會重新爬取。
+        """
+        card_names = request["card_names"]
+        required_amount = request["required_amount"]
+        signature = self._scrape_signature(keyword, request)
+        max_pages = self._page_plan.get(keyword, MAX_PAGES_PER_KEYWORD)
+        if self.resume and self._checkpoints is not None:
+            products = self._checkpoints.load(keyword, signature)
+            if products is not None:
+                self.stats["resumed_keywords"] += 1
+                self.metrics.keyword(keyword).update(source="resumed", rows=len(products))
+                logger.info(f"卡號 {keyword} 已有有效的檢查點，直接沿用 {len(products)} 筆資料")
+                return products
+
+        flight_key = self._flight_key(keyword, request, max_pages)
+        # run() 為每個卡號各自建立工作，這裡設定只影響這個卡號（含合併搜尋時發起的爬取工作）
+        rejections = Counter()
+        _keyword_budget_rejections.set(rejections)
+
+        async def scrape() -> tuple:
+            async with semaphore:
+                if self._budget_exhausted():
+                    logger.warning(f"請求額度已用完，略過卡號：{keyword}")
+                    return [], {}, "budget_skipped"
+                logger.info(f"開始搜尋卡號：{keyword}（{'、'.join(card_names)}）")
+                started = time.perf_counter()
+                deferred = {}
+                products = await self._process_products_async(
+                    keyword,
+                    max_pages=max_pages,
+                    required_amount=required_amount,
+                    card_names=card_names,
+                    deferred=deferred,
                 )
-                break
+                self.metrics.keyword(keyword)["elapsed_s"] = round(time.perf_counter() - started, 3)
+                if rejections["rejections"]:
+                    # 這個卡號有請求因額度用完被放棄
+                    return products, deferred, "budget_exhausted"
+                return products, deferred, self.partial_keywords.get(keyword)
 
-        return all_products
+        (products, deferred, partial), shared = await _KEYWORD_FLIGHTS.do(flight_key, scrape)
+        products = await self._prefilter_products(products, card_names, deferred)
+        if rejections["rejections"]:
+            partial = "budget_exhausted"  # 展開延後的選項時也可能被額度拒絕
+        if partial:
+            self.partial_keywords[keyword] = partial
+        self.metrics.keyword(keyword)["rows"] = len(products)
+        if shared:
+            self.stats["coalesced_keywords"] += 1
+            self.metrics.keyword(keyword)["source"] = "coalesced"
+            logger.info(f"卡號 {keyword} 已有相同的搜尋正在進行，共用其結果")
+        if self._checkpoints is not None and keyword not in self.partial_keywords:
+            self._checkpoints.save(keyword, signature, products)
+        return products
 
-    def _save_data(self, data: List[Dict], output_file: str) -> None:
-        """將爬取到的資料儲存為 CSV 檔案"""
-        if not output_file:
-            output_file = f"ruten_products_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    def _prioritize(self, keywords: Dict[str, Dict]) -> List[str]:
+        """
+        依優先順序排列卡號：已知商品數 / 需求量越小越優先
+        （需求量高、或露天上已知商品少的卡號先爬）。
 
-        if not output_file.lower().endswith(".csv"):
-            output_file += ".csv"
+        已知商品數來自回應快取中最近一次的搜尋結果（不論是否過期），
+        沒搜尋過的卡號視為 0，排在最前面；相同時維持購物車順序。
+        """
+        def scarcity(keyword: str) -> float:
+            known = self.cache.known_total_rows(keyword) if self.cache is not None else None
+            return (known or 0) / max(1, keywords[keyword]["required_amount"])
 
-        try:
-            df = pd.DataFrame(data)
+        return sorted(keywords, key=scarcity)
 
-            # 調整欄位順序，把 'search_card_name' 移到最前面
-            cols = df.columns.tolist()
-            if "search_card_name" in cols:
-                cols.insert(0, cols.pop(cols.index("search_card_name")))
-                df = df[cols]
+    def _plan_pages(self, order: List[str]) -> Dict[str, int]:
+        """
+        依請求額度分配每個卡號最多爬幾頁。
 
-            # 存檔（utf-8-sig 讓 Excel 正確顯示中文）
-            df.to_csv(output_file, index=False, encoding="utf-8-sig")
-            logger.info(f"資料已成功儲存到 {output_file}")
-        except Exception as e:
-            logger.error(f"儲存資料時發生錯誤：{e}")
-            raise RuntimeError(f"儲存爬蟲結果失敗: {e}")
+        這裡分配的只是上限，實際頁數仍由第一頁搜尋回應的 TotalRows 決定（見 _count_pages）。
+        不限額度時一律 MAX_PAGES_PER_KEYWORD 頁。有額度時以 BUDGET_REQUESTS_PER_PAGE
+        估計可以爬的總頁數，每個卡號先保留 1 頁：
+        - 剩下的頁數夠所有卡號爬滿時，一律 MAX_PAGES_PER_KEYWORD 頁
+        - 不夠時依優先順序分配，先依快取裡已知的商品數（可能已經過期）只分到估計需要的頁數，
+          還有剩再依優先順序補到 MAX_PAGES_PER_KEYWORD；頁數只在額度真的分完時才會少於上限
+        """
+        if self.request_budget is None:
+            return {keyword: MAX_PAGES_PER_KEYWORD for keyword in order}
+        spare = self.request_budget // BUDGET_REQUESTS_PER_PAGE - len(order)
+        if spare >= (MAX_PAGES_PER_KEYWORD - 1) * len(order):
+            return {keyword: MAX_PAGES_PER_KEYWORD for keyword in order}
+
+        plan = {}
+        for keyword in order:
+            known = self.cache.known_total_rows(keyword) if self.cache is not None else None
+            wanted = (
+                max(1, min(MAX_PAGES_PER_KEYWORD, math.ceil(known / ITEMS_PER_PAGE)))
+                if known else MAX_PAGES_PER_KEYWORD
+            )
+            extra = max(0, min(wanted - 1, spare))
+            plan[keyword] = 1 + extra
+            spare -= extra
+        for keyword in order:
+            extra = max(0, min(MAX_PAGES_PER_KEYWORD - plan[keyword], spare))
+            plan[keyword] += extra
+            spare -= extra
+        return plan
+
+    def _flight_key(self, keyword: str, request: Dict, max_pages: int) -> str:
+        """
+        合併同時進行的搜尋用的 key：只包含影響未過濾爬取結果的條件
+        （搜尋排序與需求導向翻頁的需求量、頁數上限、是否略過快取），
+        不同專案的過濾規則與卡片名稱不同也能共用。
+        """
+        demand_mode = self.demand_aware and bool(request["required_amount"])
+        return json.dumps(
+            [
+                keyword,
+                SEARCH_SORT_PRICE_ASC if demand_mode else SEARCH_SORT_DEFAULT,
+                request["required_amount"] if demand_mode else None,
+                self.demand_safety_factor if demand_mode else None,
+                self.demand_min_sellers if demand_mode else None,
+                # 需求導向翻頁依清洗規則判斷何時停止，規則不同時不能共用結果
+                request["card_names"] if demand_mode else None,
+                self._filter_rules if demand_mode else None,
+                max_pages,
+                self.force_refresh,
+            ],
+            ensure_ascii=False,
+        )
+
+    def _scrape_signature(self, keyword: str, request: Dict) -> list:
+        """
+        影響單一卡號爬取（含過濾）結果的條件，用來判斷檢查點是否可沿用。
+        """
+        return json.loads(json.dumps(
+            [
+                keyword,
+                request["card_names"] if self._filter_rules is not None else None,
+                self._filter_rules,
+                self.demand_aware,
+                request["required_amount"] if self.demand_aware else None,
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+        ))
+
+    def host_snapshots(self) -> Dict[str, Dict]:
+        """
+        本次 run 用到的各主機限流器與斷路器狀態：{主機: {"limiter": {...}, "breaker": {...}}}
 
-    async def run(self, cart_path: str, output_path: str) -> None:
+        限流器與斷路器在行程內共用，速率、並行數與斷路狀態是目前的值；
+        降速、429、斷路與拒絕等計數只算本次 run 期間增加的部分。
+        """
+        sources = {"limiter": (_HOSTS.limiters, _LIMITER_RUN_COUNTERS),
+                   "breaker": (_HOSTS.breakers, _BREAKER_RUN_COUNTERS)}
+        snapshots = {}
+        for host in sorted(self._host_baselines):
+            snapshots[host] = {}
+            for kind, (registry, counters) in sources.items():
+                baseline = self._host_baselines[host].get(kind)
+                if baseline is None or host not in registry:
+                    snapshots[host][kind] = None
+                    continue
+                snapshot = registry[host].snapshot()
+                for counter in counters:
+                    snapshot[counter] -= baseline[counter]
+                snapshots[host][kind] = snapshot
+        return snapshots
+
+    def _log_run_summary(self) -> None:
+        """輸出本次爬蟲的統計數字"""
+        logger.info(
+            f"本次爬蟲：耗時 {self.metrics.wall_time or 0:.1f} 秒，"
+            f"送出 {self.metrics.total_requests} 個請求，"
+            f"回應共 {self.metrics.total_bytes / 1024:.0f} KB"
+        )
+        hosts = self.host_snapshots()
+        for host, snapshot in hosts.items():
+            if snapshot["limiter"] is not None:
+                logger.info(f"限流器 {host}：{snapshot['limiter']}")
+        if self.stats["retries"] or self.stats["circuit_open_rejections"]:
+            logger.info(
+                f"重試：共 {self.stats['retries']} 次"
+                f"（search {self.stats['retries_search']} / detail {self.stats['retries_detail']}"
+                f" / items {self.stats['retries_items']}），"
+                f"重試次數用盡 {self.stats['retries_exhausted']} 次，"
+                f"重試額度用盡 {self.stats['retry_budget_exhausted']} 次，"
+                f"斷路器拒絕 {self.stats['circuit_open_rejections']} 次"
+            )
+        if self.hedge:
+            logger.info(
+                f"備援請求：送出 {self.stats['hedges_sent']} 次，"
+                f"其中 {self.stats['hedges_won']} 次比原請求先回應，"
+                f"省下約 {self.stats['hedge_latency_saved_ms']} ms；"
+                f"因額度不足略過 {self.stats['hedges_skipped']} 次"
+            )
+        for host, snapshot in hosts.items():
+            breaker = snapshot["breaker"]
+            if breaker is not None and breaker["times_opened"]:
+                logger.warning(f"斷路器 {host}：開啟 {breaker['times_opened']} 次，目前狀態 {breaker['state']}")
+        if self.cache is not None:
+            logger.info(
+                f"回應快取：命中 {self.stats['cache_hits']} 次，"
+                f"未命中 {self.stats['cache_misses']} 次"
+                + ("（強制重新整理）" if self.force_refresh else "")
+            )
+        if self.cache is not None:
+            logger.info(
+                f"查無商品快取：{self.stats['negative_cache_hits']} 個卡號直接略過搜尋，"
+                f"新記錄 {self.stats['negative_cache_stores']} 個查無商品的卡號"
+            )
+        if self.cache is not None and (
+            self.stats["variant_cache_hits"] or self.stats["variant_cache_misses"]
+        ):
+            logger.info(
+                f"選項快取：命中 {self.stats['variant_cache_hits']} 次，"
+                f"未命中 {self.stats['variant_cache_misses']} 次"
+            )
+        if self.resume:
+            logger.info(f"續跑：{self.stats['resumed_keywords']} 個卡號沿用檢查點")
+        if self._snapshot is not None:
+            logger.info(
+                f"增量模式：{self.stats['incremental_reused']} 個複數選項商品沒有變動、沿用上次資料，"
+                f"{self.stats['incremental_changed']} 個重新查詢選項"
+            )
+        logger.info(
+            f"卡號去重複：合併 {self.stats['deduplicated_keywords']} 個重複卡號，"
+            f"與其他進行中的搜尋共用 {self.stats['coalesced_keywords']} 個卡號"
+        )
+        if self.prefilter:
+            logger.info(
+                f"預先過濾：排除 {self.stats['prefilter_dropped']} 筆商品，"
+                f"省下 {self.stats['prefilter_requests_saved']} 次選項查詢"
+            )
+        if self.request_budget is not None:
+            logger.info(
+                f"請求額度：已使用 {self.stats['requests_sent']} / {self.request_budget}，"
+                f"額度用完後放棄 {self.stats['budget_rejections']} 個請求"
+            )
+        if self.partial_keywords:
+            logger.warning(
+                f"{len(self.partial_keywords)} 個卡號的資料可能不完整："
+                + "、".join(f"{keyword}（{reason}）" for keyword, reason in self.partial_keywords.items())
+            )
+        if self.demand_aware:
+            logger.info(f"需求導向翻頁：{len(self.early_stops)} 個卡號提前停止")
+            for keyword, (page, total_pages) in self.early_stops.items():
+                logger.info(f"  {keyword}：第 {page}/{total_pages} 頁即涵蓋需求量")
+
+    def _reset_run_state(self, force_refresh: bool) -> None:
+        """重設單次 run 的統計數字與額度"""
+        self.force_refresh = force_refresh
+        self.stats = Counter()
+        self.metrics = ScrapeMetrics()
+        self.early_stops = {}
+        self.partial_keywords = {}
+        self._page_plan = {}
+        self._retry_budgets = {}
+        self._hedge_budget = HedgeBudget()
+        self._host_baselines = {}
+
+    async def warm(self, keywords: List[str], max_pages: int = MAX_PAGES_PER_KEYWORD) -> Counter:
+        """
+        [非同步] 重新查詢指定卡號，只把最新回應寫入快取，不輸出 CSV。
+
+        給背景價格監看（PriceWatcher）使用：一律略過快取讀取（force_refresh），
+        讓之後的 /run 直接命中剛更新的快取。不套用 prefilter、需求導向翻頁與檢查點，
+        搜尋參數與 /run 的預設模式相同。與 /run 共用行程內各主機的限流器與斷路器，
+        背景更新與互動執行加起來的速率一樣受限。
+
+        Args:
+            keywords: 要更新的卡號
+            max_pages: 每個卡號最多爬幾頁（與 _scrape_keyword 相同）
+
+        Returns:
+            Counter: 本次的統計數字（requests_sent 為實際送出的請求數）
+        """
+        self._reset_run_state(force_refresh=True)
+        self.resume = False
+        self._checkpoints = None
+        self._snapshot = None
+        self._filter_rules = None
+
+        await self._open_session()
+        try:
+            for keyword in keywords:
+                await self._process_products_async(normalize_keyword(keyword), max_pages=max_pages)
+        finally:
+            await self.close()
+        return self.stats
+
+    async def run(
+        self,
+        cart_path: str,
+        output_path: str,
+        force_refresh: bool = False,
+        resume: bool = False,
+        incremental: bool = False,
+    ) -> None:
         """
         執行完整的露天拍賣爬蟲流程。
 
         依序：
         1. 讀取購物車設定
-        2. 逐一搜尋購物車中的卡片
-        3. 儲存結果為 CSV
+        2. 合併重複的卡號，建立共用連線池，依優先順序在並行上限內同時搜尋，結束後關閉連線池
+           （每個卡號完成時寫入 <專案>/checkpoints/ 的檢查點；有請求額度時依額度分配頁數）
+        3. 每個卡號完成後就依購物車順序串流寫入 CSV，全部完成才取代正式檔案
+           （增量模式另外更新 <專案>/listings.json 的商品快照）
+        4. 把本次的效能數據（各端點延遲直方圖、流量、重試、各卡號頁數等）
+           寫到 <專案>/scrape_metrics.json
 
         Args:
             cart_path: 購物車 JSON 路徑
             output_path: 輸出 CSV 路徑
+            force_refresh: 是否略過回應快取、一律向露天重新查詢
+            resume: 是否沿用先前中斷的執行留下的檢查點，條件相同且在
+                CHECKPOINT_MAX_AGE 內完成的卡號不再重新爬取
+            incremental: 增量模式。搜尋與商品詳情照常查詢，但 PostTime、價格與庫存
+                都和上次 run 相同的複數選項商品沿用上次展開的資料列，不再查詢選項詳情；
+                輸出的 CSV 仍是完整、最新的資料
 
         Raises:
-            FileNotFoundError: 找不到購物車設定檔
+            FileNotFoundError: 找不到購物車設定檔，或重播模式找不到錄製檔
             RuntimeError: 爬蟲過程中發生錯誤
         """
         # 1. 讀取購物車設定
@@ -382,47 +1954,88 @@ class RutenScraper:
         except json.JSONDecodeError:
             raise RuntimeError(f"購物車設定檔格式不正確: {cart_path}")
 
-        # 2. 逐一搜尋購物車中的卡片
-        all_products_list = []
-
-        for item in shopping_cart:
-            card_name = item.get("card_name_zh")
-            target_card_numbers = item.get("target_card_numbers", [])
-
-            if not card_name or not target_card_numbers:
-                continue
-
-            for target_card_number in target_card_numbers:
-                # target_card_numbers 可能是純字串 "DABL-JP035"
-                # 或是字典 {"card_number": "DABL-JP035", "rarity_name": "...", ...}
-                if isinstance(target_card_number, dict):
-                    card_number_str = target_card_number.get("card_number", "")
-                else:
-                    card_number_str = str(target_card_number)
-
-                if not card_number_str:
-                    continue
+        # 2. 同時搜尋購物車中的卡號（整個流程共用同一個連線池）
+        jobs = self._collect_search_jobs(shopping_cart)
+        self._reset_run_state(force_refresh)
+        self.resume = resume
+        self._checkpoints = RutenCheckpointStore(
+            os.path.join(os.path.dirname(output_path), CHECKPOINT_DIR_NAME),
+            max_age=CHECKPOINT_MAX_AGE,
+        )
+        self._checkpoints.prune()
+        self._snapshot = (
+            RutenListingSnapshot(os.path.join(os.path.dirname(output_path), LISTING_SNAPSHOT_NAME))
+            if incremental else None
+        )
+        if self.http_mode != "live":
+            self.cassette = Cassette(
+                os.path.join(os.path.dirname(output_path), HTTP_CASSETTE_NAME), self.http_mode
+            )
+        # 需求導向翻頁只計算清洗後仍會保留的庫存，因此也需要過濾規則
+        self._filter_rules = (
+            self._cleaner.load_rules(cart_data) if self.prefilter or self.demand_aware else None
+        )
 
-                logger.info(f"開始搜尋卡片：{card_name}, ID: {card_number_str}")
+        keywords = self._group_jobs(jobs)
+        self.stats["deduplicated_keywords"] = len(jobs) - len(keywords)
+        order = self._prioritize(keywords)
+        self._page_plan = self._plan_pages(order)
+        for rank, keyword in enumerate(order, start=1):
+            self.metrics.keyword(keyword).update(priority=rank, max_pages=self._page_plan[keyword])
 
-                # 限制最多 5 頁，避免抓太久
-                products = await self._process_products_async(
-                    card_number_str, max_pages=5
-                )
-
-                # 標記這是哪張卡片的搜尋結果
-                for product in products:
-                    product["search_card_name"] = card_name
+        # 3. 每個卡號完成後就依購物車順序串流寫入 CSV（先寫暫存檔，完成後再改名）
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        writer = RutenCsvWriter(output_path)
+        tasks = {}
 
-                all_products_list.extend(products)
+        if self.cassette is None or not self.cassette.replaying:
+            await self._open_session()
+        try:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            # 依優先順序建立工作，並行上限內先輪到優先順序高的卡號
+            tasks = {
+                keyword: asyncio.create_task(self._scrape_keyword(keyword, keywords[keyword], semaphore))
+                for keyword in order
+            }
+            last_use = {normalize_keyword(card_number): index
+                        for index, (_, card_number, _) in enumerate(jobs)}
 
-        # 3. 儲存結果
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # 依購物車順序，為每張卡片寫入各自標記 search_card_name 的資料
+            emitted = set()
+            for index, (card_name, card_number, _) in enumerate(jobs):
+                keyword = normalize_keyword(card_number)
+                products = await tasks[keyword]
+                if (card_name, keyword) not in emitted:
+                    emitted.add((card_name, keyword))
+                    writer.write_rows(products, search_card_name=card_name)
+                if last_use[keyword] == index:
+                    del tasks[keyword]  # 這個卡號不會再用到，釋放結果
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            writer.abort()
+            raise
+        finally:
+            await self.close()
+            if self.cassette is not None:
+                self.cassette.save()
+        for keyword, reason in self.partial_keywords.items():
+            self.metrics.keyword(keyword)["partial"] = reason
+        self.metrics.budget = {
+            "limit": self.request_budget,
+            "used": self.stats["requests_sent"],
+            "rejected": self.stats["budget_rejections"],
+            "partial_keywords": dict(self.partial_keywords),
+        }
+        self.metrics.finish(self.stats, rows_written=writer.rows_written, hosts=self.host_snapshots())
+        self._log_run_summary()
+        if self._snapshot is not None:
+            self._snapshot.save()
 
-        if all_products_list:
-            self._save_data(all_products_list, output_file=output_path)
-            logger.info(f"爬蟲完成！所有資料已儲存至：{output_path}")
+        writer.commit()
+        self.metrics.save(os.path.join(os.path.dirname(output_path), SCRAPE_METRICS_NAME))
+        if writer.rows_written:
+            logger.info(f"爬蟲完成！共 {writer.rows_written} 筆資料已儲存至：{output_path}")
         else:
             # 即使沒結果也建立空 CSV，讓後續流程不會因找不到檔案而失敗
-            logger.warning("爬蟲完成，但沒有找到任何商品。建立空白 CSV。")
-            pd.DataFrame().to_csv(output_path, index=False, encoding="utf-8-sig")
+            logger.warning("爬蟲完成，但沒有找到任何商品。已建立空白 CSV。")
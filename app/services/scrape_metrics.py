@@ -0,0 +1,214 @@
+"""
+app/services/scrape_metrics.py - 單次露天爬蟲的結構化效能數據
+============================================================
+RutenScraper.run() 每次執行都建立一個 ScrapeMetrics，記錄：
+- 各端點（search / detail / items）實際送出的 HTTP 請求：延遲直方圖、回應大小、
+  狀態碼分佈、錯誤與逾時次數（重試次數在 finish() 時從爬蟲的 stats 帶入）
+- 各卡號走了幾頁搜尋結果、產生幾筆資料、花了多少時間
+- 複數選項商品的展開數量
+- 請求額度的使用狀況，以及因額度不足而資料可能不完整的卡號
+- 執行結束時各主機限流器（速率、並行數）與斷路器的狀態；限流器與斷路器在行程內共用，
+  降速、429、斷路等次數只算本次 run 增加的部分
+- 整次執行的 wall time
+
+執行完成後寫到專案資料夾的 scrape_metrics.json（與 ruten_data.csv 同一層），
+GET /api/projects/{project_name}/metrics 可讀取最近一次的結果。
+
+使用方法：
+    metrics = ScrapeMetrics()
+    metrics.observe_request(url, elapsed, status=200, size=len(raw))
+    ...
+    metrics.finish(scraper.stats, rows_written=writer.rows_written, hosts=scraper.host_snapshots())
+    metrics.save("data/project/scrape_metrics.json")
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 延遲直方圖的區間上限（毫秒），超過最後一個的歸入 "+Inf"
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 網址路徑結尾 -> 端點名稱（與 RESPONSE_CACHE_TTLS 的端點名稱一致）
+ENDPOINT_SUFFIXES = {
+    "/search/v3/index.php/core/prod": "search",
+    "/prod/v2/index.php/prod": "detail",
+    "/items/v2/list": "items",
+}
+
+
+def endpoint_for_url(url: str) -> str:
+    """依網址判斷是哪個露天端點，無法判斷時回傳 "other" """
+    path = urlsplit(url).path
+    for suffix, endpoint in ENDPOINT_SUFFIXES.items():
+        if path.endswith(suffix):
+            return endpoint
+    return "other"
+
+
+class LatencyHistogram:
+    """
+    固定區間的延遲直方圖。
+
+    只保存每個區間的次數、總和與最大值，記憶體用量與請求數無關；
+    百分位數以所在區間的上限估計（落在 "+Inf" 的以最大值代替）。
+    """
+
+    def __init__(self, buckets_ms: tuple = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.buckets_ms) if ms <= bound), len(self.buckets_ms))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float | None:
+        """估計第 q 百分位數（毫秒），沒有樣本時回傳 None"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return float(self.buckets_ms[index]) if index < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={bound}" for bound in self.buckets_ms] + ["+Inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class ScrapeMetrics:
+    """
+    單次 run 的效能數據。
+
+    所有記錄方法都只在事件迴圈內呼叫，不需要加鎖。
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.wall_time: float | None = None
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.requests: Dict[str, Counter] = {}      # 端點 -> requests / bytes / errors / timeouts
+        self.statuses: Dict[str, Counter] = {}      # 端點 -> 狀態碼 -> 次數
+        self.keywords: Dict[str, Dict] = {}         # 卡號 -> 頁數、資料筆數、耗時
+        self.variants = Counter()                   # 複數選項展開的計數
+        self.budget: Dict = {}                      # 請求額度的使用狀況與資料不完整的卡號
+        self.hosts: Dict[str, Dict] = {}            # 主機 -> 限流器與斷路器的最終狀態
+        self.stats: Dict = {}
+        self.rows_written = 0
+
+    def observe_request(
+        self,
+        url: str,
+        seconds: float,
+        status: int | None = None,
+        size: int = 0,
+        timed_out: bool = False,
+    ) -> None:
+        """
+        記錄一個實際送出的 HTTP 請求（含重試與備援請求）。
+
+        Args:
+            url: 請求網址（用來判斷端點）
+            seconds: 從送出到讀完回應（或失敗）的秒數，不含限流器排隊
+            status: HTTP 狀態碼，連線失敗或逾時為 None
+            size: 回應內容的位元組數
+            timed_out: 是否逾時
+        """
+        endpoint = endpoint_for_url(url)
+        if endpoint not in self.latency:
+            self.latency[endpoint] = LatencyHistogram()
+            self.requests[endpoint] = Counter()
+            self.statuses[endpoint] = Counter()
+        self.latency[endpoint].observe(seconds)
+        counter = self.requests[endpoint]
+        counter["requests"] += 1
+        counter["bytes"] += size
+        if timed_out:
+            counter["timeouts"] += 1
+        if status is None or status >= 400:
+            counter["errors"] += 1
+        self.statuses[endpoint][str(status) if status is not None else "none"] += 1
+
+    def keyword(self, keyword: str) -> Dict:
+        """取得（或建立）卡號的記錄，呼叫端直接更新欄位"""
+        return self.keywords.setdefault(keyword, {"source": "scraped", "pages": 0, "total_pages": 0})
+
+    def finish(self, stats: Counter, rows_written: int = 0, hosts: Dict | None = None) -> None:
+        """結束計時，並帶入爬蟲的 stats（重試次數等）與各主機限流器、斷路器的狀態"""
+        self.wall_time = time.perf_counter() - self._started
+        self.stats = dict(stats)
+        self.rows_written = rows_written
+        self.hosts = hosts or {}
+
+    @property
+    def total_requests(self) -> int:
+        return sum(counter["requests"] for counter in self.requests.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(counter["bytes"] for counter in self.requests.values())
+
+    def to_dict(self) -> Dict:
+        endpoints = {}
+        for endpoint in sorted(self.requests):
+            counter = self.requests[endpoint]
+            endpoints[endpoint] = {
+                "requests": counter["requests"],
+                "bytes": counter["bytes"],
+                "errors": counter["errors"],
+                "timeouts": counter["timeouts"],
+                "retries": self.stats.get(f"retries_{endpoint}", 0),
+                "statuses": dict(self.statuses[endpoint]),
+                "latency": self.latency[endpoint].to_dict(),
+            }
+        pages: List[int] = [entry["pages"] for entry in self.keywords.values()]
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_time_s": round(self.wall_time, 3) if self.wall_time is not None else None,
+            "rows_written": self.rows_written,
+            "requests": self.total_requests,
+            "bytes": self.total_bytes,
+            "retries": self.stats.get("retries", 0),
+            "endpoints": endpoints,
+            "pages_walked": sum(pages),
+            "keywords": self.keywords,
+            "variants": dict(self.variants),
+            "budget": self.budget,
+            "hosts": self.hosts,
+            "stats": self.stats,
+        }
+
+    def save(self, path: str) -> None:
+        """寫成 JSON（先寫暫存檔再改名）；寫入失敗只記錄警告，不影響爬蟲結果"""
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入爬蟲效能數據 {path} 失敗: {e}")
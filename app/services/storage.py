@@ -12,6 +12,9 @@ import copy  # 用於 deepcopy，確保預設結構每次回傳獨立的物件
 import json
 import logging
 import os
+import time
+
+from app.config import SCRAPE_METRICS_NAME
 
 logger = logging.getLogger(__name__)
 
@@ -104,6 +107,11 @@ def _get_plan_path(project_name: str) -> str:
     return os.path.join(_get_project_dir(project_name), "plan.json")
 
 
+def _get_scrape_metrics_path(project_name: str) -> str:
+    """回傳最近一次爬蟲效能數據檔案的絕對路徑"""
+    return os.path.join(_get_project_dir(project_name), SCRAPE_METRICS_NAME)
+
+
 # ============================================================
 # 購物車讀寫
 # ============================================================
@@ -190,6 +198,30 @@ def get_plan(project_name: str) -> dict:
         raise RuntimeError(f"讀取計算結果 {path} 失敗: {e}") from e
 
 
+def get_scrape_metrics(project_name: str) -> dict:
+    """
+    讀取最近一次露天爬蟲的效能數據（scrape_metrics.json）。
+
+    Args:
+        project_name: 專案名稱
+    Returns:
+        效能數據的 dict（格式見 ScrapeMetrics.to_dict）
+    Raises:
+        FileNotFoundError: 若尚未執行過爬蟲
+        RuntimeError: 讀取失敗時
+    """
+    path = _get_scrape_metrics_path(project_name)
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"專案 '{project_name}' 尚未執行過爬蟲")
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        raise RuntimeError(f"讀取爬蟲效能數據 {path} 失敗: {e}") from e
+
+
 # ============================================================
 # 專案列表查詢
 # ============================================================
@@ -231,6 +263,37 @@ def list_projects() -> list[dict]:
     return projects
 
 
+def list_recent_carts(max_age: float) -> dict[str, dict]:
+    """
+    回傳最近使用過的專案購物車（背景價格監看用）。
+
+    以 cart.json 與 plan.json 中較新的修改時間作為「最後使用時間」，
+    超過 max_age 秒沒有動過的專案不列入；讀取失敗的專案直接略過。
+
+    Args:
+        max_age: 最後使用時間距今的秒數上限
+    Returns:
+        {專案名稱: 購物車 dict}，最近使用的排最前面
+    """
+    if not os.path.exists(DATA_DIR):
+        return {}
+
+    now = time.time()
+    recent = []
+    for folder_name in os.listdir(DATA_DIR):
+        paths = [_get_cart_path(folder_name), _get_plan_path(folder_name)]
+        mtimes = [os.path.getmtime(path) for path in paths if os.path.exists(path)]
+        if not mtimes or now - max(mtimes) > max_age:
+            continue
+        try:
+            recent.append((max(mtimes), folder_name, get_cart(folder_name)))
+        except Exception as e:
+            logger.warning(f"讀取專案 '{folder_name}' 的購物車失敗，略過: {e}")
+
+    recent.sort(key=lambda x: x[0], reverse=True)
+    return {name: cart for _, name, cart in recent}
+
+
 # ============================================================
 # 專案刪除（軟刪除 → _legacy/trash/）
 # ============================================================
@@ -0,0 +1,103 @@
+"""
+benchmarks/bench_extract.py - 商品資料轉換的微基準測試
+=======================================================
+比較兩種把 prod/v2 回應轉成爬蟲資料列的方式：
+- legacy : 每頁開一個 ThreadPoolExecutor(max_workers=10)，逐筆 submit _extract_product_data
+- batch  : RutenScraper._extract_products_batch 單一迴圈整批轉換
+
+使用方法（在專案根目錄執行）：
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --responses recorded_prod_v2.json --repeat 50
+
+--responses 是錄下來的 prod/v2 回應（JSON 陣列，每個元素是一頁的回應陣列）；
+沒有提供時，使用與露天回應欄位相同的合成資料（每頁 110 筆）。
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.services.ruten_scraper import ITEMS_PER_PAGE, MAX_CONCURRENT_REQUESTS, RutenScraper
+
+
+def _synthetic_pages(pages: int, seed: int = 0) -> list[list[dict]]:
+    """產生欄位結構與 prod/v2 回應相同的合成資料"""
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        products = []
+        for i in range(ITEMS_PER_PAGE):
+            low = rng.randint(10, 2000)
+            high = low if rng.random() < 0.8 else low + rng.randint(1, 500)
+            products.append({
+                "ProdId": f"22{page:04d}{i:06d}",
+                "ProdName": f"遊戲王 DABL-JP{i % 100:03d} 卡片 #{i}",
+                "SellerId": f"seller_{rng.randint(1, 300)}",
+                "PriceRange": [low, high],
+                "StockQty": rng.randint(0, 20),
+                "SoldQty": rng.randint(0, 5),
+                "ShippingCost": rng.choice([None, 40, 60, 65]),
+                "PostTime": "2026-01-01 12:00:00",
+                "Image": f"https://gcs.rimg.com.tw/g{i}.jpg",
+            })
+        result.append(products)
+    return result
+
+
+def _legacy_extract(scraper: RutenScraper, product_details: list[dict]) -> list[dict]:
+    """重現改版前的轉換方式（ThreadPoolExecutor + as_completed）"""
+    page_products = []
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = [
+            executor.submit(scraper._extract_product_data, product)
+            for product in product_details
+        ]
+        for future in as_completed(futures):
+            product_data = future.result()
+            if product_data:
+                page_products.append(product_data)
+    return page_products
+
+
+def _time_per_page(func, pages: list[list[dict]], repeat: int) -> list[float]:
+    """回傳每一輪處理所有頁面時，平均每頁花費的秒數"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            func(page)
+        samples.append((time.perf_counter() - start) / len(pages))
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--responses", help="錄下來的 prod/v2 回應 JSON 檔")
+    parser.add_argument("--pages", type=int, default=20, help="合成資料的頁數")
+    parser.add_argument("--repeat", type=int, default=30, help="重複次數")
+    args = parser.parse_args()
+
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            pages = json.load(f)
+    else:
+        pages = _synthetic_pages(args.pages)
+
+    scraper = RutenScraper(cache_path=None)
+    legacy = _time_per_page(lambda page: _legacy_extract(scraper, page), pages, args.repeat)
+    batch = _time_per_page(scraper._extract_products_batch, pages, args.repeat)
+
+    rows = sum(len(page) for page in pages)
+    print(f"{len(pages)} 頁 / {rows} 筆商品，重複 {args.repeat} 次（每頁耗時）")
+    for name, samples in (("legacy", legacy), ("batch", batch)):
+        print(
+            f"  {name:<7} median {statistics.median(samples) * 1e6:9.1f} µs"
+            f"   min {min(samples) * 1e6:9.1f} µs"
+        )
+    print(f"  speedup  {statistics.median(legacy) / statistics.median(batch):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+benchmarks/bench_scraper.py - 露天爬蟲的端到端吞吐量基準測試
+=============================================================
+啟動 benchmarks/fake_ruten_server.py 的模擬露天 API，把 RutenScraper 指向它，
+以 10 / 50 / 200 個卡號的購物車執行完整的 run()，量測：
+- wall time 與 requests/sec（每個送出的 HTTP 請求都算，含重試與備援請求）
+- 各端點（search / detail / items）的請求數與 p50 / p99 延遲（爬蟲端量到的，含限流器排隊）
+- 爬蟲本身的 stats（重試、斷路器等）與模擬伺服器注入的錯誤數
+
+結果寫成 JSON 檔，方便比較不同版本或不同參數的跑分。
+預設沿用正式環境的 AdaptiveRateLimiter（每台主機最高 20 req/s），
+量到的是爬蟲實際會有的速度；--max-rate 把限流器固定在指定速率（不再 AIMD 降速），
+單純量測爬蟲本身的開銷。
+
+使用方法（在專案根目錄執行）：
+    python -m benchmarks.bench_scraper
+    python -m benchmarks.bench_scraper --sizes 10 50 --pages 2 --error-rate-429 0.02 \\
+        --output bench_results/scraper.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app.services import ruten_scraper
+from app.services.rate_limiter import AdaptiveRateLimiter
+from app.services.ruten_scraper import RutenScraper
+from benchmarks.fake_ruten_server import (
+    FakeRutenServer,
+    add_config_arguments,
+    config_from_args,
+)
+
+FIXED_CONCURRENCY = 50  # 指定 --max-rate 時限流器固定的並行數
+
+# 網址路徑 -> 端點名稱
+ENDPOINT_PATHS = {
+    "/api/search/v3/index.php/core/prod": "search",
+    "/api/prod/v2/index.php/prod": "detail",
+    "/api/items/v2/list": "items",
+}
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    """最近秩法的百分位數（樣本少時 statistics.quantiles 不穩定）"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _write_cart(path: str, size: int) -> None:
+    """寫一個有 size 個不同卡號的購物車"""
+    cart = {
+        "shopping_cart": [
+            {"card_name_zh": f"測試卡{i}", "target_card_numbers": [f"BENCH-JP{i:03d}"],
+             "required_amount": 1}
+            for i in range(size)
+        ]
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cart, f, ensure_ascii=False)
+
+
+def _instrument(scraper: RutenScraper, latencies: dict) -> None:
+    """包裝 _request_json，依端點記錄每個請求的延遲（不論成功或失敗）"""
+    request_json = scraper._request_json
+
+    async def timed(url, params, on_sent=None):
+        endpoint = ENDPOINT_PATHS.get(urlsplit(url).path, "other")
+        started = time.perf_counter()
+        try:
+            return await request_json(url, params, on_sent)
+        finally:
+            latencies[endpoint].append(time.perf_counter() - started)
+
+    scraper._request_json = timed
+
+
+async def _bench_cart(base_url: str, size: int, max_rate: float | None) -> dict:
+    """以 size 個卡號的購物車執行一次 run()，回傳量測結果"""
+    scraper = RutenScraper(cache_path=None, http_mode="live")
+    # 限流器在行程內共用，每個購物車大小都從初始狀態開始量測
+    ruten_scraper._HOSTS.clear()
+    if max_rate is not None:
+        host = urlsplit(base_url).netloc
+        # 上下限相同：速率與並行數固定，不受 AIMD 降速影響
+        ruten_scraper._HOSTS.limiter(host)  # 綁定目前的事件迴圈
+        ruten_scraper._HOSTS.limiters[host] = AdaptiveRateLimiter(
+            rate=max_rate, concurrency=FIXED_CONCURRENCY,
+            min_rate=max_rate, max_rate=max_rate,
+            min_concurrency=FIXED_CONCURRENCY, max_concurrency=FIXED_CONCURRENCY,
+        )
+    latencies = defaultdict(list)
+    _instrument(scraper, latencies)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cart_path = os.path.join(tmp, "cart.json")
+        output_path = os.path.join(tmp, "ruten_data.csv")
+        _write_cart(cart_path, size)
+
+        started = time.perf_counter()
+        await scraper.run(cart_path, output_path)
+        wall_time = time.perf_counter() - started
+
+        with open(output_path, encoding="utf-8-sig") as f:
+            rows = max(0, sum(1 for _ in f) - 1)
+
+    requests = sum(len(samples) for samples in latencies.values())
+    return {
+        "cards": size,
+        "wall_time_s": round(wall_time, 3),
+        "requests": requests,
+        "requests_per_sec": round(requests / wall_time, 2) if wall_time else None,
+        "rows": rows,
+        "endpoints": {
+            endpoint: {
+                "requests": len(samples),
+                "p50_ms": round(statistics.median(samples) * 1000, 2),
+                "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+            }
+            for endpoint, samples in sorted(latencies.items())
+        },
+        "scraper_stats": dict(scraper.stats),
+    }
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    config = config_from_args(args)
+    original = (ruten_scraper.BASE_URL, ruten_scraper.RUTEN_ITEMS_API_BASE_URL)
+    results = []
+    for size in args.sizes:
+        # 每個購物車用新的伺服器，注入的錯誤數才不會累加
+        server = FakeRutenServer(config)
+        base_url = await server.start()
+        ruten_scraper.BASE_URL = ruten_scraper.RUTEN_ITEMS_API_BASE_URL = base_url
+        try:
+            result = await _bench_cart(base_url, size, args.max_rate)
+        finally:
+            ruten_scraper.BASE_URL, ruten_scraper.RUTEN_ITEMS_API_BASE_URL = original
+            await server.stop()
+        result["server_stats"] = dict(server.stats)
+        results.append(result)
+
+        endpoints = "  ".join(
+            f"{name} p50={e['p50_ms']:.1f}ms p99={e['p99_ms']:.1f}ms"
+            for name, e in result["endpoints"].items()
+        )
+        print(
+            f"{size:>4} 個卡號：{result['wall_time_s']:>8.2f} s  "
+            f"{result['requests']:>5} 個請求  {result['requests_per_sec']:>7.2f} req/s  "
+            f"{result['rows']:>6} 筆資料  {endpoints}"
+        )
+
+    return {
+        "benchmark": "bench_scraper",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {**vars(config), "max_rate": args.max_rate},
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="購物車的卡號數")
+    parser.add_argument("--max-rate", type=float, default=None,
+                        help="把限流器固定在指定速率（req/s）；預設沿用正式環境的限流器")
+    parser.add_argument("--output", default="bench_scraper_results.json", help="結果 JSON 檔路徑")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    print(
+        f"模擬伺服器：每個卡號 {args.pages} 頁，複數選項比例 {args.variant_ratio:.0%}，"
+        f"429 比例 {args.error_rate_429:.1%}，5xx 比例 {args.error_rate_5xx:.1%}"
+    )
+    report = asyncio.run(_run(args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+benchmarks/bench_startup.py - 伺服器啟動與標頭產生的基準測試
+=============================================================
+量測三件事：
+- import    : 在新的 Python 行程中 import server（含所有 router 與 service 模組）的時間
+- scraper   : 建立 RutenScraper / KonamiScraper 實例的時間（每個 /run 都會建立一次）
+- headers   : 每次請求取得偽裝標頭（_get_headers）的時間
+
+使用方法（在專案根目錄執行）：
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --calls 20000
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from app.services.konami_scraper import KonamiScraper
+from app.services.ruten_scraper import RutenScraper
+
+
+def _time_import(repeat: int) -> list[float]:
+    """每次開一個新行程 import server，回傳各次的秒數（不含直譯器本身啟動）"""
+    code = "import time; t = time.perf_counter(); import server; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+def _time_calls(func, repeat: int) -> list[float]:
+    """回傳每次呼叫 func 的秒數"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="import 與建立實例的重複次數")
+    parser.add_argument("--calls", type=int, default=2000, help="_get_headers 的呼叫次數")
+    args = parser.parse_args()
+
+    imports = _time_import(args.repeat)
+    ruten = _time_calls(lambda: RutenScraper(cache_path=None), args.repeat)
+    konami = _time_calls(KonamiScraper, args.repeat)
+
+    scraper = RutenScraper(cache_path=None)
+    scraper._get_headers()  # 第一次呼叫可能需要載入 User-Agent 資料
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        scraper._get_headers()
+    per_call = (time.perf_counter() - start) / args.calls
+
+    print(f"重複 {args.repeat} 次（中位數 / 最小值）")
+    for name, samples in (
+        ("import server", imports), ("RutenScraper()", ruten), ("KonamiScraper()", konami)
+    ):
+        print(
+            f"  {name:<16} {statistics.median(samples) * 1e3:9.2f} ms"
+            f"   min {min(samples) * 1e3:9.2f} ms"
+        )
+    print(f"  {'_get_headers()':<16} {per_call * 1e6:9.2f} µs / 次（{args.calls} 次平均）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+benchmarks/fake_ruten_server.py - 本機模擬的露天 API 伺服器
+============================================================
+以 aiohttp.web 實作爬蟲會用到的三個露天端點，回應合成的商品資料：
+- /api/search/v3/index.php/core/prod : 搜尋（TotalRows + Rows[{Id}]）
+- /api/prod/v2/index.php/prod        : 商品詳情（id 以逗號分隔）
+- /api/items/v2/list                 : 複數選項詳情（spec_info.specs）
+
+可調整每個卡號的頁數、複數選項商品比例、各端點的延遲分佈（對數常態），
+以及隨機回應 429（附 Retry-After）與 5xx 的比例。相同的 seed 與卡號永遠得到相同的商品。
+
+使用方法（在專案根目錄執行）：
+    python -m benchmarks.fake_ruten_server --port 8081 --pages 2 --error-rate-429 0.01
+
+    # 程式中使用
+    server = FakeRutenServer(FakeRutenConfig(pages=2))
+    base_url = await server.start()     # 例如 http://127.0.0.1:54321/api
+    ...
+    await server.stop()
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+from app.services.ruten_scraper import ITEMS_PER_PAGE
+
+
+@dataclass
+class FakeRutenConfig:
+    """模擬伺服器的參數"""
+    pages: int = 1                  # 每個卡號的搜尋結果頁數（最後一頁為半頁）
+    variant_ratio: float = 0.2      # 複數選項商品的比例
+    variants_per_product: int = 3   # 每個複數選項商品的選項數
+    latency_ms: dict = field(default_factory=lambda: {"search": 80.0, "detail": 60.0, "items": 40.0})
+    latency_sigma: float = 0.5      # 對數常態延遲的 σ（0 表示固定延遲）
+    error_rate_429: float = 0.0     # 回應 429 的機率
+    error_rate_5xx: float = 0.0     # 回應 503 的機率
+    retry_after: float = 1.0        # 429 回應的 Retry-After 秒數
+    seed: int = 0
+
+
+class FakeRutenServer:
+    """
+    模擬的露天 API。
+
+    stats 記錄各端點收到的請求數與注入的錯誤數，方便與爬蟲端的統計對照。
+    """
+
+    def __init__(self, config: FakeRutenConfig | None = None):
+        self.config = config or FakeRutenConfig()
+        self.stats = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._runner: web.AppRunner | None = None
+
+    # ------------------------------------------------------------
+    # 合成資料
+    # ------------------------------------------------------------
+
+    def _product_ids(self, keyword: str) -> list[str]:
+        """卡號對應的所有商品 ID（由卡號雜湊決定，同一個卡號每次都一樣）"""
+        total = max(1, math.ceil((self.config.pages - 0.5) * ITEMS_PER_PAGE))
+        prefix = int(hashlib.sha1(f"{self.config.seed}:{keyword}".encode()).hexdigest()[:8], 16)
+        return [f"{prefix % 10**10:010d}{i:04d}" for i in range(total)]
+
+    def _product_rng(self, prod_id: str) -> random.Random:
+        return random.Random(f"{self.config.seed}:{prod_id}")
+
+    def _product(self, prod_id: str) -> dict:
+        """prod/v2 格式的單一商品"""
+        rng = self._product_rng(prod_id)
+        low = rng.randint(10, 2000)
+        has_variants = rng.random() < self.config.variant_ratio
+        high = low + rng.randint(1, 500) if has_variants else low
+        return {
+            "ProdId": prod_id,
+            "ProdName": f"遊戲王 FAKE-JP{int(prod_id[-3:]):03d} 測試卡片",
+            "SellerId": f"seller_{rng.randint(1, 300)}",
+            "PriceRange": [low, high],
+            "StockQty": rng.randint(0, 20),
+            "SoldQty": rng.randint(0, 5),
+            "ShippingCost": rng.choice([None, 40, 60, 65]),
+            "PostTime": "2026-01-01 12:00:00",
+            "Image": f"https://gcs.rimg.com.tw/fake/{prod_id}.jpg",
+        }
+
+    def _specs(self, prod_id: str) -> dict:
+        """items/v2 格式的選項（只有複數選項商品才有）"""
+        product = self._product(prod_id)
+        low, high = product["PriceRange"]
+        if low == high:
+            return {}
+        rng = self._product_rng(prod_id)
+        count = self.config.variants_per_product
+        return {
+            f"s{i}": {
+                "spec_name": f"版本{i}",
+                "spec_price": low + (high - low) * i // max(1, count - 1),
+                "spec_num": rng.randint(0, 5),
+                "spec_status": "Y",
+            }
+            for i in range(count)
+        }
+
+    # ------------------------------------------------------------
+    # 延遲與錯誤注入
+    # ------------------------------------------------------------
+
+    async def _simulate(self, endpoint: str) -> web.Response | None:
+        """等待模擬延遲，需要注入錯誤時回傳錯誤回應"""
+        self.stats[f"requests_{endpoint}"] += 1
+        median = self.config.latency_ms.get(endpoint, 50.0) / 1000
+        sigma = self.config.latency_sigma
+        await asyncio.sleep(median * math.exp(self._rng.gauss(0, sigma)) if sigma else median)
+
+        roll = self._rng.random()
+        if roll < self.config.error_rate_429:
+            self.stats["injected_429"] += 1
+            return web.json_response(
+                {"error": "too many requests"}, status=429,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        if roll < self.config.error_rate_429 + self.config.error_rate_5xx:
+            self.stats["injected_5xx"] += 1
+            return web.json_response({"error": "unavailable"}, status=503)
+        return None
+
+    async def _search(self, request: web.Request) -> web.Response:
+        if (error := await self._simulate("search")) is not None:
+            return error
+        ids = self._product_ids(request.query.get("q", ""))
+        offset = int(request.query.get("offset", 1))
+        limit = int(request.query.get("limit", ITEMS_PER_PAGE))
+        rows = [{"Id": prod_id} for prod_id in ids[offset - 1:offset - 1 + limit]]
+        return web.json_response({"TotalRows": len(ids), "Rows": rows})
+
+    async def _detail(self, request: web.Request) -> web.Response:
+        if (error := await self._simulate("detail")) is not None:
+            return error
+        ids = [i for i in request.query.get("id", "").split(",") if i]
+        return web.json_response([self._product(prod_id) for prod_id in ids])
+
+    async def _items(self, request: web.Request) -> web.Response:
+        if (error := await self._simulate("items")) is not None:
+            return error
+        specs = self._specs(request.query.get("gno", ""))
+        return web.json_response({"data": [{"spec_info": {"specs": specs}}] if specs else []})
+
+    # ------------------------------------------------------------
+    # 啟動與關閉
+    # ------------------------------------------------------------
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/search/v3/index.php/core/prod", self._search)
+        app.router.add_get("/api/prod/v2/index.php/prod", self._detail)
+        app.router.add_get("/api/items/v2/list", self._items)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        [非同步] 啟動伺服器。
+
+        Args:
+            port: 0 表示使用任一個空閒的連接埠
+        Returns:
+            API base URL（可同時當作 RUTEN_API_BASE_URL 與 RUTEN_ITEMS_API_BASE_URL）
+        """
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        actual_port = self._runner.addresses[0][1]
+        return f"http://{host}:{actual_port}/api"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """加入 FakeRutenConfig 對應的命令列參數（bench_scraper 共用）"""
+    parser.add_argument("--pages", type=int, default=1, help="每個卡號的搜尋結果頁數")
+    parser.add_argument("--variant-ratio", type=float, default=0.2, help="複數選項商品比例")
+    parser.add_argument("--latency-ms", type=float, nargs=3, default=[80.0, 60.0, 40.0],
+                        metavar=("SEARCH", "DETAIL", "ITEMS"), help="各端點的延遲中位數（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="對數常態延遲的 σ")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="回應 429 的機率")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="回應 503 的機率")
+    parser.add_argument("--seed", type=int, default=0, help="合成資料與延遲的亂數種子")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeRutenConfig:
+    search, detail, items = args.latency_ms
+    return FakeRutenConfig(
+        pages=args.pages,
+        variant_ratio=args.variant_ratio,
+        latency_ms={"search": search, "detail": detail, "items": items},
+        latency_sigma=args.latency_sigma,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        seed=args.seed,
+    )
+
+
+async def _serve(config: FakeRutenConfig, port: int) -> None:
+    server = FakeRutenServer(config)
+    base_url = await server.start(port=port)
+    print(f"模擬露天 API 已啟動：{base_url}（Ctrl+C 結束）")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081, help="監聽的連接埠")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(config_from_args(args), args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
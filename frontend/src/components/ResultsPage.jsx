@@ -110,6 +110,23 @@ const ResultsPage = () => {
                 </div>
             )}
 
+            {/* 資料不完整提示（爬蟲請求額度用完） */}
+            {results.partial_keywords && Object.keys(results.partial_keywords).length > 0 && (
+                <div className="bg-amber-900/20 border border-amber-500/30 rounded-xl p-6 mb-8">
+                    <h3 className="text-lg font-bold text-amber-400 mb-3 flex items-center gap-2">
+                        <AlertCircle size={20} />
+                        爬蟲請求額度不足，以下卡號的商品資料可能不完整 ({Object.keys(results.partial_keywords).length})
+                    </h3>
+                    <div className="flex flex-wrap gap-2">
+                        {Object.keys(results.partial_keywords).map((cardNumber) => (
+                            <span key={cardNumber} className="bg-amber-950 text-amber-300 border border-amber-800/50 px-3 py-1 rounded text-sm font-medium">
+                                {cardNumber}
+                            </span>
+                        ))}
+                    </div>
+                </div>
+            )}
+
             {/* 賣家列表 (計畫內容) */}
             <div className="space-y-6">
                 <h3 className="text-xl font-bold text-white pl-2 border-l-4 border-primary">賣家訂單清單 ({results.plan.length})</h3>
@@ -130,6 +147,9 @@ const ResultsPage = () => {
                         <div className="divide-y divide-slate-800/50">
                             {seller.items.map((item, itemIdx) => (
                                 <div key={itemIdx} className="p-4 hover:bg-slate-800/30 transition-colors flex items-center gap-4">
+                                    {item.thumbnail_url && (
+                                        <img src={item.thumbnail_url} alt="" loading="lazy" className="w-12 h-12 object-cover rounded border border-slate-700 flex-shrink-0" />
+                                    )}
                                     <div className="flex-1 min-w-0">
                                         <div className="flex items-center gap-2 mb-1">
                                             <a href={item.url} target="_blank" rel="noopener noreferrer" className="font-bold text-white hover:text-primary transition-colors flex items-center gap-1.5 truncate">
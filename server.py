@@ -3,14 +3,16 @@ server.py - YGOscraper API 應用程式入口點
 ==========================================
 這個檔案是整個後端的啟動入口，職責非常單純：
 1. 在伺服器啟動時，載入共用資源（cards.cdb 資料庫、CID 對應表）到記憶體
-2. 設定 CORS 允許前端存取
-3. 將各功能模組的 router 掛載到 FastAPI App 上
+2. 在背景啟動價格監看（PriceWatcher），定期更新近期專案卡號的露天資料
+3. 設定 CORS 允許前端存取
+4. 將各功能模組的 router 掛載到 FastAPI App 上
 
 所有 API 端點的實作邏輯已移至 app/routers/ 下的對應模組：
   - app/routers/projects.py : 專案管理
   - app/routers/cart.py     : 購物車讀寫
   - app/routers/cards.py    : 卡片搜尋與卡號爬取
   - app/routers/tasks.py    : 爬蟲執行與結果讀取
+  - app/routers/images.py   : 本地快取的商品圖片
 
 所有 Pydantic 資料結構已移至 app/schemas.py 統一管理。
 """
@@ -22,6 +24,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # 引入 CardDatabaseService，統一管理卡片資料庫的載入與查詢
 from app.services.card_db import CardDatabaseService
+from app.services.image_cache import ProductImageCache
+from app.services.price_watcher import PriceWatcher
 
 # ============================================================
 # 建立共用的 CardDatabaseService 實例
@@ -34,10 +38,11 @@ card_db = CardDatabaseService()
 async def lifespan(app: FastAPI):
     """
     伺服器的生命週期管理：
-    - 啟動時（yield 前）：初始化 CardDatabaseService（載入 cards.cdb + CID 對應表）
-    - 關閉時（yield 後）：關閉資料庫連線
+    - 啟動時（yield 前）：初始化 CardDatabaseService（載入 cards.cdb + CID 對應表），
+      建立商品圖片快取，並啟動背景價格監看
+    - 關閉時（yield 後）：停止價格監看、關閉資料庫連線
 
-    透過 app.state 把 card_db 共享給所有 router，
+    透過 app.state 把 card_db、image_cache、price_watcher 共享給所有 router，
     這樣 router 就不需要反向 import server 來取得它（消除循環引用）。
     """
     # 初始化卡片資料庫（內部會自動載入 cdb + cid_table.json）
@@ -46,9 +51,20 @@ async def lifespan(app: FastAPI):
     # 掛載到 app.state，讓 router 透過 request.app.state.card_db 取用
     app.state.card_db = card_db
 
+    # 本地商品圖片快取：/run 完成後下載計畫中的圖片，結果頁改從本機讀取
+    image_cache = ProductImageCache()
+    app.state.image_cache = image_cache
+
+    # 背景價格監看：/run 執行期間會透過 app.state.price_watcher 暫停它
+    price_watcher = PriceWatcher()
+    price_watcher.start()
+    app.state.price_watcher = price_watcher
+
     yield  # 伺服器在此運行，等待請求
 
     # 伺服器關閉時清理資源
+    await price_watcher.stop()
+    image_cache.close()
     card_db.close()
 
 
@@ -79,7 +95,7 @@ app.add_middleware(
 # ============================================================
 # 掛載 API 路由模組
 # ============================================================
-from app.routers import cards, cart, health, projects, settings, tasks  # noqa: E402
+from app.routers import cards, cart, health, images, projects, settings, tasks  # noqa: E402
 
 app.include_router(projects.router)
 app.include_router(cart.router)
@@ -87,6 +103,7 @@ app.include_router(cards.router)
 app.include_router(tasks.router)
 app.include_router(health.router)
 app.include_router(settings.router)
+app.include_router(images.router)
 
 # ============================================================
 # 本地開發啟動入口
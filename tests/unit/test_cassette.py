@@ -0,0 +1,93 @@
+"""
+tests/unit/test_cassette.py - HTTP record/replay unit tests
+
+Cassettes are written directly with Cassette(mode="record") and then
+replayed through the real scraper request paths, so no test touches
+the network.
+"""
+import csv
+
+import pytest
+
+from app.config import HTTP_CASSETTE_NAME, KONAMI_DB_BASE_URL, RUTEN_API_BASE_URL
+from app.services import ruten_scraper
+from app.services.cassette import Cassette, CassetteMissError
+from app.services.konami_scraper import KonamiScraper
+from app.services.ruten_scraper import ITEMS_PER_PAGE, SEARCH_SORT_DEFAULT, RutenScraper
+
+SEARCH_URL = f"{RUTEN_API_BASE_URL}/search/v3/index.php/core/prod"
+DETAIL_URL = f"{RUTEN_API_BASE_URL}/prod/v2/index.php/prod"
+
+
+class TestCassette:
+    def test_round_trip_replays_in_recorded_order(self, tmp_dir):
+        """同一個請求依錄製順序回應，用完後重複最後一筆；沒錄到的請求直接報錯"""
+        path = str(tmp_dir / "cassette.jsonl.gz")
+        recorder = Cassette(path, "record")
+        recorder.record("https://x/a", {"b": 2, "a": 1}, 503, retry_after="1")
+        recorder.record("https://x/a", {"a": 1, "b": 2}, 200, {"ok": True})
+        recorder.save()
+
+        player = Cassette(path, "replay")
+        assert player.lookup("https://x/a", {"a": "1", "b": "2"})["status"] == 503
+        assert player.lookup("https://x/a", {"a": 1, "b": 2})["body"] == {"ok": True}
+        assert player.lookup("https://x/a", {"a": 1, "b": 2})["body"] == {"ok": True}
+        with pytest.raises(CassetteMissError):
+            player.lookup("https://x/other")
+
+    def test_replay_requires_existing_file(self, tmp_dir):
+        with pytest.raises(FileNotFoundError):
+            Cassette(str(tmp_dir / "missing.jsonl.gz"), "replay")
+
+
+class TestScraperReplay:
+    async def test_ruten_run_replayed_offline(self, tmp_dir, monkeypatch):
+        """重播模式完全不連網，錄製的錯誤狀態碼一樣會觸發重試"""
+        monkeypatch.setattr(ruten_scraper, "backoff_delay", lambda attempt: 0)
+        search_params = {
+            "q": "AAA-001", "type": "direct", "sort": SEARCH_SORT_DEFAULT,
+            "limit": ITEMS_PER_PAGE, "offset": 1,
+        }
+        product = {
+            "ProdId": "1", "ProdName": "AAA-001 卡A", "SellerId": "s", "PriceRange": [100, 100],
+            "StockQty": 3, "SoldQty": 0, "ShippingCost": 60, "PostTime": "", "Image": "",
+        }
+        recorder = Cassette(str(tmp_dir / HTTP_CASSETTE_NAME), "record")
+        recorder.record(SEARCH_URL, search_params, 200, {"TotalRows": 1, "Rows": [{"Id": "1"}]})
+        recorder.record(DETAIL_URL, {"id": "1"}, 503)
+        recorder.record(DETAIL_URL, {"id": "1"}, 200, [product])
+        recorder.save()
+
+        async def no_network():
+            raise AssertionError("replay mode must not open a connection")
+
+        scraper = RutenScraper(cache_path=None, http_mode="replay")
+        monkeypatch.setattr(scraper, "_open_session", no_network)
+        cart_path = tmp_dir / "cart.json"
+        cart_path.write_text(
+            '{"shopping_cart": [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}]}',
+            encoding="utf-8",
+        )
+        output = tmp_dir / "ruten_data.csv"
+
+        await scraper.run(str(cart_path), str(output))
+
+        with open(output, encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["product_id"] for r in rows] == ["1"]
+        assert scraper.stats["retries_detail"] == 1
+
+    def test_konami_replayed_without_delay(self, tmp_dir, monkeypatch):
+        """Konami 重播模式直接回傳錄製的 HTML，不再隨機等待"""
+        path = str(tmp_dir / "konami.jsonl.gz")
+        url = f"{KONAMI_DB_BASE_URL}?ope=2&cid=4007&request_locale=ja"
+        recorder = Cassette(path, "record")
+        recorder.record(url, None, 200, "<html>4007</html>")
+        recorder.save()
+        monkeypatch.setattr("time.sleep", lambda seconds: None)
+
+        scraper = KonamiScraper(http_mode="replay", cassette_path=path)
+        monkeypatch.setattr(scraper.session, "get", None)
+
+        assert scraper.fetch_data("4007") == "<html>4007</html>"
+        assert scraper.fetch_data("9999") is None
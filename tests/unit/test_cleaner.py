@@ -216,3 +216,18 @@ def test_duplicate_product_id_deduplicated(setup):
 
     assert len(result) == 1
     assert result[0]["seller_id"] == "seller_A"
+
+
+def test_rejection_reason_before_expansion():
+    """尚未展開的複數選項商品只套用展開後必定成立的規則"""
+    cleaner = DataCleaner()
+    cart = {**BASE_CART}
+    cart["global_settings"] = {**BASE_CART["global_settings"], "global_exclude_seller": ["bad_seller"]}
+    rules = cleaner.load_rules(cart)
+    variant_parent = {**GOOD_ROW, "alt_price": True, "product_name": "多選項商品", "price": 9999}
+
+    assert cleaner.rejection_reason(variant_parent, rules, before_expansion=True) is None
+    assert cleaner.rejection_reason(
+        {**variant_parent, "seller_id": "bad_seller"}, rules, before_expansion=True
+    ) == "seller"
+    assert cleaner.rejection_reason(variant_parent, rules) == "price"
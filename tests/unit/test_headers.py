@@ -0,0 +1,28 @@
+"""
+tests/unit/test_headers.py - HeaderPool unit tests
+"""
+from app.services import headers
+from app.services.headers import HeaderPool
+
+
+class TestHeaderPool:
+    def test_rotates_prebuilt_headers(self, monkeypatch):
+        """標頭在第一次使用時才建立，之後依序輪替同一批 dict"""
+        monkeypatch.setattr(headers, "user_agents", lambda: ["UA-1", "UA-2"])
+        pool = HeaderPool({"Accept": "application/json"})
+
+        first, second, third = pool.next(), pool.next(), pool.next()
+
+        assert first == {"User-Agent": "UA-1", "Accept": "application/json"}
+        assert second["User-Agent"] == "UA-2"
+        assert third is first
+
+    def test_falls_back_to_default_user_agent(self, monkeypatch):
+        """fake_useragent 無法使用時改用預設 User-Agent"""
+        monkeypatch.setattr(headers, "_user_agents", None)
+
+        def broken():
+            raise RuntimeError("no data")
+
+        monkeypatch.setattr("fake_useragent.UserAgent", broken)
+        assert headers.user_agents() == [headers.DEFAULT_USER_AGENT]
@@ -0,0 +1,119 @@
+"""
+tests/unit/test_image_cache.py - ProductImageCache unit tests
+
+Downloads are replaced by a stub that serves generated images, so no
+test touches the network.
+"""
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.services import image_cache
+from app.services.image_cache import ProductImageCache, media_type_for, plan_image_urls
+
+
+def _jpeg(color, size=(600, 400)) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, "JPEG")
+    return output.getvalue()
+
+
+def _image(color, image_format, size=(600, 400)) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", size, color).save(output, image_format)
+    return output.getvalue()
+
+
+@pytest.fixture
+def make_cache(tmp_dir, monkeypatch):
+    def _make(images: dict, **kwargs) -> ProductImageCache:
+        cache = ProductImageCache(str(tmp_dir / "images"), **kwargs)
+        cache.downloads = []
+
+        async def download(session, url):
+            cache.downloads.append(url)
+            return images[url]
+
+        monkeypatch.setattr(cache, "_download", download)
+        return cache
+    return _make
+
+
+class TestImageCache:
+    async def test_same_content_stored_once_with_thumbnail(self, make_cache):
+        """內容相同的圖片只存一份，並預先產生縮圖；已快取的網址不再下載"""
+        red = _jpeg("red")
+        cache = make_cache({"a.jpg": red, "b.jpg": red, "c.jpg": b"not an image"})
+
+        digests = await cache.fetch_many(["a.jpg", "b.jpg", "c.jpg"])
+
+        assert set(digests) == {"a.jpg", "b.jpg"}
+        assert digests["a.jpg"] == digests["b.jpg"]
+        assert len(os.listdir(os.path.join(cache.directory, "full"))) == 1
+        with Image.open(cache.path_for(digests["a.jpg"], thumbnail=True)) as thumb:
+            assert max(thumb.size) <= 160
+
+        await cache.fetch_many(["a.jpg"])
+        assert cache.downloads.count("a.jpg") == 1
+        assert cache.local_urls("a.jpg")[1] == f"/api/images/{digests['a.jpg']}?thumb=true"
+        assert cache.local_urls("c.jpg") == ("c.jpg", "")
+
+    async def test_evicts_least_recently_read(self, make_cache):
+        """超過大小上限時淘汰最久沒被讀取的圖片"""
+        images = {name: _jpeg(name) for name in ("red", "green", "blue")}
+        one_image = len(images["red"]) + 2000
+        cache = make_cache(images, max_bytes=one_image * 2)
+
+        await cache.fetch_many(["red", "green"])
+        cache.path_for(cache.digest_for("red"))
+        await cache.fetch_many(["blue"])
+
+        assert cache.digest_for("green") is None
+        assert cache.digest_for("red") and cache.digest_for("blue")
+
+    async def test_original_keeps_upstream_format(self, make_cache):
+        """PNG / WebP 原圖保留原本的格式與副檔名，其他格式轉成 JPEG；縮圖一律是 JPEG"""
+        png, webp, bmp = _image("red", "PNG"), _image("green", "WEBP"), _jpeg("blue")
+        bmp_output = io.BytesIO()
+        Image.open(io.BytesIO(bmp)).save(bmp_output, "BMP")
+        cache = make_cache({"a.png": png, "b.webp": webp, "c.bmp": bmp_output.getvalue()})
+
+        digests = await cache.fetch_many(["a.png", "b.webp", "c.bmp"])
+
+        png_path = cache.path_for(digests["a.png"])
+        assert png_path.endswith(".png") and media_type_for(png_path) == "image/png"
+        with open(png_path, "rb") as f:
+            assert f.read() == png
+        assert media_type_for(cache.path_for(digests["b.webp"])) == "image/webp"
+        with Image.open(cache.path_for(digests["c.bmp"])) as converted:
+            assert converted.format == "JPEG"
+        assert media_type_for(cache.path_for(digests["a.png"], thumbnail=True)) == "image/jpeg"
+
+    async def test_concurrent_writes_use_separate_tmp_files(self, make_cache, monkeypatch):
+        """同一張圖片同時被下載兩次時，各自寫入不同的暫存檔"""
+        red = _jpeg("red")
+        cache = make_cache({})
+        replaced = []
+        replace = os.replace
+
+        def record_replace(src, dst):
+            replaced.append(src)
+            replace(src, dst)
+
+        monkeypatch.setattr(image_cache.os, "replace", record_replace)
+
+        first, second = await asyncio.gather(cache.store("a.jpg", red), cache.store("b.jpg", red))
+
+        assert first == second
+        assert len(replaced) == len(set(replaced)) == 4
+        assert not [name for name in os.listdir(os.path.join(cache.directory, "full")) if name.endswith(".tmp")]
+
+    def test_plan_image_urls(self):
+        plan = {"sellers": {
+            "s1": {"items": [{"image_url": "a.jpg"}, {"image_url": ""}]},
+            "s2": {"items": [{"image_url": "a.jpg"}, {"image_url": "b.jpg"}]},
+        }}
+        assert plan_image_urls(plan) == ["a.jpg", "b.jpg"]
@@ -0,0 +1,127 @@
+"""
+tests/unit/test_price_watcher.py - PriceWatcher unit tests
+
+RutenScraper.warm is replaced by a stub that records the keywords it was
+asked to refresh, so no test touches the network.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+
+import pytest
+
+from app.services import price_watcher, storage
+from app.services.price_watcher import PriceWatcher
+from app.services.ruten_scraper import RutenScraper
+
+
+def _write_project(data_dir, name, card_numbers, age=0.0):
+    project = data_dir / name
+    project.mkdir()
+    cart_path = project / "cart.json"
+    cart = {"shopping_cart": [
+        {"card_name_zh": f"卡{i}", "target_card_numbers": [number]}
+        for i, number in enumerate(card_numbers)
+    ]}
+    cart_path.write_text(json.dumps(cart), encoding="utf-8")
+    mtime = time.time() - age
+    os.utime(cart_path, (mtime, mtime))
+
+
+@pytest.fixture
+def make_watcher(tmp_dir, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_dir))
+
+    def _make(requests_per_keyword=2, delay=0.0, **kwargs) -> PriceWatcher:
+        scraper = RutenScraper(cache_path=None)
+        scraper.warmed = []
+
+        async def warm(keywords):
+            scraper.stats = Counter(requests_sent=requests_per_keyword)
+            await asyncio.sleep(delay)
+            scraper.warmed.extend(keywords)
+            return scraper.stats
+
+        monkeypatch.setattr(scraper, "warm", warm)
+        return PriceWatcher(scraper=scraper, **kwargs)
+    return _make
+
+
+class TestScheduling:
+    def test_hot_cards_refresh_more_often(self, make_watcher, tmp_dir):
+        """出現在越多近期專案的卡號更新間隔越短，太久沒用的專案不列入"""
+        _write_project(tmp_dir, "p1", ["aaa-001", "BBB-001"])
+        _write_project(tmp_dir, "p2", ["AAA-001"])
+        _write_project(tmp_dir, "old", ["CCC-001"], age=price_watcher.WATCHER_PROJECT_MAX_AGE + 60)
+
+        intervals = make_watcher().collect_intervals()
+
+        assert set(intervals) == {"AAA-001", "BBB-001"}
+        assert intervals["AAA-001"] < intervals["BBB-001"] == price_watcher.WATCHER_BASE_INTERVAL
+
+    async def test_refreshes_due_cards_within_budget(self, make_watcher, tmp_dir):
+        """只更新到期的卡號，請求額度用完就停下"""
+        _write_project(tmp_dir, "p1", ["AAA-001", "BBB-001", "CCC-001"])
+        watcher = make_watcher(requests_per_keyword=3, request_budget=5)
+
+        assert await watcher.refresh_due() == 2
+        assert watcher.remaining_budget() == -1
+        assert await watcher.refresh_due() == 0
+
+        watcher.request_budget = 100
+        assert await watcher.refresh_due() == 1
+        assert sorted(watcher.scraper.warmed) == ["AAA-001", "BBB-001", "CCC-001"]
+        assert await watcher.refresh_due() == 0  # 都還沒到下次更新時間
+
+
+class TestInteractiveRuns:
+    async def test_yields_to_interactive_run(self, make_watcher, tmp_dir):
+        """互動執行開始時取消進行中的更新，結束後才繼續"""
+        _write_project(tmp_dir, "p1", ["AAA-001", "BBB-001"])
+        watcher = make_watcher(delay=0.05)
+
+        refresh = asyncio.create_task(watcher.refresh_due())
+        await asyncio.sleep(0.01)
+        async with watcher.interactive():
+            await asyncio.sleep(0.1)
+            assert watcher.scraper.warmed == []
+
+        assert await refresh == 1
+        assert watcher.stats["preempted"] == 1
+        assert len(watcher.scraper.warmed) == 1
+        assert await watcher.refresh_due() == 1  # 被取消的卡號留到下一次
+
+    async def test_preempted_refresh_returns_host_slots(self, tmp_dir, monkeypatch):
+        """更新在請求途中被搶先時歸還限流器名額，下一次更新沿用同一組主機狀態"""
+        monkeypatch.setattr(storage, "DATA_DIR", str(tmp_dir))
+        _write_project(tmp_dir, "p1", ["AAA-001"])
+        scraper = RutenScraper(cache_path=None)
+        seen = []
+
+        async def request_json(url, params, on_sent=None):
+            limiter = scraper._limiter_for(url)
+            await limiter.acquire()
+            seen.append((limiter, scraper._breaker_for(url)))
+            try:
+                await asyncio.sleep(10 if len(seen) == 1 else 0)
+            finally:
+                await limiter.release(200, 0.01)
+            return {"TotalRows": 0, "Rows": []}
+
+        monkeypatch.setattr(scraper, "_request_json", request_json)
+        watcher = PriceWatcher(scraper=scraper)
+
+        refresh = asyncio.create_task(watcher.refresh_due())
+        await asyncio.sleep(0.01)
+        async with watcher.interactive():
+            pass
+        assert await refresh == 0
+        assert watcher.stats["preempted"] == 1
+
+        assert await watcher.refresh_due() == 1
+        (first_limiter, first_breaker), (limiter, breaker) = seen
+        assert limiter is first_limiter and breaker is first_breaker
+        assert limiter._in_flight == 0
+        assert breaker.state == "closed"
@@ -0,0 +1,109 @@
+"""
+tests/unit/test_rate_limiter.py - AdaptiveRateLimiter unit tests
+"""
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+async def _request(limiter: AdaptiveRateLimiter, status, latency=0.01, retry_after=None):
+    await limiter.acquire()
+    await limiter.release(status, latency, retry_after)
+
+
+class TestAimd:
+    async def test_healthy_responses_increase_additively(self):
+        """回應正常時速率與並行數以固定步幅增加"""
+        limiter = AdaptiveRateLimiter(rate=10.0, concurrency=2.0)
+        for _ in range(5):
+            await _request(limiter, 200)
+
+        assert limiter.rate == pytest.approx(11.0)
+        assert limiter.concurrency == pytest.approx(2.5)
+        assert limiter.increases == 5
+
+    async def test_throttling_halves_rate_once_per_burst(self):
+        """收到 429/5xx 時乘法降速，同一波失敗只降一次"""
+        limiter = AdaptiveRateLimiter(rate=100.0, concurrency=8.0)
+        await _request(limiter, 429)
+        await _request(limiter, 503)
+
+        assert limiter.rate == 50.0
+        assert limiter.concurrency == 4.0
+        assert limiter.decreases == 1
+        assert limiter.throttled == 1
+
+    async def test_sustained_latency_rise_counts_as_congestion(self):
+        """近期延遲持續明顯高於基準時降速"""
+        limiter = AdaptiveRateLimiter(rate=100.0)
+        for _ in range(5):
+            await _request(limiter, 200, latency=0.01)
+        for _ in range(3):
+            await _request(limiter, 200, latency=1.0)
+
+        assert limiter.decreases == 1
+
+    async def test_single_latency_outlier_ignored(self):
+        """單一延遲離群值不會觸發降速"""
+        limiter = AdaptiveRateLimiter(rate=100.0)
+        for _ in range(5):
+            await _request(limiter, 200, latency=0.01)
+        await _request(limiter, 200, latency=5.0)
+        for _ in range(3):
+            await _request(limiter, 200, latency=0.01)
+
+        assert limiter.decreases == 0
+
+    async def test_retry_after_blocks_next_request(self):
+        """Retry-After 期間不會送出下一個請求"""
+        limiter = AdaptiveRateLimiter(rate=1000.0)
+        await _request(limiter, 429, retry_after=0.1)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire()
+        await limiter.release(200, 0.01)
+
+        assert loop.time() - started >= 0.09
+
+    async def test_concurrency_limit_enforced(self):
+        """同時在途的請求數不超過 int(concurrency)"""
+        limiter = AdaptiveRateLimiter(rate=1000.0, concurrency=2.0, max_concurrency=2.0)
+        in_flight = max_in_flight = 0
+
+        async def worker():
+            nonlocal in_flight, max_in_flight
+            await limiter.acquire()
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            await limiter.release(200, 0.01)
+
+        await asyncio.gather(*(worker() for _ in range(6)))
+
+        assert max_in_flight == 2
+
+
+    async def test_cancelled_acquire_returns_slot(self):
+        """等待速率時被取消，並行名額會歸還"""
+        limiter = AdaptiveRateLimiter(rate=1.0, concurrency=1.0, max_concurrency=1.0)
+        await _request(limiter, 200)
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter._in_flight == 0
+
+
+def test_parse_retry_after():
+    """Retry-After 支援秒數與 HTTP 日期格式"""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,143 @@
+"""
+tests/unit/test_resilience.py - 重試、退避與斷路器 unit tests
+"""
+import asyncio
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from app.services import resilience
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgeBudget,
+    LatencyTracker,
+    RetryBudget,
+    backoff_delay,
+    is_transient_error,
+)
+
+
+def _http_error(status: int) -> aiohttp.ClientResponseError:
+    url = URL("https://rtapi.ruten.com.tw/api/search/v3/index.php/core/prod")
+    request_info = aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()), url)
+    return aiohttp.ClientResponseError(request_info=request_info, history=(), status=status)
+
+
+def test_error_classification():
+    """逾時、連線失敗、429、5xx 是暫時性錯誤；其他 4xx 與 JSON 錯誤是永久性"""
+    assert is_transient_error(asyncio.TimeoutError())
+    assert is_transient_error(aiohttp.ServerDisconnectedError())
+    assert is_transient_error(_http_error(429))
+    assert is_transient_error(_http_error(503))
+    assert not is_transient_error(_http_error(404))
+    assert not is_transient_error(
+        aiohttp.ContentTypeError(request_info=_http_error(200).request_info, history=(), status=200)
+    )
+    assert not is_transient_error(ValueError("bad json"))
+
+
+def test_backoff_is_jittered_and_capped():
+    """退避秒數在 [0, min(cap, base * 2^attempt)] 之間"""
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=0.5, cap=4.0)
+        assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def test_retry_budget_scales_with_requests():
+    """重試額度 = 最低額度 + 請求數 × 比例"""
+    budget = RetryBudget(min_retries=1, ratio=0.5)
+    budget.record_request()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    for _ in range(4):
+        budget.record_request()
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        """連續失敗達門檻後開啟，成功會重置計數"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+        assert breaker.rejections == 1
+
+    def test_half_open_allows_single_probe(self, monkeypatch):
+        """冷卻時間過後只放行一個試探請求，成功即恢復"""
+        now = [1000.0]
+        monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+
+        now[0] += 31
+        breaker.before_request()
+        assert breaker.state == "half-open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        breaker.before_request()
+
+    def test_failed_probe_reopens(self, monkeypatch):
+        """試探請求失敗時重新開啟"""
+        now = [1000.0]
+        monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        now[0] += 31
+        breaker.before_request()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.times_opened == 2
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+    def test_released_probe_allows_next_probe(self, monkeypatch):
+        """試探請求被取消後，下一個請求可以再試探"""
+        now = [1000.0]
+        monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        now[0] += 31
+        breaker.before_request()
+        breaker.release_probe()
+
+        assert breaker.state == "half-open"
+        breaker.before_request()
+
+
+def test_latency_tracker_percentile():
+    """樣本不足時不送備援，足夠後回傳指定百分位的延遲"""
+    tracker = LatencyTracker(percentile=0.9, min_samples=10)
+    for latency in range(1, 10):
+        tracker.observe(latency / 100)
+    assert tracker.threshold() is None
+
+    tracker.observe(0.10)
+    assert tracker.threshold() == pytest.approx(0.09)
+
+
+def test_hedge_budget_ratio():
+    """備援請求數不超過一般請求數 × 比例"""
+    budget = HedgeBudget(max_ratio=0.1)
+    for _ in range(9):
+        budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+    assert not budget.try_spend()
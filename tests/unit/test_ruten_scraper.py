@@ -0,0 +1,1031 @@
+"""
+tests/unit/test_ruten_scraper.py - RutenScraper unit tests
+
+The Ruten HTTP layer is replaced by FakeRutenApi, which answers the
+search / prod / items endpoints from an in-memory catalog, so no test
+touches the network.
+"""
+import asyncio
+import csv
+import json
+import sqlite3
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from app.services import ruten_scraper
+from app.services.ruten_scraper import (
+    CSV_COLUMNS,
+    ITEMS_PER_PAGE,
+    RutenCsvWriter,
+    RutenResponseCache,
+    RutenScraper,
+)
+
+
+def _product(prod_id, name, seller="seller_A", price=100, stock=5, price_range=None):
+    return {
+        "ProdId": prod_id,
+        "ProdName": name,
+        "SellerId": seller,
+        "PriceRange": price_range or [price, price],
+        "StockQty": stock,
+        "SoldQty": 0,
+        "ShippingCost": 60,
+        "PostTime": "2024-01-01 00:00:00",
+        "Image": f"https://gcs.rimg.com.tw/{prod_id}.jpg",
+    }
+
+
+def _endpoint(url: str) -> str:
+    if url.endswith("/core/prod"):
+        return "search"
+    if url.endswith("/items/v2/list"):
+        return "items"
+    return "detail"
+
+
+class FakeRutenApi:
+    """In-memory stand-in for the three Ruten endpoints the scraper calls."""
+
+    def __init__(
+        self, catalog: dict, specs: dict | None = None, delay: float = 0.0,
+        failures: dict | None = None, delays: dict | None = None,
+    ):
+        self.catalog = catalog          # keyword -> [raw prod/v2 product]
+        self.specs = specs or {}        # product id -> spec_info.specs
+        self.delay = delay
+        self.failures = failures or {}  # endpoint -> [exception to raise on each call]
+        self.delays = delays or {}      # endpoint -> [delay for each call], then self.delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.active = []                # endpoints currently being served
+        self.overlaps = set()           # (new endpoint, already in-flight endpoint)
+        self._by_id = {
+            p["ProdId"]: p for products in catalog.values() for p in products
+        }
+
+    async def get_json(self, url: str, params: dict, on_sent=None):
+        if on_sent is not None:
+            on_sent()
+        self.calls.append((url, dict(params)))
+        endpoint = _endpoint(url)
+        self.overlaps.update((endpoint, other) for other in self.active)
+        self.active.append(endpoint)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delays = self.delays.get(endpoint)
+            await asyncio.sleep(delays.pop(0) if delays else self.delay)
+            if self.failures.get(endpoint):
+                raise self.failures[endpoint].pop(0)
+            if url.endswith("/core/prod"):
+                products = self.catalog.get(params["q"], [])
+                start = params["offset"] - 1
+                rows = products[start:start + params["limit"]]
+                return {"TotalRows": len(products), "Rows": [{"Id": p["ProdId"]} for p in rows]}
+            if url.endswith("/prod"):
+                return [self._by_id[i] for i in params["id"].split(",")]
+            if url.endswith("/items/v2/list"):
+                specs = self.specs.get(params["gno"])
+                return {"data": [{"spec_info": {"specs": specs}}] if specs else []}
+            raise AssertionError(f"unexpected url {url}")
+        finally:
+            self.in_flight -= 1
+            self.active.remove(endpoint)
+
+    def count(self, suffix: str) -> int:
+        return sum(1 for url, _ in self.calls if url.endswith(suffix))
+
+
+def _http_error(status: int) -> aiohttp.ClientResponseError:
+    url = URL("https://rtapi.ruten.com.tw/api/search/v3/index.php/core/prod")
+    request_info = aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()), url)
+    return aiohttp.ClientResponseError(request_info=request_info, history=(), status=status)
+
+
+def _write_cart(path, shopping_cart, **settings):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"shopping_cart": shopping_cart, **settings}, f, ensure_ascii=False)
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def make_scraper(monkeypatch):
+    def _make(api: FakeRutenApi, **kwargs) -> RutenScraper:
+        kwargs.setdefault("cache_path", None)
+        scraper = RutenScraper(**kwargs)
+        monkeypatch.setattr(scraper, "_request_json", api.get_json)
+        return scraper
+    return _make
+
+
+class TestRun:
+    async def test_results_tagged_in_cart_order(self, make_scraper, tmp_dir):
+        """每張卡號的結果標記正確的 search_card_name，輸出順序與購物車一致"""
+        api = FakeRutenApi(
+            {
+                "AAA-001": [_product("1", "AAA-001 卡A")],
+                "BBB-001": [_product("2", "BBB-001 卡B")],
+                "BBB-002": [_product("3", "BBB-002 卡B")],
+            },
+            delay=0.01,
+        )
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]},
+            {"card_name_zh": "卡B", "target_card_numbers": [
+                {"card_number": "BBB-001"}, "BBB-002",
+            ]},
+        ])
+        output = tmp_dir / "out" / "ruten_data.csv"
+
+        await make_scraper(api).run(str(cart_path), str(output))
+        rows = _read_csv(output)
+
+        assert [r["product_id"] for r in rows] == ["1", "2", "3"]
+        assert [r["search_card_name"] for r in rows] == ["卡A", "卡B", "卡B"]
+
+    async def test_card_numbers_scraped_concurrently(self, make_scraper, tmp_dir):
+        """多個卡號會同時搜尋，且不超過設定的並行上限"""
+        catalog = {f"CARD-{i:03d}": [_product(str(i), f"CARD-{i:03d}")] for i in range(6)}
+        api = FakeRutenApi(catalog, delay=0.02)
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": f"卡{i}", "target_card_numbers": [kw]}
+            for i, kw in enumerate(catalog)
+        ])
+
+        await make_scraper(api, max_concurrency=3).run(
+            str(cart_path), str(tmp_dir / "ruten_data.csv")
+        )
+
+        assert 1 < api.max_in_flight <= 3
+
+    async def test_empty_result_writes_csv(self, make_scraper, tmp_dir):
+        """沒有任何商品時仍會建立 CSV 檔"""
+        api = FakeRutenApi({})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["NONE-001"]}])
+        output = tmp_dir / "ruten_data.csv"
+
+        await make_scraper(api).run(str(cart_path), str(output))
+
+        assert output.read_bytes() == b"\xef\xbb\xbf\n"
+        assert not (tmp_dir / "ruten_data.csv.tmp").exists()
+
+    async def test_connection_pool_admits_limiter_concurrency(self):
+        """連線池不低於限流器的並行數上限，超時不含等待連線池的時間"""
+        scraper = RutenScraper(cache_path=None)
+        session = await scraper._open_session()
+        try:
+            assert session.connector.limit_per_host >= ruten_scraper.AdaptiveRateLimiter().max_concurrency
+            assert session.timeout.total is None
+            assert session.timeout.sock_read == session.timeout.sock_connect == ruten_scraper.DEFAULT_TIMEOUT
+        finally:
+            await scraper.close()
+
+
+class TestCsvWriter:
+    def test_fixed_columns_with_search_card_name_first(self, tmp_dir):
+        """欄位順序固定，search_card_name 在第一欄，且不修改傳入的資料"""
+        output = tmp_dir / "ruten_data.csv"
+        product = RutenScraper(cache_path=None)._extract_product_data(_product("1", "AAA-001"))
+        writer = RutenCsvWriter(str(output))
+        writer.write_rows([product], search_card_name="卡A")
+        writer.commit()
+
+        with open(output, encoding="utf-8-sig") as f:
+            header = next(csv.reader(f))
+        assert header == CSV_COLUMNS
+        assert _read_csv(output)[0]["search_card_name"] == "卡A"
+        assert "search_card_name" not in product
+
+    def test_abort_keeps_previous_output(self, tmp_dir):
+        """中途放棄時保留原本的檔案，也不留下暫存檔"""
+        output = tmp_dir / "ruten_data.csv"
+        output.write_text("old", encoding="utf-8")
+        writer = RutenCsvWriter(str(output))
+        writer.write_rows([{"product_id": "1"}], search_card_name="卡A")
+        writer.abort()
+
+        assert output.read_text(encoding="utf-8") == "old"
+        assert not (tmp_dir / "ruten_data.csv.tmp").exists()
+
+
+class TestKeywordDedup:
+    async def test_duplicate_card_numbers_scraped_once(self, make_scraper, tmp_dir):
+        """同一卡號出現多次只爬一次，每張卡片各自得到標記好的副本"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡")]})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": "卡A", "target_card_numbers": ["AAA-001", "aaa-001 "]},
+            {"card_name_zh": "卡B", "target_card_numbers": [{"card_number": "AAA-001"}]},
+        ])
+        output = tmp_dir / "ruten_data.csv"
+        scraper = make_scraper(api)
+
+        await scraper.run(str(cart_path), str(output))
+        rows = _read_csv(output)
+
+        assert api.count("/core/prod") == 1
+        assert [(r["search_card_name"], r["product_id"]) for r in rows] == [
+            ("卡A", "1"), ("卡B", "1"),
+        ]
+        assert scraper.stats["deduplicated_keywords"] == 2
+
+    async def test_overlapping_runs_share_in_flight_scrape(self, make_scraper, tmp_dir):
+        """兩個同時進行的 run 爬同一個卡號時共用同一次請求"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡")]}, delay=0.05)
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        first, second = make_scraper(api), make_scraper(api)
+
+        await asyncio.gather(
+            first.run(str(cart_path), str(tmp_dir / "a.csv")),
+            second.run(str(cart_path), str(tmp_dir / "b.csv")),
+        )
+
+        assert api.count("/core/prod") == 1
+        assert first.stats["coalesced_keywords"] + second.stats["coalesced_keywords"] == 1
+        assert _read_csv(tmp_dir / "a.csv") == _read_csv(tmp_dir / "b.csv")
+
+
+class TestPagination:
+    async def test_walks_pages_until_short_page(self, make_scraper):
+        """商品數超過一頁時會繼續翻頁，直到最後一頁不滿為止"""
+        products = [_product(str(i), f"AAA-001 #{i}") for i in range(ITEMS_PER_PAGE + 5)]
+        api = FakeRutenApi({"AAA-001": products})
+        scraper = make_scraper(api)
+
+        result = await scraper._process_products_async("AAA-001", max_pages=5)
+
+        assert len(result) == ITEMS_PER_PAGE + 5
+        assert api.count("/core/prod") == 2
+
+    async def test_prefetch_respects_max_pages_and_offset_order(self, make_scraper):
+        """依 TotalRows 並行預抓其餘頁面，不超過 max_pages，並依 offset 順序合併"""
+        products = [_product(str(i), f"AAA-001 #{i}") for i in range(ITEMS_PER_PAGE * 4)]
+        api = FakeRutenApi({"AAA-001": products}, delay=0.01)
+        scraper = make_scraper(api)
+
+        result = await scraper._process_products_async("AAA-001", max_pages=3)
+
+        offsets = [params["offset"] for url, params in api.calls if url.endswith("/core/prod")]
+        assert sorted(offsets) == [1, ITEMS_PER_PAGE + 1, ITEMS_PER_PAGE * 2 + 1]
+        assert [r["product_id"] for r in result] == [str(i) for i in range(ITEMS_PER_PAGE * 3)]
+
+    async def test_next_search_overlaps_current_details(self, make_scraper):
+        """下一頁的搜尋與目前頁面的詳情查詢同時進行"""
+        products = [_product(str(i), f"AAA-001 #{i}") for i in range(ITEMS_PER_PAGE * 3)]
+        api = FakeRutenApi({"AAA-001": products}, delay=0.02)
+        scraper = make_scraper(api)
+
+        result = await scraper._process_products_async("AAA-001", max_pages=5)
+
+        assert len(result) == ITEMS_PER_PAGE * 3
+        assert api.overlaps & {("search", "detail"), ("detail", "search")}
+
+    async def test_failed_stage_cancels_prefetched_searches(self, make_scraper, monkeypatch):
+        """詳情階段出錯時，預抓中的後續頁面搜尋會被取消"""
+        products = [_product(str(i), f"AAA-001 #{i}") for i in range(ITEMS_PER_PAGE * 3)]
+        api = FakeRutenApi({"AAA-001": products}, delays={"search": [0, 10, 10]})
+        scraper = make_scraper(api)
+
+        async def broken_fetch(*args):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(scraper, "_fetch_page_products_async", broken_fetch)
+        result = await scraper._process_products_async("AAA-001", max_pages=5)
+        await asyncio.sleep(0)
+
+        assert result == []
+        assert api.in_flight == 0
+
+
+class TestExtraction:
+    def test_batch_keeps_order_and_skips_bad_rows(self):
+        """整批轉換保持原始順序，無法解析的商品被略過"""
+        scraper = RutenScraper(cache_path=None)
+        raw = [_product(str(i), f"AAA-001 #{i}") for i in range(50)]
+        raw[10]["StockQty"] = None
+
+        result = scraper._extract_products_batch(raw)
+
+        assert [r["product_id"] for r in result] == [str(i) for i in range(50) if i != 10]
+        assert result[0] == {
+            "product_id": "0",
+            "product_name": "AAA-001 #0",
+            "seller_id": "seller_A",
+            "price": 100,
+            "alt_price": False,
+            "stock_qty": 5,
+            "shipping_cost": 60,
+            "post_time": "2024-01-01 00:00:00",
+            "image_url": "https://gcs.rimg.com.tw/0.jpg",
+        }
+
+    def test_alt_price_detected_from_price_range(self):
+        """PriceRange 首尾不同時標記 alt_price，價格取第一個值"""
+        scraper = RutenScraper(cache_path=None)
+        product = scraper._extract_product_data(_product("1", "x", price_range=[80, 300]))
+        assert product["alt_price"] is True
+        assert product["price"] == 80
+
+
+class TestDemandAwarePagination:
+    async def test_stops_once_demand_is_covered(self, make_scraper):
+        """需求導向模式：依價格排序，涵蓋需求量後停止翻頁並記錄停止位置"""
+        products = [
+            _product(str(i), f"AAA-001 #{i}", seller=f"s{i % 4}", stock=1)
+            for i in range(ITEMS_PER_PAGE * 5)
+        ]
+        api = FakeRutenApi({"AAA-001": products})
+        scraper = make_scraper(api, demand_aware=True)
+
+        result = await scraper._process_products_async("AAA-001", max_pages=5, required_amount=3)
+
+        searches = [params for url, params in api.calls if url.endswith("/core/prod")]
+        assert all(params["sort"] == "prc/ac" for params in searches)
+        assert len(result) == ITEMS_PER_PAGE
+        assert scraper.early_stops["AAA-001"] == (1, 5)
+        assert len(searches) <= 2
+        assert api.count("/prod") - len(searches) <= 2
+
+    async def test_keeps_paging_when_listings_do_not_match(self, make_scraper):
+        """商品名稱不符合卡號時不算入需求量，會繼續翻頁"""
+        products = [
+            _product(str(i), f"其他商品 #{i}", seller=f"s{i % 4}") for i in range(ITEMS_PER_PAGE * 2)
+        ]
+        api = FakeRutenApi({"AAA-001": products})
+        scraper = make_scraper(api, demand_aware=True)
+
+        result = await scraper._process_products_async("AAA-001", max_pages=5, required_amount=1)
+
+        assert len(result) == ITEMS_PER_PAGE * 2
+        assert "AAA-001" not in scraper.early_stops
+
+    async def test_stock_dropped_by_cleaner_not_counted(self, make_scraper, tmp_dir):
+        """黑名單賣家的庫存清洗後會被排除，不算入需求量（未開啟 prefilter 也一樣）"""
+        products = [
+            _product(str(i), f"AAA-001 #{i}", seller=f"{'bad' if i < ITEMS_PER_PAGE else 's'}{i % 4}")
+            for i in range(ITEMS_PER_PAGE * 3)
+        ]
+        api = FakeRutenApi({"AAA-001": products})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(
+            cart_path,
+            [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"], "required_amount": 1}],
+            cart_settings={"exclude_seller": [f"bad{i}" for i in range(4)]},
+        )
+        scraper = make_scraper(api, demand_aware=True)
+
+        await scraper.run(str(cart_path), str(tmp_dir / "ruten_data.csv"))
+
+        assert scraper.early_stops["AAA-001"] == (2, 3)
+        assert len(_read_csv(tmp_dir / "ruten_data.csv")) == ITEMS_PER_PAGE * 2
+
+
+class TestPrefilter:
+    async def test_rejected_rows_skip_variant_expansion(self, make_scraper, tmp_dir):
+        """一定會被清洗掉的商品不展開選項，也不寫入結果"""
+        products = [
+            _product("1", "AAA-001 黑名單多選項", seller="bad", price_range=[100, 300]),
+            _product("2", "AAA-001 卡套", price_range=[100, 300]),
+            _product("3", "AAA-001 正常"),
+            _product("4", "不相關商品"),
+            _product("5", "多選項（卡號在選項裡）", price_range=[100, 300]),
+        ]
+        api = FakeRutenApi({"AAA-001": products})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(
+            cart_path,
+            [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}],
+            global_settings={"global_exclude_seller": ["bad"]},
+            cart_settings={"exclude_keywords": ["卡套"]},
+        )
+        output = tmp_dir / "ruten_data.csv"
+        scraper = make_scraper(api, prefilter=True)
+
+        await scraper.run(str(cart_path), str(output))
+
+        items_calls = [params["gno"] for url, params in api.calls if url.endswith("/items/v2/list")]
+        assert items_calls == ["5"]
+        assert [r["product_id"] for r in _read_csv(output)] == ["3", "5"]
+        assert scraper.stats["prefilter_dropped"] == 3
+        assert scraper.stats["prefilter_requests_saved"] == 2
+
+    async def test_overlapping_runs_with_different_rules_share_scrape(self, make_scraper, tmp_dir):
+        """不同過濾規則的 run 同時爬同一個卡號時共用一次搜尋，各自依規則過濾"""
+        specs = {
+            "a": {"spec_name": "普", "spec_price": 100, "spec_num": 1, "spec_status": "Y"},
+            "b": {"spec_name": "亮", "spec_price": 300, "spec_num": 1, "spec_status": "Y"},
+        }
+        api = FakeRutenApi(
+            {"AAA-001": [
+                _product("1", "AAA-001 多選項", seller="bad", price_range=[100, 300]),
+                _product("2", "AAA-001 正常"),
+            ]},
+            specs={"1": specs}, delay=0.05,
+        )
+        strict_cart, loose_cart = tmp_dir / "strict.json", tmp_dir / "loose.json"
+        _write_cart(strict_cart, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}],
+                    cart_settings={"exclude_seller": ["bad"]})
+        _write_cart(loose_cart, [{"card_name_zh": "卡甲", "target_card_numbers": ["AAA-001"]}])
+        strict, loose = make_scraper(api, prefilter=True), make_scraper(api, prefilter=True)
+
+        await asyncio.gather(
+            strict.run(str(strict_cart), str(tmp_dir / "strict.csv")),
+            loose.run(str(loose_cart), str(tmp_dir / "loose.csv")),
+        )
+
+        assert api.count("/core/prod") == 1
+        assert api.count("/items/v2/list") == 1
+        assert strict.stats["coalesced_keywords"] + loose.stats["coalesced_keywords"] == 1
+        assert [r["product_id"] for r in _read_csv(tmp_dir / "strict.csv")] == ["2"]
+        assert [r["product_id"] for r in _read_csv(tmp_dir / "loose.csv")] == ["1_a", "1_b", "2"]
+        assert strict.stats["prefilter_requests_saved"] == 1
+
+
+class TestVariantExpansion:
+    async def test_alt_price_products_expanded_in_order(self, make_scraper):
+        """複數選項商品並行展開，輸出順序與原始頁面一致"""
+        products = [
+            _product("1", "AAA-001 多選項", price_range=[100, 300]),
+            _product("2", "AAA-001 單一"),
+            _product("3", "AAA-001 多選項2", price_range=[50, 80]),
+        ]
+        specs = {
+            "1": {"a": {"spec_name": "UR", "spec_price": 300, "spec_num": 1, "spec_status": "Y"},
+                  "b": {"spec_name": "R", "spec_price": 100, "spec_num": 2, "spec_status": "Y"}},
+            "3": {"c": {"spec_name": "SE", "spec_price": 80, "spec_num": 1, "spec_status": "Y"}},
+        }
+        api = FakeRutenApi({"AAA-001": products}, specs=specs, delay=0.01)
+        scraper = make_scraper(api)
+        page = [scraper._extract_product_data(p) for p in products]
+
+        result = await scraper._expand_page_variants(page)
+
+        assert [r["product_id"] for r in result] == ["1_a", "1_b", "2", "3_c"]
+        assert all(r["alt_price"] is False for r in result)
+        assert api.max_in_flight == 2
+
+    async def test_failed_expansion_keeps_original_row(self, make_scraper):
+        """選項查詢沒有資料時保留原始資料列"""
+        products = [_product("1", "AAA-001 多選項", price_range=[100, 300])]
+        api = FakeRutenApi({"AAA-001": products})
+        scraper = make_scraper(api)
+        page = [scraper._extract_product_data(p) for p in products]
+
+        result = await scraper._expand_page_variants(page)
+
+        assert len(result) == 1
+        assert result[0]["product_id"] == "1"
+        assert result[0]["alt_price"] is True
+
+
+class TestRetry:
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        monkeypatch.setattr(ruten_scraper, "backoff_delay", lambda attempt: 0)
+
+    async def test_transient_errors_retried(self, make_scraper):
+        """逾時與 5xx 會重試，成功後不會遺失該頁資料"""
+        api = FakeRutenApi(
+            {"AAA-001": [_product("1", "AAA-001 卡")]},
+            failures={"search": [asyncio.TimeoutError()], "detail": [_http_error(503)]},
+        )
+        scraper = make_scraper(api)
+
+        result = await scraper._process_products_async("AAA-001")
+
+        assert [r["product_id"] for r in result] == ["1"]
+        assert scraper.stats["retries"] == 2
+        assert scraper.stats["retries_search"] == 1
+        assert scraper.stats["retries_detail"] == 1
+
+    async def test_permanent_errors_not_retried(self, make_scraper):
+        """404 等永久性錯誤不重試"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡")]},
+                           failures={"search": [_http_error(404)]})
+        scraper = make_scraper(api)
+
+        result = await scraper._process_products_async("AAA-001")
+
+        assert result == []
+        assert api.count("/core/prod") == 1
+        assert scraper.stats["retries"] == 0
+        assert scraper.stats["permanent_errors"] == 1
+
+    async def test_circuit_opens_while_host_is_down(self, make_scraper):
+        """主機連續失敗後斷路器開啟，之後的請求直接失敗不再送出"""
+        api = FakeRutenApi({}, failures={"search": [_http_error(502) for _ in range(50)]})
+        scraper = make_scraper(api)
+
+        for keyword in ("AAA-001", "BBB-001", "CCC-001"):
+            assert await scraper._process_products_async(keyword) == []
+
+        assert api.count("/core/prod") == ruten_scraper.CircuitBreaker().failure_threshold
+        assert scraper.stats["circuit_open_rejections"] >= 1
+
+    async def test_cancelled_probe_does_not_block_host(self, make_scraper, monkeypatch):
+        """半開狀態的試探請求被取消後，之後的請求仍能送出"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡")]}, delays={"search": [10]})
+        scraper = make_scraper(api)
+        breaker = scraper._breaker_for(ruten_scraper.BASE_URL)
+        monkeypatch.setattr(breaker, "reset_timeout", 0)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        probe = asyncio.create_task(scraper._process_products_async("AAA-001"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        result = await scraper._process_products_async("AAA-001")
+        assert [r["product_id"] for r in result] == ["1"]
+
+    async def test_host_state_shared_between_scrapers(self, make_scraper):
+        """各主機的限流器與斷路器在行程內共用：上一個 run 開啟的斷路器，下一個 run 一樣生效"""
+        api = FakeRutenApi({}, failures={"search": [_http_error(502) for _ in range(50)]})
+        first, second = make_scraper(api), make_scraper(api)
+        threshold = ruten_scraper.CircuitBreaker().failure_threshold
+        for keyword in ("AAA-001", "BBB-001"):
+            await first._process_products_async(keyword)
+        assert api.count("/core/prod") == threshold
+
+        assert await second._process_products_async("CCC-001") == []
+        assert api.count("/core/prod") == threshold
+        url = ruten_scraper.BASE_URL
+        assert second._limiter_for(url) is first._limiter_for(url)
+        # 計數只算各自 run 期間增加的部分
+        host = ruten_scraper.urlsplit(url).netloc
+        assert first.host_snapshots()[host]["breaker"]["times_opened"] == 1
+        assert second.host_snapshots()[host]["breaker"]["times_opened"] == 0
+        assert second.host_snapshots()[host]["breaker"]["state"] == "open"
+
+
+class TestHedging:
+    DETAIL_URL = f"{ruten_scraper.BASE_URL}/prod"
+
+    def _warm_up(self, scraper, endpoint="detail", latency=0.01):
+        tracker = scraper._latency_tracker(endpoint)
+        for _ in range(tracker.min_samples):
+            tracker.observe(latency)
+
+    async def test_slow_request_hedged(self, make_scraper):
+        """請求超過延遲百分位仍未回應時送出備援，先回應的為準"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001")]}, delays={"detail": [0.4]})
+        scraper = make_scraper(api, hedge=True)
+        self._warm_up(scraper)
+        for _ in range(20):
+            scraper._hedge_budget.record_request()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await scraper._get_json("detail", self.DETAIL_URL, {"id": "1"})
+
+        assert result[0]["ProdId"] == "1"
+        assert loop.time() - started < 0.2
+        assert api.count("/prod") == 2
+        assert scraper.stats["hedges_sent"] == 1
+        assert scraper.stats["hedges_won"] == 1
+
+        await asyncio.sleep(0.45)
+        assert not scraper._hedge_losers
+        assert scraper.stats["hedge_latency_saved_ms"] >= 300
+
+    async def test_hedge_rate_capped(self, make_scraper, monkeypatch):
+        """備援請求數不超過一般請求數的比例上限"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001")]}, delay=0.05)
+        scraper = make_scraper(api, hedge=True)
+        monkeypatch.setattr(scraper._latency_tracker("detail"), "threshold", lambda: 0.01)
+
+        for _ in range(20):
+            await scraper._get_json("detail", self.DETAIL_URL, {"id": "1"})
+        await scraper.close()
+
+        assert scraper.stats["hedges_sent"] == 2
+        assert scraper.stats["hedges_skipped"] == 18
+        assert api.count("/prod") == 22
+        assert scraper.stats["requests_sent"] == 22
+
+    async def test_limiter_wait_not_counted_as_latency(self, make_scraper, monkeypatch):
+        """在限流器排隊的時間不算延遲，不會因此送出備援"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001")]})
+        scraper = make_scraper(api, hedge=True)
+        self._warm_up(scraper)
+        for _ in range(20):
+            scraper._hedge_budget.record_request()
+
+        async def queued_request(url, params, on_sent=None):
+            await asyncio.sleep(0.2)  # 等限流器放行
+            return await api.get_json(url, params, on_sent)
+
+        monkeypatch.setattr(scraper, "_request_json", queued_request)
+        await scraper._get_json("detail", self.DETAIL_URL, {"id": "1"})
+
+        assert scraper.stats["hedges_sent"] == 0
+        assert api.count("/prod") == 1
+        assert max(scraper._latency_tracker("detail")._samples) < 0.1
+
+    async def test_search_not_hedged(self, make_scraper):
+        """搜尋請求不送備援"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001")]}, delays={"search": [0.2]})
+        scraper = make_scraper(api, hedge=True)
+        self._warm_up(scraper, "search")
+        for _ in range(20):
+            scraper._hedge_budget.record_request()
+
+        await scraper._process_products_async("AAA-001")
+
+        assert api.count("/core/prod") == 1
+        assert scraper.stats["hedges_sent"] == 0
+
+
+class TestCheckpoints:
+    def _cart(self, tmp_dir, count):
+        catalog = {f"CARD-{i:03d}": [_product(str(i), f"CARD-{i:03d}")] for i in range(count)}
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": f"卡{i}", "target_card_numbers": [kw]}
+            for i, kw in enumerate(catalog)
+        ])
+        return catalog, cart_path
+
+    async def test_resume_skips_finished_keywords(self, make_scraper, tmp_dir):
+        """中斷後以 resume 重跑，只爬還沒完成的卡號"""
+        catalog, cart_path = self._cart(tmp_dir, 6)
+        output = tmp_dir / "ruten_data.csv"
+        api = FakeRutenApi(catalog)
+        scraper = make_scraper(api, max_concurrency=1)
+        original = scraper._scrape_keyword
+        calls = []
+
+        async def interrupted(keyword, request, semaphore):
+            calls.append(keyword)
+            if len(calls) == 5:
+                raise asyncio.CancelledError()  # 模擬第 5 個卡號時伺服器中斷
+            return await original(keyword, request, semaphore)
+
+        scraper._scrape_keyword = interrupted
+        with pytest.raises(asyncio.CancelledError):
+            await scraper.run(str(cart_path), str(output))
+        assert not output.exists()
+        assert len(list((tmp_dir / "checkpoints").glob("*.json"))) == 4
+
+        api = FakeRutenApi(catalog)
+        scraper = make_scraper(api)
+        await scraper.run(str(cart_path), str(output), resume=True)
+
+        assert api.count("/core/prod") == 2
+        assert scraper.stats["resumed_keywords"] == 4
+        assert [r["product_id"] for r in _read_csv(output)] == [str(i) for i in range(6)]
+
+    async def test_stale_or_different_checkpoints_ignored(self, make_scraper, tmp_dir, monkeypatch):
+        """過期或爬取條件不同的檢查點不會被沿用；沒有 resume 時一律重爬"""
+        catalog, cart_path = self._cart(tmp_dir, 2)
+        output = tmp_dir / "ruten_data.csv"
+        await make_scraper(FakeRutenApi(catalog)).run(str(cart_path), str(output))
+
+        api = FakeRutenApi(catalog)
+        await make_scraper(api).run(str(cart_path), str(output))
+        assert api.count("/core/prod") == 2
+
+        api = FakeRutenApi(catalog)
+        await make_scraper(api, demand_aware=True).run(str(cart_path), str(output), resume=True)
+        assert api.count("/core/prod") == 2
+
+        api = FakeRutenApi(catalog)
+        await make_scraper(api, demand_aware=True).run(str(cart_path), str(output), resume=True)
+        assert api.count("/core/prod") == 0
+
+        monkeypatch.setattr(ruten_scraper, "CHECKPOINT_MAX_AGE", -1)
+        api = FakeRutenApi(catalog)
+        await make_scraper(api, demand_aware=True).run(str(cart_path), str(output), resume=True)
+        assert api.count("/core/prod") == 2
+
+
+class TestVariantCache:
+    async def test_unchanged_products_read_from_cache(self, make_scraper, tmp_dir):
+        """價格區間與庫存沒變的商品直接使用快取的選項；有變動時重新查詢（不讀回應快取）"""
+        raw = _product("1", "AAA-001 多選項", price_range=[100, 300])
+        specs = {"1": {"a": {"spec_name": "UR", "spec_price": 300, "spec_num": 1, "spec_status": "Y"}}}
+        api = FakeRutenApi({"AAA-001": [raw]}, specs=specs)
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"))
+        page = [scraper._extract_product_data(raw)]
+        signatures = {"1": scraper._variant_signature(raw)}
+
+        first = await scraper._expand_page_variants(page, signatures)
+        second = await scraper._expand_page_variants(page, signatures)
+
+        assert first == second
+        assert [r["product_id"] for r in second] == ["1_a"]
+        assert api.count("/items/v2/list") == 1
+        assert scraper.stats["variant_cache_hits"] == 1
+
+        raw["StockQty"] = 4
+        await scraper._expand_page_variants(page, {"1": scraper._variant_signature(raw)})
+        assert api.count("/items/v2/list") == 2
+
+    def test_expired_variants_ignored(self, tmp_dir, monkeypatch):
+        """超過 TTL 的選項快取不會被讀取"""
+        cache = RutenResponseCache(str(tmp_dir / "cache.sqlite3"))
+        cache.set_variants("1", "sig", {"spec_info": {"specs": {}}})
+        assert cache.get_variants("1", "sig") == {"spec_info": {"specs": {}}}
+        assert cache.get_variants("1", "other") is None
+
+        monkeypatch.setattr(ruten_scraper, "VARIANT_CACHE_TTL", -1)
+        assert cache.get_variants("1", "sig") is None
+
+
+class TestIncremental:
+    async def test_unchanged_listings_reuse_previous_rows(self, make_scraper, tmp_dir):
+        """增量模式下沒變動的商品沿用上次展開的資料列，有變動的才重新查詢選項"""
+        spec = {"spec_name": "UR", "spec_price": 300, "spec_num": 1, "spec_status": "Y"}
+        raw = [
+            _product("1", "AAA-001 多選項", price_range=[100, 300]),
+            _product("2", "AAA-001 多選項", price_range=[100, 300]),
+            _product("3", "AAA-001 單一"),
+        ]
+        api = FakeRutenApi({"AAA-001": raw}, specs={"1": {"a": spec}, "2": {"b": spec}})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        output = tmp_dir / "ruten_data.csv"
+
+        await make_scraper(api).run(str(cart_path), str(output), incremental=True)
+        first = _read_csv(output)
+        assert api.count("/items/v2/list") == 2
+        assert (tmp_dir / "listings.json").exists()
+
+        scraper = make_scraper(api)
+        await scraper.run(str(cart_path), str(output), incremental=True)
+        assert _read_csv(output) == first
+        assert api.count("/items/v2/list") == 2
+        assert scraper.stats["incremental_reused"] == 2
+
+        raw[1]["PostTime"] = "2024-02-01 00:00:00"
+        scraper = make_scraper(api)
+        await scraper.run(str(cart_path), str(output), incremental=True)
+        assert api.count("/items/v2/list") == 3
+        assert api.count("/core/prod") == 3  # 搜尋每次都照常查詢
+        assert scraper.stats["incremental_changed"] == 1
+        assert [r["product_id"] for r in _read_csv(output)] == ["1_a", "2_b", "3"]
+
+    async def test_changed_listing_not_served_stale_items(self, make_scraper, tmp_dir, monkeypatch):
+        """商品有變動時重新查詢選項，不會拿到回應快取裡的舊 items 回應"""
+        specs = {"1": {"a": {"spec_name": "UR", "spec_price": 300, "spec_num": 1, "spec_status": "Y"}}}
+        raw = [_product("1", "AAA-001 多選項", price_range=[100, 300])]
+        api = FakeRutenApi({"AAA-001": raw}, specs=specs)
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        output = tmp_dir / "ruten_data.csv"
+        cache_path = str(tmp_dir / "cache.sqlite3")
+        await make_scraper(api, cache_path=cache_path).run(str(cart_path), str(output), incremental=True)
+
+        # 搜尋與詳情的快取先過期（TTL 比 items 短），看到庫存變了
+        raw[0]["StockQty"] = 4
+        specs["1"]["a"]["spec_num"] = 4
+        monkeypatch.setitem(ruten_scraper.RESPONSE_CACHE_TTLS, "search", -1)
+        monkeypatch.setitem(ruten_scraper.RESPONSE_CACHE_TTLS, "detail", -1)
+        scraper = make_scraper(api, cache_path=cache_path)
+        await scraper.run(str(cart_path), str(output), incremental=True)
+
+        assert api.count("/items/v2/list") == 2
+        assert scraper.stats["incremental_changed"] == 1
+        assert [r["stock_qty"] for r in _read_csv(output)] == ["4"]
+
+
+class TestNegativeCache:
+    async def test_empty_keyword_not_searched_again(self, make_scraper, tmp_dir, monkeypatch):
+        """查無商品的卡號在 TTL 內不再送出搜尋，過期後重新確認"""
+        api = FakeRutenApi({})
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"))
+
+        assert await scraper._process_products_async("none-001 ") == []
+        assert await scraper._process_products_async("NONE-001") == []
+
+        assert api.count("/core/prod") == 1
+        assert scraper.stats["negative_cache_stores"] == 1
+        assert scraper.stats["negative_cache_hits"] == 1
+
+        monkeypatch.setattr(ruten_scraper, "NEGATIVE_CACHE_TTL", -1)
+        await scraper._process_products_async("NONE-001")
+        assert api.count("/core/prod") == 2
+
+    async def test_failed_search_not_recorded(self, make_scraper, tmp_dir, monkeypatch):
+        """搜尋失敗不算查無商品，force_refresh 也會略過"""
+        monkeypatch.setattr(ruten_scraper, "backoff_delay", lambda attempt: 0)
+        api = FakeRutenApi({}, failures={"search": [_http_error(404)]})
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"))
+
+        await scraper._process_products_async("NONE-001")
+        assert not scraper.cache.is_negative("NONE-001")
+
+        await scraper._process_products_async("NONE-001")
+        scraper.force_refresh = True
+        await scraper._process_products_async("NONE-001")
+        assert api.count("/core/prod") == 3
+
+
+class TestResponseCache:
+    async def test_second_run_served_from_cache(self, make_scraper, tmp_dir):
+        """第二次執行時直接使用快取，不再發送請求；force_refresh 會略過快取"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡A")]})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"))
+
+        await scraper.run(str(cart_path), str(tmp_dir / "a.csv"))
+        first_calls = len(api.calls)
+        await scraper.run(str(cart_path), str(tmp_dir / "b.csv"))
+
+        assert len(api.calls) == first_calls
+        assert scraper.stats["cache_hits"] == first_calls
+        assert _read_csv(tmp_dir / "a.csv") == _read_csv(tmp_dir / "b.csv")
+
+        await scraper.run(str(cart_path), str(tmp_dir / "c.csv"), force_refresh=True)
+        assert len(api.calls) == first_calls * 2
+        assert scraper.stats["cache_hits"] == 0
+
+    def test_key_normalizes_params(self):
+        """關鍵字大小寫與空白、參數型別不影響快取 key"""
+        a = RutenResponseCache.make_key("search", {"q": " aaa-001 ", "offset": 1})
+        b = RutenResponseCache.make_key("search", {"offset": "1", "q": "AAA-001"})
+        assert a == b
+
+    def test_expired_entries_ignored(self, tmp_dir, monkeypatch):
+        """超過端點 TTL 的回應不會被讀取"""
+        cache = RutenResponseCache(str(tmp_dir / "cache.sqlite3"))
+        cache.set("search", {"q": "AAA-001"}, {"Rows": []})
+        assert cache.get("search", {"q": "AAA-001"}) == {"Rows": []}
+
+        monkeypatch.setitem(ruten_scraper.RESPONSE_CACHE_TTLS, "search", -1)
+        assert cache.get("search", {"q": "AAA-001"}) is None
+
+    def test_evicts_least_recently_used(self, tmp_dir):
+        """超過大小上限時淘汰最久沒被讀取的回應"""
+        cache = RutenResponseCache(str(tmp_dir / "cache.sqlite3"), max_bytes=250)
+        payload = {"body": "x" * 100}
+        cache.set("detail", {"id": "1"}, payload)
+        cache.set("detail", {"id": "2"}, payload)
+        cache.get("detail", {"id": "1"})
+        cache.set("detail", {"id": "3"}, payload)
+
+        assert cache.get("detail", {"id": "1"}) == payload
+        assert cache.get("detail", {"id": "2"}) is None
+        assert cache.get("detail", {"id": "3"}) == payload
+
+    def test_hits_touch_in_batches(self, tmp_dir, monkeypatch):
+        """命中時不立即寫入磁碟，累積到批次大小或 close() 時才寫回讀取時間"""
+        monkeypatch.setattr(ruten_scraper, "RESPONSE_CACHE_TOUCH_BATCH", 3)
+        path = str(tmp_dir / "cache.sqlite3")
+        cache = RutenResponseCache(path)
+        cache.set("detail", {"id": "1"}, {"ok": 1})
+        writes = cache._conn.total_changes
+
+        cache.get("detail", {"id": "1"})
+        cache.get("detail", {"id": "1"})
+        assert cache._conn.total_changes == writes
+
+        cache.close()
+        cache.close()
+        with sqlite3.connect(path) as conn:
+            accessed_at, created_at = conn.execute(
+                "SELECT accessed_at, created_at FROM responses"
+            ).fetchone()
+        assert accessed_at > created_at
+        assert cache.get("detail", {"id": "1"}) == {"ok": 1}
+
+    async def test_run_closes_cache(self, make_scraper, tmp_dir):
+        """run() 結束時關閉快取連線，下次 run 會重新開啟"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡A")]})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"))
+
+        await scraper.run(str(cart_path), str(tmp_dir / "a.csv"))
+
+        assert scraper.cache._connection is None
+
+
+class TestRequestBudget:
+    async def test_run_finishes_with_partial_keywords(self, make_scraper, tmp_dir):
+        """請求額度用完後 run 照常完成，被中斷或略過的卡號記在 partial_keywords"""
+        catalog = {f"CARD-{i:03d}": [_product(str(i), f"CARD-{i:03d}")] for i in range(3)}
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": f"卡{i}", "target_card_numbers": [kw]} for i, kw in enumerate(catalog)
+        ])
+        output = tmp_dir / "ruten_data.csv"
+        api = FakeRutenApi(catalog)
+        scraper = make_scraper(api, max_concurrency=1, request_budget=3)
+
+        await scraper.run(str(cart_path), str(output))
+
+        assert len(api.calls) == 3
+        assert [r["product_id"] for r in _read_csv(output)] == ["0"]
+        assert scraper.partial_keywords == {
+            "CARD-001": "budget_exhausted", "CARD-002": "budget_skipped",
+        }
+        assert len(list((tmp_dir / "checkpoints").glob("*.json"))) == 1
+        metrics = json.loads((tmp_dir / "scrape_metrics.json").read_text(encoding="utf-8"))
+        assert metrics["budget"]["used"] == 3
+        assert metrics["keywords"]["CARD-002"]["partial"] == "budget_skipped"
+
+    def test_priority_and_page_plan(self, tmp_dir):
+        """已知商品少、需求量高的卡號優先；額度不足時優先順序低的卡號分到較少頁數"""
+        scraper = RutenScraper(cache_path=str(tmp_dir / "cache.sqlite3"), request_budget=30)
+        for keyword, total_rows in (("MANY-001", 500), ("FEW-001", 50)):
+            params = {"q": keyword, "type": "direct", "sort": ruten_scraper.SEARCH_SORT_DEFAULT,
+                      "limit": ITEMS_PER_PAGE, "offset": 1}
+            scraper.cache.set("search", params, {"TotalRows": total_rows, "Rows": [{"Id": "1"}]})
+        keywords = {
+            "MANY-001": {"card_names": ["甲"], "required_amount": 1},
+            "FEW-001": {"card_names": ["乙"], "required_amount": 3},
+            "NEW-001": {"card_names": ["丙"], "required_amount": 1},
+        }
+
+        order = scraper._prioritize(keywords)
+        assert order == ["NEW-001", "FEW-001", "MANY-001"]
+        # 30 個請求約 6 頁：每個卡號先 1 頁，沒搜尋過的卡號優先拿走剩下的 3 頁
+        assert scraper._plan_pages(order) == {"NEW-001": 4, "FEW-001": 1, "MANY-001": 1}
+
+        scraper.request_budget = None
+        assert set(scraper._plan_pages(order).values()) == {ruten_scraper.MAX_PAGES_PER_KEYWORD}
+
+    async def test_stale_known_rows_do_not_cap_pages(self, make_scraper, tmp_dir):
+        """額度充足時不因快取裡過期的商品數少分頁數，實際頁數依最新的 TotalRows"""
+        products = [_product(str(i), f"AAA-001 #{i}") for i in range(330)]
+        api = FakeRutenApi({"AAA-001": products})
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        scraper = make_scraper(api, cache_path=str(tmp_dir / "cache.sqlite3"), request_budget=3000)
+        params = {"q": "AAA-001", "type": "direct", "sort": ruten_scraper.SEARCH_SORT_DEFAULT,
+                  "limit": ITEMS_PER_PAGE, "offset": 1}
+        scraper.cache.set("search", params, {"TotalRows": 50, "Rows": [{"Id": "0"}]})
+
+        await scraper.run(str(cart_path), str(tmp_dir / "ruten_data.csv"), force_refresh=True)
+
+        assert scraper._page_plan == {"AAA-001": ruten_scraper.MAX_PAGES_PER_KEYWORD}
+        assert api.count("/core/prod") == 3
+        assert len(_read_csv(tmp_dir / "ruten_data.csv")) == 330
+        assert scraper.partial_keywords == {}
+
+    async def test_rejection_marks_only_its_keyword(self, make_scraper, tmp_dir):
+        """額度用完時只標記被拒絕請求的卡號，之後才完成的其他卡號不受影響"""
+        catalog = {kw: [_product(kw[0], f"{kw} 卡")] for kw in ("AAA-001", "BBB-001")}
+        cart_path = tmp_dir / "cart.json"
+        _write_cart(cart_path, [
+            {"card_name_zh": f"卡{i}", "target_card_numbers": [kw]} for i, kw in enumerate(catalog)
+        ])
+        # 兩個搜尋先送出；先回來的卡號用掉最後一個請求查詳情，而且比另一個卡號晚完成
+        api = FakeRutenApi(catalog, delays={"search": [0, 0.05], "detail": [0.2]})
+        scraper = make_scraper(api, max_concurrency=2, request_budget=3)
+
+        await scraper.run(str(cart_path), str(tmp_dir / "ruten_data.csv"))
+
+        first = api.calls[0][1]["q"]
+        second = next(kw for kw in catalog if kw != first)
+        assert scraper.partial_keywords == {second: "budget_exhausted"}
+        assert [r["product_id"] for r in _read_csv(tmp_dir / "ruten_data.csv")] == [first[0]]
+        assert len(list((tmp_dir / "checkpoints").glob("*.json"))) == 1
+
+    async def test_coalesced_follower_gets_partial_mark(self, make_scraper, tmp_dir):
+        """共用別人被額度中斷的搜尋結果時，同樣標記為不完整且不寫檢查點"""
+        api = FakeRutenApi({"AAA-001": [_product("1", "AAA-001 卡")]}, delay=0.05)
+        for name in ("a", "b"):
+            (tmp_dir / name).mkdir()
+            _write_cart(tmp_dir / name / "cart.json",
+                        [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}])
+        # 兩者的頁數規劃都是 1 頁，才會共用同一次搜尋
+        leader, follower = make_scraper(api, request_budget=1), make_scraper(api, request_budget=9)
+
+        await asyncio.gather(
+            leader.run(str(tmp_dir / "a" / "cart.json"), str(tmp_dir / "a" / "ruten_data.csv")),
+            follower.run(str(tmp_dir / "b" / "cart.json"), str(tmp_dir / "b" / "ruten_data.csv")),
+        )
+
+        assert len(api.calls) == 1
+        assert follower.stats["coalesced_keywords"] == 1
+        assert follower.partial_keywords == leader.partial_keywords == {"AAA-001": "budget_exhausted"}
+        assert list((tmp_dir / "b" / "checkpoints").glob("*.json")) == []
+
+    def test_leftover_pages_topped_up_in_priority_order(self, tmp_dir):
+        """已知商品數用不完的頁數，依優先順序補給其他卡號"""
+        scraper = RutenScraper(cache_path=str(tmp_dir / "cache.sqlite3"), request_budget=40)
+        params = {"q": "FEW-001", "type": "direct", "sort": ruten_scraper.SEARCH_SORT_DEFAULT,
+                  "limit": ITEMS_PER_PAGE, "offset": 1}
+        scraper.cache.set("search", params, {"TotalRows": 50, "Rows": [{"Id": "1"}]})
+
+        # 40 個請求約 8 頁：FEW 估計只要 1 頁，NEW 拿到 5 頁，剩下的 2 頁再補給 FEW
+        assert scraper._plan_pages(["FEW-001", "NEW-001"]) == {"FEW-001": 3, "NEW-001": 5}
@@ -0,0 +1,97 @@
+"""
+tests/unit/test_scrape_metrics.py - ScrapeMetrics unit tests
+
+The end-to-end test replays a cassette through RutenScraper.run, so the
+real _request_json path is measured without touching the network.
+"""
+import json
+from urllib.parse import urlsplit
+
+from app.config import (
+    HTTP_CASSETTE_NAME,
+    RUTEN_API_BASE_URL,
+    RUTEN_ITEMS_API_BASE_URL,
+    SCRAPE_METRICS_NAME,
+)
+from app.services import ruten_scraper
+from app.services.cassette import Cassette
+from app.services.ruten_scraper import ITEMS_PER_PAGE, SEARCH_SORT_DEFAULT, RutenScraper
+from app.services.scrape_metrics import LatencyHistogram, endpoint_for_url
+
+SEARCH_URL = f"{RUTEN_API_BASE_URL}/search/v3/index.php/core/prod"
+DETAIL_URL = f"{RUTEN_API_BASE_URL}/prod/v2/index.php/prod"
+ITEMS_URL = f"{RUTEN_ITEMS_API_BASE_URL}/items/v2/list"
+
+
+class TestLatencyHistogram:
+    def test_buckets_and_percentiles(self):
+        """百分位數以所在區間的上限估計，超出最後一個區間的用最大值"""
+        histogram = LatencyHistogram(buckets_ms=(10, 100))
+        for seconds in (0.005, 0.005, 0.05, 0.3):
+            histogram.observe(seconds)
+
+        result = histogram.to_dict()
+        assert result["buckets"] == {"<=10": 2, "<=100": 1, "+Inf": 1}
+        assert result["p50_ms"] == 10.0
+        assert result["p90_ms"] == 300.0
+        assert LatencyHistogram().percentile(50) is None
+
+    def test_endpoint_for_url(self):
+        assert endpoint_for_url(SEARCH_URL) == "search"
+        assert endpoint_for_url(f"{DETAIL_URL}?id=1") == "detail"
+        assert endpoint_for_url(ITEMS_URL) == "items"
+        assert endpoint_for_url("https://example.com/") == "other"
+
+
+class TestRunMetrics:
+    async def test_run_writes_metrics_next_to_csv(self, tmp_dir, monkeypatch):
+        """run() 完成後寫出各端點請求、重試、頁數與選項展開的統計"""
+        monkeypatch.setattr(ruten_scraper, "backoff_delay", lambda attempt: 0)
+        product = {
+            "ProdId": "1", "ProdName": "AAA-001 卡A", "SellerId": "s", "PriceRange": [100, 200],
+            "StockQty": 3, "SoldQty": 0, "ShippingCost": 60, "PostTime": "", "Image": "",
+        }
+        specs = {
+            "a": {"spec_name": "普", "spec_price": 100, "spec_num": 1, "spec_status": "Y"},
+            "b": {"spec_name": "亮", "spec_price": 200, "spec_num": 2, "spec_status": "Y"},
+        }
+        recorder = Cassette(str(tmp_dir / HTTP_CASSETTE_NAME), "record")
+        recorder.record(
+            SEARCH_URL,
+            {"q": "AAA-001", "type": "direct", "sort": SEARCH_SORT_DEFAULT,
+             "limit": ITEMS_PER_PAGE, "offset": 1},
+            200, {"TotalRows": 1, "Rows": [{"Id": "1"}]},
+        )
+        recorder.record(DETAIL_URL, {"id": "1"}, 503)
+        recorder.record(DETAIL_URL, {"id": "1"}, 200, [product])
+        recorder.record(ITEMS_URL, {"gno": "1", "level": "detail"}, 200,
+                        {"data": [{"spec_info": {"specs": specs}}]})
+        recorder.save()
+        cart_path = tmp_dir / "cart.json"
+        cart_path.write_text(
+            '{"shopping_cart": [{"card_name_zh": "卡A", "target_card_numbers": ["AAA-001"]}]}',
+            encoding="utf-8",
+        )
+
+        scraper = RutenScraper(cache_path=None, http_mode="replay")
+        await scraper.run(str(cart_path), str(tmp_dir / "ruten_data.csv"))
+
+        metrics = json.loads((tmp_dir / SCRAPE_METRICS_NAME).read_text(encoding="utf-8"))
+        detail = metrics["endpoints"]["detail"]
+        assert (detail["requests"], detail["errors"], detail["retries"]) == (2, 1, 1)
+        assert detail["statuses"] == {"503": 1, "200": 1}
+        assert detail["latency"]["count"] == 2
+        assert metrics["endpoints"]["search"]["bytes"] > 0
+        assert metrics["requests"] == 4
+        assert metrics["rows_written"] == 2
+        assert metrics["wall_time_s"] >= 0
+        keyword = metrics["keywords"]["AAA-001"]
+        assert (keyword["source"], keyword["pages"], keyword["total_pages"], keyword["rows"]) == (
+            "scraped", 1, 1, 2
+        )
+        assert metrics["variants"] == {"products": 1, "fetched": 1, "expanded_rows": 2}
+        host = metrics["hosts"][urlsplit(DETAIL_URL).netloc]
+        assert host["limiter"]["decreases"] == 1  # 503 觸發一次降速
+        assert host["breaker"] == {
+            "state": "closed", "consecutive_failures": 0, "times_opened": 0, "rejections": 0,
+        }